@@ -5,4 +5,19 @@ admin.site.register(UserProfile)
 admin.site.register(SubscriptionTransaction)
 admin.site.register(Feedback)
 admin.site.register(Organisation)
-admin.site.register(OrganisationMembership)
\ No newline at end of file
+admin.site.register(OrganisationMembership)
+admin.site.register(RagDocument)
+admin.site.register(ChatMetric)
+admin.site.register(ChatTurn)
+admin.site.register(FeedbackSummary)
+admin.site.register(ImageRendition)
+
+
+# FAQ entries sorted by hits, so staff can see which answers save the most LLM calls
+@admin.register(FaqEntry)
+class FaqEntryAdmin(admin.ModelAdmin):
+    list_display = ('question', 'is_active', 'hit_count', 'last_hit_at', 'updated_at')
+    list_filter = ('is_active',)
+    search_fields = ('question', 'alternative_questions', 'answer')
+    ordering = ('-hit_count',)
+    readonly_fields = ('hit_count', 'last_hit_at')
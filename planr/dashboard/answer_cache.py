@@ -0,0 +1,65 @@
+import hashlib
+import re
+from django.core.cache import caches
+
+# Answer cache for the chatbot
+# Repeated questions are served from Django's cache framework instead of a fresh Mistral generation.
+# The backend, TTL and size limit come from CACHES['planr_answers'] in settings.py (locmem is LRU,
+# file/redis/memcached backends work the same way when configured there). Purging clears that backend,
+# so with more than one worker process it must be shared: a LocMem purge only reaches one process, and
+# the dashboard.W001 system check (checks.py) warns about it.
+
+CACHE_ALIAS = 'planr_answers'
+HITS_KEY = 'stats:hits'
+MISSES_KEY = 'stats:misses'
+
+def answer_cache():
+    return caches[CACHE_ALIAS]
+
+# Lowercase, drop punctuation and collapse whitespace so trivially different phrasings share an entry
+def normalize_query(user_query):
+    lowered = user_query.lower()
+    lowered = re.sub(r"[^\w\s]", " ", lowered)
+    return " ".join(lowered.split())
+
+# Short hash of the system prompt: editing DCC_SYSTEM_PROMPT automatically retires old answers
+def prompt_version(system_prompt):
+    return hashlib.sha256(system_prompt.encode()).hexdigest()[:12]
+
+def answer_cache_key(user_query, model, system_prompt):
+    raw = f"{model}|{prompt_version(system_prompt)}|{normalize_query(user_query)}"
+    return "answer:" + hashlib.sha256(raw.encode()).hexdigest()
+
+def _count(key):
+    cache = answer_cache()
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Counter missing (first use, cleared or culled)
+        cache.add(key, 0, None)
+        cache.incr(key)
+
+# Returns (key, (answer, sources)) for the first of keys that's cached, or (None, None); one lookup
+# counts as a single hit or miss however many keys it tries
+def find_cached_answer(keys):
+    found = answer_cache().get_many(keys)
+    key = next((key for key in keys if key in found), None)
+    _count(HITS_KEY if key is not None else MISSES_KEY)
+    return key, found.get(key)
+
+def set_cached_answer(key, answer, sources):
+    answer_cache().set(key, (answer, list(sources)))
+
+def answer_cache_stats():
+    cache = answer_cache()
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / total, 4) if total else 0.0,
+    }
+
+def clear_answer_cache():
+    answer_cache().clear()
@@ -3,3 +3,8 @@ from django.apps import AppConfig
 class DashboardConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'dashboard'
+
+    # Background warm-up (FAQ index, Ollama models) is started by planr/wsgi.py and planr/asgi.py, not
+    # here, so commands, tests and scripts that load the app don't start threads
+    def ready(self):
+        from . import checks  # noqa: F401 (registers the system checks)
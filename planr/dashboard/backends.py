@@ -0,0 +1,189 @@
+import asyncio
+import itertools
+import logging
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+import httpx
+import ollama
+from django.conf import settings
+from .breaker import CircuitBreaker, LLMUnavailable
+
+# Pool of Ollama inference backends
+# PLANR_OLLAMA_HOSTS lists every Ollama base URL; each backend keeps one persistent ollama.Client (and
+# one AsyncClient per event loop) so HTTP connections are reused. Each request leases the healthy
+# backend with the fewest requests in flight (round-robin between ties). A backend that refuses
+# connections is ejected straight away; a background thread probes every backend's /api/version each
+# PLANR_OLLAMA_HEALTH_INTERVAL seconds and brings recovered ones back. If every backend is down we
+# still try them, so a single-host setup behaves exactly like before.
+# Clients use explicit connect/read timeouts (read is the longest gap allowed between streamed chunks),
+# and each backend has a circuit breaker (breaker.py): backends whose breaker is open are skipped,
+# and when no backend can take a request LLMUnavailable is raised immediately.
+
+logger = logging.getLogger(__name__)
+
+# Errors that mean the backend is unreachable or stuck (timeouts included), rather than a bad request
+BACKEND_ERRORS = (ConnectionError, httpx.TransportError)
+# ...and the subset that means nothing is listening at all, which ejects the backend until a probe succeeds
+CONNECT_ERRORS = (ConnectionError, httpx.ConnectError, httpx.ConnectTimeout)
+
+def client_timeout():
+    return httpx.Timeout(settings.PLANR_OLLAMA_READ_TIMEOUT, connect=settings.PLANR_OLLAMA_CONNECT_TIMEOUT)
+
+
+class OllamaBackend:
+    def __init__(self, host, timeout=None, breaker=None):
+        self.host = host.rstrip('/')
+        self.timeout = timeout
+        self.client = ollama.Client(host=self.host, timeout=timeout)
+        self.breaker = breaker or CircuitBreaker()
+        self._async_clients = weakref.WeakKeyDictionary()
+        self.outstanding = 0
+        self.served = 0
+        self.healthy = True
+        self.last_error = ''
+        self.last_checked = None
+
+    # httpx connection pools cannot be shared between event loops, so keep one AsyncClient per loop
+    def async_client(self):
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = self._async_clients[loop] = ollama.AsyncClient(host=self.host, timeout=self.timeout)
+        return client
+
+
+class BackendPool:
+    def __init__(self, hosts, health_interval=10, probe_timeout=2.0, timeout=None, breaker_options=None):
+        if not hosts:
+            raise ValueError("PLANR_OLLAMA_HOSTS must list at least one Ollama host")
+        self.backends = [OllamaBackend(host, timeout, CircuitBreaker(**(breaker_options or {}))) for host in hosts]
+        self.health_interval = health_interval
+        self.probe_timeout = probe_timeout
+        self.lock = threading.Lock()
+        self.rotation = itertools.count()
+        self._stop = threading.Event()
+        self._probe_thread = None
+
+    def unavailable(self):
+        retry_after = min(backend.breaker.retry_after() for backend in self.backends)
+        return LLMUnavailable("Planr's assistant is temporarily unavailable, please try again shortly.", retry_after)
+
+    # Fail fast (before queueing for the LLM) when every backend's breaker is open
+    def check_available(self):
+        if not any(backend.breaker.available() for backend in self.backends):
+            raise self.unavailable()
+
+    def acquire(self):
+        with self.lock:
+            open_to_traffic = [backend for backend in self.backends if backend.breaker.available()]
+            candidates = [backend for backend in open_to_traffic if backend.healthy] or open_to_traffic
+            start = next(self.rotation) % max(len(candidates), 1)
+            for backend in sorted(candidates[start:] + candidates[:start], key=lambda backend: backend.outstanding):
+                if backend.breaker.allow():
+                    backend.outstanding += 1
+                    backend.served += 1
+                    return backend
+        raise self.unavailable()
+
+    def release(self, backend):
+        with self.lock:
+            backend.outstanding -= 1
+
+    def mark_down(self, backend, error):
+        with self.lock:
+            if backend.healthy:
+                logger.warning("Ollama backend %s ejected: %s", backend.host, error)
+            backend.healthy = False
+            backend.last_error = str(error)
+
+    def mark_up(self, backend):
+        with self.lock:
+            if not backend.healthy:
+                logger.info("Ollama backend %s is back", backend.host)
+            backend.healthy = True
+            backend.last_error = ''
+
+    # with pool.lease() as backend: ... backend.client.chat(...)
+    @contextmanager
+    def lease(self):
+        backend = self.acquire()
+        try:
+            yield backend
+        except BACKEND_ERRORS as e:
+            backend.breaker.record_failure(e)
+            if isinstance(e, CONNECT_ERRORS):
+                self.mark_down(backend, e)
+            raise
+        except ollama.ResponseError as e:
+            if e.status_code >= 500:
+                backend.breaker.record_failure(e)
+            else:
+                backend.breaker.record_success()
+            raise
+        except BaseException:
+            backend.breaker.record_abandon()
+            raise
+        else:
+            backend.breaker.record_success()
+        finally:
+            self.release(backend)
+
+    def probe(self, backend):
+        try:
+            httpx.get(f"{backend.host}/api/version", timeout=self.probe_timeout).raise_for_status()
+        except httpx.HTTPError as e:
+            self.mark_down(backend, e)
+        else:
+            self.mark_up(backend)
+        backend.last_checked = time.time()
+        return backend.healthy
+
+    def probe_all(self):
+        return [self.probe(backend) for backend in self.backends]
+
+    def _probe_loop(self):
+        while not self._stop.wait(self.health_interval):
+            self.probe_all()
+
+    def start_health_checks(self):
+        if self._probe_thread is None and self.health_interval:
+            self._probe_thread = threading.Thread(target=self._probe_loop, name='planr-ollama-health', daemon=True)
+            self._probe_thread.start()
+
+    def stop_health_checks(self):
+        self._stop.set()
+
+    def stats(self):
+        with self.lock:
+            return [{
+                'host': backend.host,
+                'healthy': backend.healthy,
+                'outstanding': backend.outstanding,
+                'served': backend.served,
+                'last_error': backend.last_error,
+                'last_checked': backend.last_checked,
+                'breaker': backend.breaker.stats(),
+            } for backend in self.backends]
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_backend_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = BackendPool(
+                    settings.PLANR_OLLAMA_HOSTS,
+                    health_interval=settings.PLANR_OLLAMA_HEALTH_INTERVAL,
+                    timeout=client_timeout(),
+                    breaker_options={
+                        'failure_threshold': settings.PLANR_OLLAMA_BREAKER_FAILURES,
+                        'cooldown': settings.PLANR_OLLAMA_BREAKER_COOLDOWN,
+                    },
+                )
+                _pool.start_health_checks()
+    return _pool
@@ -0,0 +1,318 @@
+import asyncio
+import hashlib
+import itertools
+import json
+import os
+import random
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import uuid
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import httpx
+import numpy as np
+from django.conf import settings
+
+# Load-testing harness for the chat API (driven by `manage.py benchmark_chat`)
+# A fake Ollama server stands in for the LLM so results measure Planr itself: its first token arrives
+# after first_token_delay seconds, then one token every token_delay seconds, like a warm model.
+# Planr is served in-process by Django's threaded WSGI server (/api/chat/) and/or uvicorn (ASGI,
+# /api/chat/async/), against a throwaway test database, and each scenario is driven at increasing
+# concurrency with httpx. Results are plain dicts so runs can be saved as JSON and compared.
+
+BENCHMARK_QUESTIONS = [
+    "How do I apply for planning permission for an extension?",
+    "What is a Section 5 declaration?",
+    "Do I need permission for a garden shed?",
+    "How long does a planning decision take?",
+    "Can I object to a planning application?",
+    "What are the zoning rules for Z1 areas?",
+    "How do I check the status of my planning application?",
+    "What fees apply to a planning application?",
+    "Do I need permission to convert my attic?",
+    "What is a protected structure?",
+]
+GREETING_QUERIES = ["hello", "hi", "hey", "good morning", "good evening"]
+
+
+# Fake Ollama: /api/chat (streamed or not), /api/embed (deterministic unit vectors), /api/version
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    first_token_delay = 0.1
+    token_delay = 0.02
+    tokens = 40
+    embed_dim = 64
+
+    def log_message(self, *args):
+        pass
+
+    def send_json(self, payload, status=200):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/api/version':
+            self.send_json({'version': '0.0.0-fake'})
+        elif self.path == '/api/tags':
+            self.send_json({'models': []})
+        else:
+            self.send_json({'error': 'not found'}, 404)
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        if self.path == '/api/embed':
+            texts = request['input'] if isinstance(request['input'], list) else [request['input']]
+            self.send_json({'model': request['model'], 'embeddings': [self.embedding(text) for text in texts]})
+        elif self.path == '/api/chat':
+            self.chat(request)
+        else:
+            self.send_json({'error': 'not found'}, 404)
+
+    def embedding(self, text):
+        seed = int.from_bytes(hashlib.sha256(text.strip().lower().encode('utf-8')).digest()[:8], 'little')
+        vector = np.random.default_rng(seed).standard_normal(self.embed_dim)
+        return (vector / np.linalg.norm(vector)).round(6).tolist()
+
+    def chat(self, request):
+        started = time.monotonic()
+        words = [f"word{i} " for i in range(self.tokens - 1)] + ["end."]
+        final = {
+            'model': request['model'],
+            'created_at': '2024-01-01T00:00:00Z',
+            'message': {'role': 'assistant', 'content': ''},
+            'done': True,
+            'done_reason': 'stop',
+            'prompt_eval_count': sum(len(message['content'].split()) for message in request['messages']),
+            'prompt_eval_duration': int(self.first_token_delay * 1e9),
+            'eval_count': len(words),
+            'eval_duration': int(self.token_delay * len(words) * 1e9),
+            'load_duration': 0,
+        }
+        time.sleep(self.first_token_delay)
+        if not request.get('stream', True):
+            time.sleep(self.token_delay * len(words))
+            final['message']['content'] = ''.join(words)
+            final['total_duration'] = int((time.monotonic() - started) * 1e9)
+            self.send_json(final)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        for word in words:
+            self.write_chunk({'model': request['model'], 'created_at': final['created_at'], 'message': {'role': 'assistant', 'content': word}, 'done': False})
+            time.sleep(self.token_delay)
+        final['total_duration'] = int((time.monotonic() - started) * 1e9)
+        self.write_chunk(final)
+        self.wfile.write(b'0\r\n\r\n')
+
+    def write_chunk(self, payload):
+        data = (json.dumps(payload) + '\n').encode('utf-8')
+        self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+        self.wfile.flush()
+
+
+def start_fake_ollama(first_token_delay=0.1, token_delay=0.02, tokens=40, port=0):
+    handler = type('ConfiguredFakeOllama', (FakeOllamaHandler,), {
+        'first_token_delay': first_token_delay, 'token_delay': token_delay, 'tokens': tokens,
+    })
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='fake-ollama', daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+# Django's threaded development WSGI server (what runserver uses), without request logging
+def start_wsgi_server():
+    from django.core.handlers.wsgi import WSGIHandler
+    from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_message(self, *args):
+            pass
+
+    server = ThreadedWSGIServer(('127.0.0.1', 0), QuietHandler, allow_reuse_address=True)
+    server.set_app(WSGIHandler())
+    threading.Thread(target=server.serve_forever, name='benchmark-wsgi', daemon=True).start()
+    return server.shutdown, f"http://127.0.0.1:{server.server_address[1]}"
+
+def start_asgi_server():
+    import uvicorn
+    from django.core.handlers.asgi import ASGIHandler
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(ASGIHandler(), host='127.0.0.1', port=port, log_level='warning', lifespan='off'))
+    thread = threading.Thread(target=server.run, name='benchmark-asgi', daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError("uvicorn failed to start")
+        time.sleep(0.05)
+
+    def stop():
+        server.should_exit = True
+        thread.join(5)
+    return stop, f"http://127.0.0.1:{port}"
+
+SERVERS = {
+    'wsgi': (start_wsgi_server, '/api/chat/'),
+    'asgi': (start_asgi_server, '/api/chat/async/'),
+}
+
+
+# Throwaway test database (a file in a private temporary directory for SQLite, so server threads share
+# it) with one premium and one free user. Returns the handle to pass to destroy_benchmark_database
+# and the session cookies of both users.
+def create_benchmark_database():
+    from django.contrib.auth.models import User
+    from django.db import connection
+    from django.test import Client
+    temp_dir = None
+    if connection.vendor == 'sqlite':
+        temp_dir = tempfile.mkdtemp(prefix='planr-benchmark-')
+        connection.settings_dict.setdefault('TEST', {})['NAME'] = os.path.join(temp_dir, 'benchmark.sqlite3')
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    from .models import SubscriptionTransaction
+    cookies = {}
+    for tier in ('premium', 'free'):
+        user = User.objects.create_user(f"benchmark-{tier}", password=uuid.uuid4().hex)
+        if tier == 'premium':
+            # Logging in re-checks subscriptions, so the premium user needs a live one
+            SubscriptionTransaction.objects.create(user=user, amount=0, valid_until=date.today() + timedelta(days=30))
+        client = Client()
+        client.force_login(user)
+        cookies[tier] = {settings.SESSION_COOKIE_NAME: client.cookies[settings.SESSION_COOKIE_NAME].value}
+    return (old_name, temp_dir), cookies
+
+def destroy_benchmark_database(database):
+    from django.db import connection
+    old_name, temp_dir = database
+    connection.creation.destroy_test_db(old_name, verbosity=0)
+    if temp_dir is not None:
+        connection.settings_dict['TEST'].pop('NAME', None)
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+def reset_chat_caches():
+    from .answer_cache import clear_answer_cache
+    from .semantic_cache import get_semantic_cache
+    clear_answer_cache()
+    get_semantic_cache().clear()
+
+
+# Each scenario yields (query, tier) pairs; tier None means an anonymous (free) user
+def scenario_requests(name, premium_share=0.5):
+    if name == 'llm':
+        return ((f"{random.choice(BENCHMARK_QUESTIONS)} (case {uuid.uuid4().hex[:8]})", None) for _ in itertools.count())
+    if name == 'cache':
+        return ((random.choice(BENCHMARK_QUESTIONS), None) for _ in itertools.count())
+    if name == 'greeting':
+        return ((random.choice(GREETING_QUERIES), None) for _ in itertools.count())
+    if name == 'tiers':
+        return ((f"{random.choice(BENCHMARK_QUESTIONS)} (case {uuid.uuid4().hex[:8]})",
+                 'premium' if random.random() < premium_share else 'free') for _ in itertools.count())
+    raise ValueError(f"Unknown scenario {name!r}")
+
+SCENARIOS = ('llm', 'cache', 'greeting', 'tiers')
+
+
+def latency_stats(samples):
+    if not samples:
+        return None
+    samples = sorted(samples)
+    def pick(fraction):
+        return round(samples[min(len(samples) - 1, int(len(samples) * fraction))] * 1000, 1)
+    return {
+        'mean': round(sum(samples) / len(samples) * 1000, 1),
+        'p50': pick(0.5), 'p90': pick(0.9), 'p99': pick(0.99), 'max': round(samples[-1] * 1000, 1),
+    }
+
+async def send_chat(client, url, query, cookies, stream):
+    started = time.monotonic()
+    first_byte = None
+    async with client.stream('POST', url, json={'query': query, 'stream': stream}, cookies=cookies) as response:
+        async for _ in response.aiter_bytes():
+            if first_byte is None:
+                first_byte = time.monotonic() - started
+    return response.status_code, first_byte, time.monotonic() - started
+
+# Send `requests` chat requests from `concurrency` concurrent clients and summarise the results
+async def run_level(url, requests_iter, total, concurrency, cookies, stream, timeout):
+    results = []
+    remaining = itertools.count()
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=timeout) as client:
+        async def worker():
+            while next(remaining) < total:
+                query, tier = next(requests_iter)
+                try:
+                    status, first_byte, elapsed = await send_chat(client, url, query, cookies.get(tier, {}), stream)
+                except httpx.HTTPError as e:
+                    results.append((tier or 'free', type(e).__name__, None, None))
+                else:
+                    results.append((tier or 'free', status, first_byte, elapsed))
+        started = time.monotonic()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        wall = time.monotonic() - started
+
+    ok = [result for result in results if result[1] == 200]
+    statuses = {}
+    for result in results:
+        statuses[str(result[1])] = statuses.get(str(result[1]), 0) + 1
+    summary = {
+        'concurrency': concurrency,
+        'requests': len(results),
+        'errors': len(results) - len(ok),
+        'error_rate': round((len(results) - len(ok)) / max(len(results), 1), 4),
+        'statuses': statuses,
+        'wall_seconds': round(wall, 3),
+        'throughput_rps': round(len(ok) / wall, 2) if wall else None,
+        'latency_ms': latency_stats([result[3] for result in ok]),
+        'first_byte_ms': latency_stats([result[2] for result in ok if result[2] is not None]),
+    }
+    tiers = {result[0] for result in results}
+    if len(tiers) > 1:
+        summary['by_tier'] = {tier: {
+            'requests': sum(result[0] == tier for result in results),
+            'errors': sum(result[0] == tier and result[1] != 200 for result in results),
+            'latency_ms': latency_stats([result[3] for result in ok if result[0] == tier]),
+        } for tier in sorted(tiers)}
+    return summary
+
+# Run every (server, scenario, concurrency) combination; returns the JSON-ready list of results
+# cookies maps 'premium'/'free' to session cookies (see create_benchmark_database)
+def run_benchmark(servers, scenarios, concurrency_levels, requests_per_level, cookies=None, stream=True,
+                  premium_share=0.5, timeout=120, log=print):
+    from .scheduler import get_scheduler
+    report = []
+    for server_name in servers:
+        start_server, path = SERVERS[server_name]
+        stop, base_url = start_server()
+        try:
+            for scenario in scenarios:
+                reset_chat_caches()
+                requests_iter = scenario_requests(scenario, premium_share)
+                if scenario == 'cache':
+                    # Prime the caches so the measured requests are all hits
+                    for question in BENCHMARK_QUESTIONS:
+                        httpx.post(base_url + path, json={'query': question}, timeout=timeout)
+                for concurrency in concurrency_levels:
+                    result = asyncio.run(run_level(base_url + path, requests_iter, requests_per_level, concurrency, cookies or {}, stream, timeout))
+                    result.update(server=server_name, scenario=scenario, scheduler=get_scheduler().stats())
+                    report.append(result)
+                    latency = result['latency_ms'] or {}
+                    log(f"{server_name:<5} {scenario:<9} c={concurrency:<4} {result['throughput_rps']:>8} req/s  "
+                        f"p50 {latency.get('p50')} ms  p99 {latency.get('p99')} ms  errors {result['error_rate']:.1%}")
+        finally:
+            stop()
+    return report
@@ -0,0 +1,159 @@
+import hashlib
+import re
+from collections import Counter
+import numpy as np
+
+# BM25 inverted index over the same chunks as the vector index
+# Planning questions lean on exact tokens (application references like 3456/23, zoning codes like Z1,
+# street names, "Section 5 declaration") that embeddings blur, so retrieval fuses this lexical ranking
+# with the vector ranking (see retrieval.py). Everything is array-backed so it can live in the shared
+# memory-mapped index file:
+#   term_hashes      uint64, sorted 64-bit hashes of each term (lookup is one np.searchsorted)
+#   posting_offsets  int64, byte range of each term's doc-id gaps in postings
+#   postings         uint8, varint (LEB128) delta-encoded chunk rows; most gaps fit in one byte
+#   tf_offsets       int64, range of each term's term frequencies in tfs (its length is the doc freq)
+#   tfs              uint8, term frequency per posting (capped at 255)
+#   doc_lengths      uint32, tokens per chunk
+
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:[/.\-][a-z0-9]+)*")
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i if in into is it its me my of on or "
+    "our so that the their there these this to was we what when where which who why will with you your".split()
+)
+
+# Lowercase word tokens; compound tokens ("3456/23", "d02-x285") are kept whole and also split into parts
+def tokenize(text):
+    tokens = []
+    for token in TOKEN_RE.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        tokens.append(token)
+        if not token.isalnum():
+            tokens.extend(part for part in re.split(r"[/.\-]", token) if part and part not in STOPWORDS)
+    return tokens
+
+def term_hash(term):
+    return int.from_bytes(hashlib.blake2b(term.encode('utf-8'), digest_size=8).digest(), 'little')
+
+def encode_varints(values):
+    values = np.asarray(values, dtype=np.uint64)
+    lengths = np.ones(len(values), dtype=np.int64)
+    for bits in (7, 14, 21, 28, 35, 42, 49, 56, 63):
+        lengths += values >= (np.uint64(1) << np.uint64(bits))
+    starts = np.cumsum(lengths) - lengths
+    out = np.zeros(int(lengths.sum()), dtype=np.uint8)
+    for position in range(int(lengths.max()) if len(values) else 0):
+        present = lengths > position
+        byte = (values[present] >> np.uint64(7 * position)) & np.uint64(0x7F)
+        more = (lengths[present] > position + 1).astype(np.uint64) << np.uint64(7)
+        out[starts[present] + position] = (byte | more).astype(np.uint8)
+    return out, lengths
+
+def decode_varints(data):
+    data = np.asarray(data, dtype=np.uint8)
+    if not len(data):
+        return np.zeros(0, dtype=np.int64)
+    ends = np.flatnonzero(data < 0x80)
+    if len(ends) == len(data):
+        # Every value fits in one byte (typical for common terms, whose gaps are small)
+        return data.astype(np.int64)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    value_of_byte = np.repeat(np.arange(len(ends)), ends - starts + 1)
+    shifts = (np.arange(len(data)) - starts[value_of_byte]) * 7
+    parts = (data & 0x7F).astype(np.int64) << shifts
+    return np.add.reduceat(parts, starts)
+
+# texts are chunk texts in index row order; returns the arrays described above
+def build_bm25_arrays(texts):
+    postings = {}
+    doc_lengths = np.zeros(len(texts), dtype=np.uint32)
+    for row, text in enumerate(texts):
+        tokens = tokenize(text)
+        doc_lengths[row] = len(tokens)
+        for term, count in Counter(tokens).items():
+            postings.setdefault(term_hash(term), []).append((row, min(count, 255)))
+
+    term_hashes = np.array(sorted(postings), dtype=np.uint64)
+    rows, tfs, term_sizes = [], [], []
+    for key in term_hashes.tolist():
+        entries = postings[key]
+        rows.extend(row for row, _ in entries)
+        tfs.extend(count for _, count in entries)
+        term_sizes.append(len(entries))
+    rows = np.array(rows, dtype=np.int64)
+    tf_offsets = np.zeros(len(term_hashes) + 1, dtype=np.int64)
+    np.cumsum(term_sizes, out=tf_offsets[1:])
+
+    # Rows within a term are ascending, so store gaps; each term's first gap is its first row
+    gaps = np.diff(rows, prepend=0)
+    gaps[tf_offsets[:-1]] = rows[tf_offsets[:-1]]
+    encoded, lengths = encode_varints(gaps)
+    posting_offsets = np.zeros(len(term_hashes) + 1, dtype=np.int64)
+    if len(lengths):
+        np.cumsum(np.add.reduceat(lengths, tf_offsets[:-1]), out=posting_offsets[1:])
+    return {
+        'term_hashes': term_hashes,
+        'posting_offsets': posting_offsets,
+        'postings': encoded,
+        'tf_offsets': tf_offsets,
+        'tfs': np.array(tfs, dtype=np.uint8),
+        'doc_lengths': doc_lengths,
+    }
+
+
+class BM25Index:
+    def __init__(self, arrays, k1=1.2, b=0.75):
+        self.arrays = arrays
+        self.term_hashes = arrays['term_hashes']
+        self.posting_offsets = arrays['posting_offsets']
+        self.postings = arrays['postings']
+        self.tf_offsets = arrays['tf_offsets']
+        self.tfs = arrays['tfs']
+        self.doc_lengths = arrays['doc_lengths']
+        self.k1 = k1
+        self.b = b
+        self.count = len(self.doc_lengths)
+        avg_length = max(float(self.doc_lengths.mean()), 1.0) if self.count else 1.0
+        # Per-chunk length normalisation, computed once per process rather than per query term
+        self.length_norm = (k1 * (1 - b + b * self.doc_lengths / avg_length)).astype(np.float32)
+
+    def term_id(self, term):
+        key = np.uint64(term_hash(term))
+        position = int(np.searchsorted(self.term_hashes, key))
+        if position < len(self.term_hashes) and self.term_hashes[position] == key:
+            return position
+        return None
+
+    def postings_for(self, term_id):
+        gaps = decode_varints(self.postings[self.posting_offsets[term_id]:self.posting_offsets[term_id + 1]])
+        return np.cumsum(gaps), self.tfs[self.tf_offsets[term_id]:self.tf_offsets[term_id + 1]]
+
+    # Top k rows by BM25: (rows, scores) best first; only rows containing a query term are returned
+    def search(self, query, k):
+        if not self.count:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        scores = np.zeros(self.count, dtype=np.float32)
+        for term in set(tokenize(query)):
+            term_id = self.term_id(term)
+            if term_id is None:
+                continue
+            rows, tfs = self.postings_for(term_id)
+            doc_freq = len(rows)
+            idf = np.log(1 + (self.count - doc_freq + 0.5) / (doc_freq + 0.5))
+            tfs = tfs.astype(np.float32)
+            scores[rows] += np.float32(idf * (self.k1 + 1)) * tfs / (tfs + self.length_norm[rows])
+        matched = np.flatnonzero(scores)
+        if not len(matched):
+            return matched, scores[matched]
+        k = min(k, len(matched))
+        top = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        top = top[np.argsort(-scores[top])]
+        return top, scores[top]
+
+# Reciprocal rank fusion: each ranking contributes 1 / (k + rank) per row
+def reciprocal_rank_fusion(rankings, k=60):
+    fused = {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking, start=1):
+            fused[int(row)] = fused.get(int(row), 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
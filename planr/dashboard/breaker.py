@@ -0,0 +1,102 @@
+import math
+import threading
+import time
+
+# Circuit breaker for Ollama backends
+# Every backend in the pool (see backends.py) has its own breaker. Failed or timed-out calls are
+# counted; after PLANR_OLLAMA_BREAKER_FAILURES in a row the breaker opens and the backend gets no
+# traffic for PLANR_OLLAMA_BREAKER_COOLDOWN seconds, so chat_api fails fast instead of tying up a
+# worker until the client gives up. After the cool-down the breaker is half-open: a single probe
+# request is let through, and its outcome either closes the breaker or opens it again.
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+# No backend can take the request right now (every breaker is open, or the call itself failed)
+class LLMUnavailable(Exception):
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=3, cooldown=30, half_open_probes=1):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.half_open_probes = half_open_probes
+        self.lock = threading.Lock()
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = 0
+        self.times_opened = 0
+        self.last_error = ''
+
+    def _cooled_down(self):
+        return time.monotonic() - self.opened_at >= self.cooldown
+
+    # Could a request go through? (no side effects, used to pick a backend)
+    def available(self):
+        with self.lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and not self._cooled_down():
+                return False
+            return self.probing < self.half_open_probes
+
+    # Claim the right to send a request; in half-open state this takes one of the probe slots
+    def allow(self):
+        with self.lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN:
+                if not self._cooled_down():
+                    return False
+                self.state = HALF_OPEN
+            if self.probing >= self.half_open_probes:
+                return False
+            self.probing += 1
+            return True
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.probing = 0
+            self.state = CLOSED
+            self.last_error = ''
+
+    def record_failure(self, error):
+        with self.lock:
+            self.failures += 1
+            self.last_error = str(error)
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self.times_opened += 1
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+                self.probing = 0
+
+    # The call ended without telling us anything (e.g. the browser disconnected mid-stream)
+    def record_abandon(self):
+        with self.lock:
+            if self.state == HALF_OPEN:
+                self.probing = max(self.probing - 1, 0)
+
+    def retry_after(self):
+        with self.lock:
+            if self.state != OPEN:
+                return 1
+            return max(1, math.ceil(self.cooldown - (time.monotonic() - self.opened_at)))
+
+    def stats(self):
+        retry_after = self.retry_after()
+        with self.lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self.failures,
+                'times_opened': self.times_opened,
+                'retry_after': retry_after if self.state == OPEN else 0,
+                'last_error': self.last_error,
+            }
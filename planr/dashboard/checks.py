@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.checks import Warning, register
+
+LOCMEM_BACKEND = 'django.core.cache.backends.locmem.LocMemCache'
+
+# The answer cache is purged (`manage.py clear_answer_cache`, POST /api/chat/cache/, rebuilding the RAG
+# index) by clearing CACHES['planr_answers']. LocMemCache lives inside one process, so with several
+# workers a purge only reaches the one that handled it and the others keep serving stale answers.
+# Silence with SILENCED_SYSTEM_CHECKS = ['dashboard.W001'] when the site runs as a single process.
+@register()
+def answer_cache_backend_check(app_configs, **kwargs):
+    from .answer_cache import CACHE_ALIAS
+    backend = settings.CACHES.get(CACHE_ALIAS, {}).get('BACKEND')
+    if backend != LOCMEM_BACKEND:
+        return []
+    return [Warning(
+        f"CACHES['{CACHE_ALIAS}'] uses LocMemCache, so clearing the answer cache only affects the process "
+        "that handles the purge.",
+        hint="Use a shared backend (Redis, Memcached, database or file based) when running more than one worker process.",
+        id='dashboard.W001',
+    )]
@@ -0,0 +1,165 @@
+import math
+import re
+import time
+import uuid
+from django.conf import settings
+from django.core.cache import caches
+
+# Server-side chat conversations
+# A conversation keeps the turns of one chat (CACHES['planr_conversations'], so it expires after a
+# quiet spell) and feeds them back to the model as context. To keep prompt size and prompt-eval time
+# bounded however long the chat runs, the history sent with each question is windowed by a token
+# budget: the most recent turns are kept verbatim, and whenever summary + turns exceed
+# PLANR_CONVERSATION_HISTORY_TOKENS the oldest turn is folded into a running summary of one line per
+# turn (the question and the first sentence of the answer). The summary has its own budget,
+# PLANR_CONVERSATION_SUMMARY_TOKENS, and drops its oldest lines past that. Compressing is plain string
+# work, so it never costs an extra LLM call.
+#
+# Only follow-ups are sent with the history. A question that stands on its own ("do I need permission
+# for a shed?") is answered like any first question, so it still uses the answer caches and single
+# flight; is_follow_up() treats short questions and ones that refer back ("what about it?", "and the
+# fees?") as follow-ups, and errs that way when unsure.
+#
+# Token counts are estimated (characters / CHARS_PER_TOKEN) since the model's tokenizer isn't
+# available here; each turn also stores the prompt_eval_count Ollama reported, so the estimate and
+# the budget can be tuned against real numbers.
+
+CACHE_ALIAS = 'planr_conversations'
+CHARS_PER_TOKEN = 4
+SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+# Words that point back at earlier turns, and openings that continue them
+REFERENCES = re.compile(
+    r"\b(it|its|that|this|those|these|they|them|their|there|he|she|his|her|one|ones|same|above|"
+    r"previous|earlier|before|also|else|again|instead|more|other)\b",
+    re.IGNORECASE,
+)
+CONTINUATIONS = re.compile(r"^\W*(and|but|so|or|then|what about|how about|why|ok|okay)\b", re.IGNORECASE)
+FOLLOW_UP_MAX_WORDS = 3
+
+def conversation_cache():
+    return caches[CACHE_ALIAS]
+
+def estimate_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+def shorten(text, limit):
+    text = ' '.join(text.split())
+    return text if len(text) <= limit else text[:limit - 1].rstrip() + '…'
+
+# One summary line for a turn that no longer fits the window
+def compress_turn(turn):
+    first_sentence = SENTENCE_END.split(' '.join(turn['answer'].split()), 1)[0]
+    return f"- Asked: {shorten(turn['question'], 160)} Answered: {shorten(first_sentence, 200)}"
+
+
+class Conversation:
+    def __init__(self, conversation_id=None, owner='', summary=(), turns=(), summarized=0):
+        self.id = conversation_id or uuid.uuid4().hex
+        self.owner = owner
+        self.summary = list(summary)  # compressed lines for older turns, oldest first
+        self.turns = list(turns)      # recent turns kept verbatim, oldest first
+        self.summarized = summarized  # number of turns folded into the summary so far
+        self.latest = {}
+
+    @classmethod
+    def from_state(cls, conversation_id, owner, state):
+        if not state or state['owner'] != owner:
+            return cls(owner=owner)
+        return cls(conversation_id, owner, state['summary'], state['turns'], state['summarized'])
+
+    # The stored conversation, or a new one if the id is unknown, expired or someone else's
+    @classmethod
+    def load(cls, conversation_id, owner):
+        state = conversation_cache().get(cls.key(conversation_id)) if conversation_id else None
+        return cls.from_state(conversation_id, owner, state)
+
+    @classmethod
+    async def aload(cls, conversation_id, owner):
+        state = await conversation_cache().aget(cls.key(conversation_id)) if conversation_id else None
+        return cls.from_state(conversation_id, owner, state)
+
+    @staticmethod
+    def key(conversation_id):
+        return f"conversation:{conversation_id}"
+
+    def state(self):
+        return {'owner': self.owner, 'summary': self.summary, 'turns': self.turns, 'summarized': self.summarized, 'updated': time.time()}
+
+    def save(self):
+        conversation_cache().set(self.key(self.id), self.state())
+
+    async def asave(self):
+        await conversation_cache().aset(self.key(self.id), self.state())
+
+    def delete(self):
+        conversation_cache().delete(self.key(self.id))
+
+    def has_history(self):
+        return bool(self.turns or self.summary)
+
+    # Whether the question needs the earlier turns to make sense
+    def is_follow_up(self, user_query):
+        if not self.has_history():
+            return False
+        return (
+            len(user_query.split()) <= FOLLOW_UP_MAX_WORDS
+            or bool(REFERENCES.search(user_query))
+            or bool(CONTINUATIONS.match(user_query))
+        )
+
+    def summary_text(self):
+        return "Summary of the earlier conversation:\n" + "\n".join(self.summary) if self.summary else ''
+
+    def history_tokens(self):
+        return estimate_tokens(self.summary_text()) + sum(turn['tokens'] for turn in self.turns)
+
+    # Chat messages for the windowed history, to go between the system prompts and the new question
+    def history_messages(self):
+        messages = []
+        if self.summary:
+            messages.append({'role': 'system', 'content': self.summary_text()})
+        for turn in self.turns:
+            messages.append({'role': 'user', 'content': turn['question']})
+            messages.append({'role': 'assistant', 'content': turn['answer']})
+        return messages
+
+    # Follow-up questions ("what about extensions?") retrieve better with the previous question attached
+    def retrieval_query(self, user_query):
+        return f"{self.turns[-1]['question']} {user_query}" if self.turns else user_query
+
+    def add_turn(self, question, answer, history_tokens=None, prompt_tokens=None):
+        self.latest = {
+            'question': question,
+            'answer': answer,
+            'tokens': estimate_tokens(question) + estimate_tokens(answer),
+            'history_tokens': history_tokens,
+            'prompt_tokens': prompt_tokens,
+        }
+        self.turns.append(self.latest)
+        self.compact()
+
+    def compact(self):
+        while self.turns and self.history_tokens() > settings.PLANR_CONVERSATION_HISTORY_TOKENS:
+            self.summary.append(compress_turn(self.turns.pop(0)))
+            self.summarized += 1
+        while len(self.summary) > 1 and estimate_tokens(self.summary_text()) > settings.PLANR_CONVERSATION_SUMMARY_TOKENS:
+            self.summary.pop(0)
+
+    # Sent to the client with each answer
+    def info(self):
+        return {
+            'id': self.id,
+            'turns': self.summarized + len(self.turns),
+            'summarized_turns': self.summarized,
+            'history_tokens': self.history_tokens(),
+            'prompt_tokens': self.latest.get('prompt_tokens'),
+        }
+
+    # Full detail for the conversation endpoint
+    def detail(self):
+        return dict(self.info(), summary=self.summary, recent_turns=self.turns)
+
+
+# Conversations belong to the logged-in user; anonymous chats are only reachable by their random id
+def conversation_owner(user):
+    return f"user:{user.pk}" if user and user.is_authenticated else 'anonymous'
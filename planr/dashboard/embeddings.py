@@ -0,0 +1,39 @@
+from django.conf import settings
+from .backends import get_backend_pool
+
+# Text embeddings from a local Ollama embedding model (PLANR_EMBED_MODEL)
+# Used by the semantic answer cache. Returns None instead of raising so callers can skip
+# embedding-based features when the model isn't available. Without an explicit client the request
+# goes to a backend leased from the Ollama pool (so unreachable backends get ejected).
+
+def _embed(client, texts):
+    return client.embed(model=settings.PLANR_EMBED_MODEL, input=list(texts), keep_alive=settings.PLANR_LLM_KEEP_ALIVE)['embeddings']
+
+async def _aembed(client, texts):
+    return (await client.embed(model=settings.PLANR_EMBED_MODEL, input=list(texts), keep_alive=settings.PLANR_LLM_KEEP_ALIVE))['embeddings']
+
+def embed_texts(texts, client=None):
+    try:
+        if client is not None:
+            return _embed(client, texts)
+        with get_backend_pool().lease() as backend:
+            return _embed(backend.client, texts)
+    except Exception:
+        return None
+
+async def aembed_texts(texts, client=None):
+    try:
+        if client is not None:
+            return await _aembed(client, texts)
+        with get_backend_pool().lease() as backend:
+            return await _aembed(backend.async_client(), texts)
+    except Exception:
+        return None
+
+def embed_query(text, client=None):
+    embeddings = embed_texts([text], client)
+    return embeddings[0] if embeddings else None
+
+async def aembed_query(text, client=None):
+    embeddings = await aembed_texts([text], client)
+    return embeddings[0] if embeddings else None
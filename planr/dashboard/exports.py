@@ -0,0 +1,177 @@
+import csv
+import json
+from datetime import date, datetime, time, timedelta
+from django.apps import apps
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+# Staff data exports
+# Feedback tickets, subscription transactions and chat usage as CSV or JSON Lines, for finance and QA,
+# filtered by date range, type and organisation. Rows are read with values_list().iterator(), so no
+# model instances are built and only PLANR_EXPORT_CHUNK_SIZE rows are held at a time, and they're
+# written out in ~64KB pieces as they arrive: memory stays flat however many rows an export has.
+# Both api/exports/<dataset>/ (a StreamingHttpResponse) and `manage.py export_data` use this.
+#
+# Feedback and transactions are attributed to the organisation the user belongs to now; chat usage
+# (ChatTurn) records the organisation at the time of the question.
+
+FORMATS = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+FLUSH_BYTES = 64 * 1024
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+class ExportError(ValueError):
+    pass
+
+
+class Dataset:
+    def __init__(self, model_label, columns, date_field, type_field=None, organisation_field=None):
+        self.model_label = model_label
+        self.columns = columns  # (header, field lookup) pairs
+        self.date_field = date_field
+        self.type_field = type_field
+        self.organisation_field = organisation_field
+
+    def headers(self):
+        return [header for header, _ in self.columns]
+
+    def queryset(self, since=None, until=None, type=None, organisation=None):
+        model = apps.get_model(self.model_label)
+        rows = model.objects.order_by('pk')
+        if since or until:
+            rows = rows.filter(**date_range(model._meta.get_field(self.date_field), since, until))
+        if type:
+            if self.type_field is None:
+                raise ExportError("This export can't be filtered by type.")
+            choices = dict(model._meta.get_field(self.type_field).choices)
+            if type not in choices:
+                raise ExportError(f"type must be one of: {', '.join(choices)}")
+            rows = rows.filter(**{self.type_field: type})
+        if organisation:
+            rows = rows.filter(**{self.organisation_field: find_organisation(organisation)})
+        return rows.values_list(*(lookup for _, lookup in self.columns))
+
+
+DATASETS = {
+    'feedback': Dataset('dashboard.Feedback', [
+        ('id', 'id'),
+        ('created_at', 'created_at'),
+        ('user', 'user__username'),
+        ('organisation', 'user__organisationmembership__organisation__name'),
+        ('type', 'feedback_type'),
+        ('status', 'status'),
+        ('rating', 'rating'),
+        ('description', 'description'),
+        ('llm_prompt', 'llm_prompt'),
+        ('llm_response', 'llm_response'),
+        ('admin_response', 'admin_response'),
+        ('resolved_at', 'resolved_at'),
+    ], 'created_at', 'feedback_type', 'user__organisationmembership__organisation'),
+    'transactions': Dataset('dashboard.SubscriptionTransaction', [
+        ('id', 'id'),
+        ('transaction_date', 'transaction_date'),
+        ('user', 'user__username'),
+        ('email', 'user__email'),
+        ('organisation', 'user__organisationmembership__organisation__name'),
+        ('amount', 'amount'),
+        ('valid_until', 'valid_until'),
+    ], 'transaction_date', None, 'user__organisationmembership__organisation'),
+    'chat_usage': Dataset('dashboard.ChatTurn', [
+        ('id', 'id'),
+        ('created_at', 'created_at'),
+        ('user', 'user__username'),
+        ('organisation', 'organisation__name'),
+        ('conversation_id', 'conversation_id'),
+        ('model', 'model'),
+        ('outcome', 'outcome'),
+        ('prompt_tokens', 'prompt_tokens'),
+        ('completion_tokens', 'completion_tokens'),
+    ], 'created_at', 'outcome', 'organisation'),
+}
+
+def parse_day(value, name):
+    if not value or isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ExportError(f"{name} must be a date (YYYY-MM-DD)")
+
+# Filters for since..until inclusive; datetimes are compared with local day boundaries so the
+# created_at index can be used
+def date_range(field, since, until):
+    since, until = parse_day(since, 'since'), parse_day(until, 'until')
+    if field.get_internal_type() != 'DateTimeField':
+        bounds = {f"{field.name}__gte": since, f"{field.name}__lte": until}
+    else:
+        start = lambda day: timezone.make_aware(datetime.combine(day, time.min))
+        bounds = {
+            f"{field.name}__gte": start(since) if since else None,
+            f"{field.name}__lt": start(until + timedelta(days=1)) if until else None,
+        }
+    return {lookup: value for lookup, value in bounds.items() if value is not None}
+
+# An organisation by id or by its join code
+def find_organisation(value):
+    from .models import Organisation
+    value = str(value).strip()
+    organisations = Organisation.objects.filter(pk=value) if value.isdigit() else Organisation.objects.filter(code=value.upper())
+    organisation_id = organisations.values_list('pk', flat=True).first()
+    if organisation_id is None:
+        raise ExportError(f"No organisation {value}")
+    return organisation_id
+
+
+# csv.writer wants a file; this one hands each formatted line straight back
+class Echo:
+    def write(self, value):
+        return value
+
+# Spreadsheet-friendly cell: ISO dates, blanks for NULL, and user text that would start a formula
+# ("=HYPERLINK(...)") prefixed with a quote so Excel shows it as text
+def csv_cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+def csv_lines(headers, rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(headers)
+    for row in rows:
+        yield writer.writerow([csv_cell(value) for value in row])
+
+def jsonl_lines(headers, rows):
+    for row in rows:
+        yield json.dumps(dict(zip(headers, row)), cls=DjangoJSONEncoder) + '\n'
+
+# Join lines into pieces of about FLUSH_BYTES, so a big export isn't millions of tiny writes
+def buffered(lines):
+    piece, size = [], 0
+    for line in lines:
+        piece.append(line)
+        size += len(line)
+        if size >= FLUSH_BYTES:
+            yield ''.join(piece)
+            piece, size = [], 0
+    if piece:
+        yield ''.join(piece)
+
+# The export as an iterator of text pieces. Filters are checked here, before anything is streamed,
+# so a bad filter is an ExportError rather than a broken download
+def export_chunks(name, format='csv', since=None, until=None, type=None, organisation=None, chunk_size=None):
+    if name not in DATASETS:
+        raise ExportError(f"Unknown export {name}; choose from: {', '.join(DATASETS)}")
+    if format not in FORMATS:
+        raise ExportError(f"format must be one of: {', '.join(FORMATS)}")
+    dataset = DATASETS[name]
+    rows = dataset.queryset(since, until, type, organisation).iterator(chunk_size=chunk_size or settings.PLANR_EXPORT_CHUNK_SIZE)
+    lines = csv_lines if format == 'csv' else jsonl_lines
+    return buffered(lines(dataset.headers(), rows))
+
+def export_filename(name, format):
+    return f"planr-{name}-{timezone.localdate():%Y-%m-%d}.{format}"
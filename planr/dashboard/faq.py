@@ -0,0 +1,183 @@
+import atexit
+import logging
+import threading
+import time
+from collections import Counter
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections
+from django.db.models import Count, F, Max
+from django.utils import timezone
+from .answer_cache import normalize_query
+from .bm25 import tokenize
+
+# FAQ fast path for the chatbot
+# Staff curate question/answer pairs (FaqEntry) in the admin. Each worker compiles the active entries
+# into an in-memory index: a dict from normalized question text (normalize_query, the same rule as the
+# answer cache) to the entry, plus an inverted index of each phrasing's token set (bm25.tokenize, so
+# stopwords and punctuation don't matter). A query is answered if its normalized text matches a
+# phrasing exactly, or if its tokens overlap one phrasing's tokens with a Jaccard similarity of at
+# least PLANR_FAQ_MIN_SIMILARITY. Either way it's a couple of dict lookups, well under a millisecond.
+#
+# Saving an entry rebuilds this worker's index at once; other workers compare the entry count and
+# latest updated_at at most every PLANR_FAQ_RELOAD_SECONDS. Hits are counted in memory and added to
+# FaqEntry.hit_count in one UPDATE per entry every PLANR_FAQ_HIT_FLUSH_SECONDS.
+
+logger = logging.getLogger(__name__)
+
+
+class FaqMatch:
+    def __init__(self, entry_id, answer, sources):
+        self.entry_id = entry_id
+        self.answer = answer
+        self.sources = sources
+
+
+class FaqIndex:
+    def __init__(self, entries, min_similarity=0.75, stamp=None):
+        self.min_similarity = min_similarity
+        self.stamp = stamp
+        self.checked = time.monotonic()
+        self.exact = {}
+        self.phrasings = []  # (match, token set) per phrasing
+        self.postings = {}   # token -> phrasing numbers
+        for entry in entries:
+            match = FaqMatch(entry.pk, entry.answer, entry.sources())
+            for phrasing in entry.phrasings():
+                self.exact.setdefault(normalize_query(phrasing), match)
+                tokens = frozenset(tokenize(phrasing))
+                if not tokens:
+                    continue
+                for token in tokens:
+                    self.postings.setdefault(token, []).append(len(self.phrasings))
+                self.phrasings.append((match, tokens))
+
+    def __len__(self):
+        return len(self.phrasings)
+
+    def match(self, user_query):
+        hit = self.exact.get(normalize_query(user_query))
+        if hit is not None:
+            return hit
+        tokens = set(tokenize(user_query))
+        if not tokens:
+            return None
+        shared = Counter()
+        for token in tokens:
+            shared.update(self.postings.get(token, ()))
+        best, best_similarity = None, self.min_similarity
+        for number, overlap in shared.items():
+            match, phrasing_tokens = self.phrasings[number]
+            similarity = overlap / (len(tokens) + len(phrasing_tokens) - overlap)
+            if similarity >= best_similarity:
+                best, best_similarity = match, similarity
+        return best
+
+
+# Buffered hit counts, flushed by a background thread
+class FaqHits:
+    def __init__(self, flush_interval=30):
+        self.flush_interval = flush_interval
+        self.counts = Counter()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def record(self, entry_id):
+        with self.lock:
+            self.counts[entry_id] += 1
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name='planr-faq-hits', daemon=True)
+                self.thread.start()
+
+    def flush(self):
+        from .models import FaqEntry
+        with self.lock:
+            counts, self.counts = self.counts, Counter()
+        if not counts:
+            return 0
+        now = timezone.now()
+        try:
+            for entry_id, hits in counts.items():
+                FaqEntry.objects.filter(pk=entry_id).update(hit_count=F('hit_count') + hits, last_hit_at=now)
+        except DatabaseError as e:
+            logger.warning("Dropped FAQ hit counts: %s", e)
+            return 0
+        return sum(counts.values())
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Flushing FAQ hit counts failed")
+            finally:
+                close_old_connections()
+
+
+_index = None
+_index_lock = threading.Lock()
+_hits = None
+
+def faq_hits():
+    global _hits
+    if _hits is None:
+        with _index_lock:
+            if _hits is None:
+                _hits = FaqHits(settings.PLANR_FAQ_HIT_FLUSH_SECONDS)
+                atexit.register(_hits.flush)
+    return _hits
+
+def _entries_stamp():
+    from .models import FaqEntry
+    summary = FaqEntry.objects.aggregate(count=Count('id'), updated=Max('updated_at'))
+    return summary['count'], summary['updated']
+
+def load_faq_index():
+    from .models import FaqEntry
+    stamp = _entries_stamp()
+    entries = FaqEntry.objects.filter(is_active=True).only('question', 'alternative_questions', 'answer', 'source_title', 'source_url')
+    return FaqIndex(entries, settings.PLANR_FAQ_MIN_SIMILARITY, stamp)
+
+# The compiled index, or None when it hasn't been built yet or is due for a freshness check
+def current_faq_index():
+    index = _index
+    if index is None or time.monotonic() - index.checked >= settings.PLANR_FAQ_RELOAD_SECONDS:
+        return None
+    return index
+
+# Builds the index on first use, and rebuilds it if the FAQ entries changed in another worker
+def get_faq_index():
+    global _index
+    index = current_faq_index()
+    if index is not None:
+        return index
+    with _index_lock:
+        if _index is not None and _index.stamp == _entries_stamp():
+            _index.checked = time.monotonic()
+        else:
+            _index = load_faq_index()
+        return _index
+
+# Compile the index when a web process starts so the first question doesn't pay for it
+def preload_faq_index():
+    try:
+        get_faq_index()
+    except DatabaseError as e:
+        logger.warning("FAQ index not loaded: %s", e)
+    finally:
+        close_old_connections()
+
+def invalidate_faq_index():
+    global _index
+    _index = None
+
+# The FAQ answer for user_query, or None; counts the hit
+def match_faq(user_query, index=None):
+    if not settings.PLANR_FAQ_ENABLED:
+        return None
+    if index is None:
+        index = get_faq_index()
+    match = index.match(user_query)
+    if match is not None:
+        faq_hits().record(match.entry_id)
+    return match
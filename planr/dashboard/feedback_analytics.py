@@ -0,0 +1,147 @@
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import timedelta
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+# Feedback analytics summary
+# FeedbackSummary holds one row per (creation day, type, status) with running totals: tickets, rated
+# tickets and their rating sum, tickets with an admin response, and resolution time for resolved
+# tickets. Each ticket contributes to exactly one row (feedback_contribution), so when a view changes a
+# ticket inside tracked_feedback() its old contribution is taken off and the new one added, with
+# F() updates in the same transaction as the save. The analytics page then reads a few hundred summary
+# rows whatever the number of tickets.
+#
+# Deletes are handled by a post_delete receiver. Edits made elsewhere (the Django admin, the shell)
+# aren't tracked; `manage.py rebuild_feedback_summary` recomputes the table from scratch.
+
+SUMMARY_FIELDS = ('tickets', 'rated', 'rating_total', 'responded', 'timed_resolutions', 'resolution_seconds')
+SUMMARY_SOURCE_FIELDS = ('created_at', 'feedback_type', 'status', 'rating', 'admin_response', 'resolved_at')
+DEFAULT_DAYS = 90
+
+# The summary row a ticket counts towards and what it adds there, or None for an unsaved ticket
+def feedback_contribution(feedback):
+    if feedback.pk is None or feedback.created_at is None:
+        return None
+    amounts = dict.fromkeys(SUMMARY_FIELDS, 0)
+    amounts['tickets'] = 1
+    if feedback.rating:
+        amounts['rated'] = 1
+        amounts['rating_total'] = feedback.rating
+    if feedback.admin_response:
+        amounts['responded'] = 1
+    if feedback.status == 'resolved' and feedback.resolved_at:
+        amounts['timed_resolutions'] = 1
+        amounts['resolution_seconds'] = max((feedback.resolved_at - feedback.created_at).total_seconds(), 0.0)
+    return (timezone.localdate(feedback.created_at), feedback.feedback_type, feedback.status), amounts
+
+def apply_amounts(key, amounts):
+    from .models import FeedbackSummary
+    amounts = {field: amount for field, amount in amounts.items() if amount}
+    if not amounts:
+        return
+    day, feedback_type, status = key
+    rows = FeedbackSummary.objects.filter(day=day, feedback_type=feedback_type, status=status)
+    changes = {field: F(field) + amount for field, amount in amounts.items()}
+    if rows.update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            FeedbackSummary.objects.create(day=day, feedback_type=feedback_type, status=status, **amounts)
+    except IntegrityError:
+        # Another request created the row first
+        rows.update(**changes)
+
+def apply_contribution(contribution, sign=1):
+    if contribution is not None:
+        key, amounts = contribution
+        apply_amounts(key, {field: sign * amount for field, amount in amounts.items()})
+
+# Net change between two contributions, one UPDATE per summary row that actually changes
+def apply_change(before, after):
+    changes = defaultdict(lambda: dict.fromkeys(SUMMARY_FIELDS, 0))
+    for contribution, sign in ((before, -1), (after, 1)):
+        if contribution is not None:
+            key, amounts = contribution
+            for field, amount in amounts.items():
+                changes[key][field] += sign * amount
+    for key, amounts in changes.items():
+        apply_amounts(key, amounts)
+
+# Wrap the code that creates or changes a ticket:
+#     with tracked_feedback(feedback):
+#         feedback.status = 'resolved'
+#         feedback.save(update_fields=['status'])
+@contextmanager
+def tracked_feedback(feedback):
+    before = feedback_contribution(feedback)
+    with transaction.atomic():
+        yield feedback
+        apply_change(before, feedback_contribution(feedback))
+
+# Recompute every summary row from the Feedback table
+def rebuild_feedback_summary():
+    from .models import Feedback, FeedbackSummary
+    totals = defaultdict(lambda: dict.fromkeys(SUMMARY_FIELDS, 0))
+    tickets = Feedback.objects.only(*SUMMARY_SOURCE_FIELDS).order_by()
+    for feedback in tickets.iterator(chunk_size=2000):
+        key, amounts = feedback_contribution(feedback)
+        for field, amount in amounts.items():
+            totals[key][field] += amount
+    rows = [
+        FeedbackSummary(day=day, feedback_type=feedback_type, status=status, **amounts)
+        for (day, feedback_type, status), amounts in totals.items()
+    ]
+    with transaction.atomic():
+        FeedbackSummary.objects.all().delete()
+        FeedbackSummary.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def ratio(numerator, denominator, digits=2):
+    return round(numerator / denominator, digits) if denominator else None
+
+def summary_figures(amounts):
+    return {
+        'tickets': amounts['tickets'],
+        'average_rating': ratio(amounts['rating_total'], amounts['rated']),
+        'response_rate': ratio(amounts['responded'], amounts['tickets'], 3),
+        'mean_resolution_hours': ratio(amounts['resolution_seconds'] / 3600, amounts['timed_resolutions'], 1),
+    }
+
+# Figures for the staff analytics page over tickets created in the last `days` days (all time if None),
+# read from FeedbackSummary only
+def summarize_feedback(days=DEFAULT_DAYS):
+    from .models import Feedback, FeedbackSummary
+    rows = FeedbackSummary.objects.filter(tickets__gt=0)
+    since = None
+    if days:
+        since = timezone.localdate() - timedelta(days=days - 1)
+        rows = rows.filter(day__gte=since)
+    overall = dict.fromkeys(SUMMARY_FIELDS, 0)
+    by_type = defaultdict(lambda: dict.fromkeys(SUMMARY_FIELDS, 0))
+    by_status = defaultdict(int)
+    open_by_type = defaultdict(int)
+    daily = defaultdict(int)
+    for row in rows.values('day', 'feedback_type', 'status', *SUMMARY_FIELDS):
+        for field in SUMMARY_FIELDS:
+            overall[field] += row[field]
+            by_type[row['feedback_type']][field] += row[field]
+        by_status[row['status']] += row['tickets']
+        if row['status'] != 'resolved':
+            open_by_type[row['feedback_type']] += row['tickets']
+        daily[row['day']] += row['tickets']
+    return {
+        'since': since,
+        'overall': summary_figures(overall),
+        'by_type': [
+            dict(summary_figures(by_type[value]), feedback_type=value, label=label, open=open_by_type[value])
+            for value, label in Feedback.FEEDBACK_TYPE_CHOICES
+        ],
+        'by_status': [
+            {'status': value, 'label': label, 'tickets': by_status[value]}
+            for value, label in Feedback.STATUS_CHOICES
+        ],
+        'daily': [{'day': day, 'tickets': daily[day]} for day in sorted(daily)],
+    }
@@ -0,0 +1,155 @@
+import re
+from django.db import connection
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+from .pagination import KeysetPage
+
+# Full-text search over feedback
+# dashboard_feedback_fts is an SQLite FTS5 index over the free-text columns of Feedback. It's an
+# external-content table (the text lives only in dashboard_feedback) kept in step by triggers rather
+# than signals, so queryset.update(), bulk_create and the admin all stay in sync; the update trigger
+# only fires when one of the indexed columns changes, so status changes don't touch the index.
+#
+# Results are ranked by bm25 (description weighted highest, admin replies lowest) and paged by keyset
+# on (score, id), the same way the tracker pages by (created_at, id), so type/status filters and
+# Older/Newer links work unchanged. Snippets are only built for the rows on the page.
+#
+# Django's SQLite schema editor rebuilds a table to alter most columns, which drops its triggers: a
+# migration that alters dashboard_feedback should call install_feedback_search() again.
+
+FTS_TABLE = 'dashboard_feedback_fts'
+FTS_COLUMNS = ('llm_prompt', 'llm_response', 'description', 'admin_response')
+BM25_WEIGHTS = (1.5, 1.0, 2.0, 0.5)  # same order as FTS_COLUMNS
+SNIPPET_TOKENS = 16
+MARK_START, MARK_END = '\x02', '\x03'
+QUERY_TERM = re.compile(r"\w+")
+
+_columns = ', '.join(FTS_COLUMNS)
+_new = ', '.join(f"new.{column}" for column in FTS_COLUMNS)
+_old = ', '.join(f"old.{column}" for column in FTS_COLUMNS)
+
+FTS_SCHEMA = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5({_columns}, "
+    f"content='dashboard_feedback', content_rowid='id', tokenize='porter unicode61 remove_diacritics 2')",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_insert",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_delete",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_update",
+    f"CREATE TRIGGER {FTS_TABLE}_insert AFTER INSERT ON dashboard_feedback BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, {_columns}) VALUES (new.id, {_new}); END",
+    f"CREATE TRIGGER {FTS_TABLE}_delete AFTER DELETE ON dashboard_feedback BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_columns}) VALUES ('delete', old.id, {_old}); END",
+    f"CREATE TRIGGER {FTS_TABLE}_update AFTER UPDATE OF {_columns} ON dashboard_feedback BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_columns}) VALUES ('delete', old.id, {_old}); "
+    f"INSERT INTO {FTS_TABLE}(rowid, {_columns}) VALUES (new.id, {_new}); END",
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+FTS_DROP = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_insert",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_delete",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_update",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+def search_available(using=None):
+    return (using or connection).vendor == 'sqlite'
+
+# Create (or repair) the index and its triggers, and reindex every ticket
+def install_feedback_search(using=None):
+    using = using or connection
+    if not search_available(using):
+        return
+    with using.cursor() as cursor:
+        for statement in FTS_SCHEMA:
+            cursor.execute(statement)
+
+def uninstall_feedback_search(using=None):
+    using = using or connection
+    if not search_available(using):
+        return
+    with using.cursor() as cursor:
+        for statement in FTS_DROP:
+            cursor.execute(statement)
+
+# Turn what staff typed into an FTS5 query: every word must appear, the last one as a prefix so results
+# narrow while typing. Words are quoted, so FTS5 operators and punctuation in the input are just text.
+def fts_query(text):
+    terms = QUERY_TERM.findall(text or '')
+    if not terms:
+        return None
+    return ' '.join([f'"{term}"' for term in terms[:-1]] + [f'"{terms[-1]}"*'])
+
+def encode_cursor(score, pk):
+    return f"{score!r}_{pk}"
+
+def decode_cursor(value):
+    try:
+        score, pk = value.rsplit('_', 1)
+        return float(score), int(pk)
+    except (AttributeError, ValueError):
+        return None
+
+# Snippet text from FTS5 is raw ticket text; escape it, then turn the match markers into <mark>
+def highlight(snippet):
+    return mark_safe(escape(snippet).replace(MARK_START, '<mark>').replace(MARK_END, '</mark>'))
+
+# (id, score) of one page of matches, best first. filters maps Feedback fields to required values.
+def ranked_ids(match, filters, after, before, size):
+    from .models import Feedback
+    weights = ', '.join(str(weight) for weight in BM25_WEIGHTS)
+    where, params = [f"{FTS_TABLE} MATCH %s"], [match]
+    for field, value in filters.items():
+        where.append(f"feedback.{Feedback._meta.get_field(field).column} = %s")
+        params.append(value)
+    keyset, order = '', 'score, id'
+    cursor = before or after
+    if cursor is not None:
+        comparison = '<' if before else '>'
+        keyset = f"WHERE score {comparison} %s OR (score = %s AND id {comparison} %s)"
+        params.extend([cursor[0], cursor[0], cursor[1]])
+        if before:
+            order = 'score DESC, id DESC'
+    sql = (f"SELECT id, score FROM ("
+           f"SELECT {FTS_TABLE}.rowid AS id, bm25({FTS_TABLE}, {weights}) AS score FROM {FTS_TABLE} "
+           f"JOIN dashboard_feedback AS feedback ON feedback.id = {FTS_TABLE}.rowid "
+           f"WHERE {' AND '.join(where)}) {keyset} ORDER BY {order} LIMIT %s")
+    params.append(size + 1)
+    with connection.cursor() as db:
+        db.execute(sql, params)
+        return db.fetchall()
+
+def snippets(match, ids):
+    if not ids:
+        return {}
+    placeholders = ', '.join(['%s'] * len(ids))
+    sql = (f"SELECT rowid, snippet({FTS_TABLE}, -1, %s, %s, '…', %s) FROM {FTS_TABLE} "
+           f"WHERE {FTS_TABLE} MATCH %s AND rowid IN ({placeholders})")
+    with connection.cursor() as db:
+        db.execute(sql, [MARK_START, MARK_END, SNIPPET_TOKENS, match, *ids])
+        return {pk: highlight(snippet) for pk, snippet in db.fetchall()}
+
+# One page of tickets matching text, as a KeysetPage like keyset_page(), each row with a search_snippet.
+# filters are applied in the ranking query; queryset decides which columns are loaded for the page.
+def search_feedback(queryset, text, filters=None, after=None, before=None, size=25):
+    match = fts_query(text)
+    if match is None:
+        return KeysetPage([])
+    after, before = decode_cursor(after), decode_cursor(before)
+    ranked = ranked_ids(match, filters or {}, after, before, size)
+    has_more = len(ranked) > size
+    ranked = ranked[:size]
+    if before is not None:
+        ranked.reverse()
+    rows = queryset.in_bulk([pk for pk, _ in ranked])
+    highlighted = snippets(match, [pk for pk, _ in ranked])
+    page = []
+    for pk, score in ranked:
+        if pk in rows:
+            row = rows[pk]
+            row.search_snippet = highlighted.get(pk, '')
+            page.append(row)
+    if not ranked:
+        return KeysetPage(page)
+    first, last = encode_cursor(ranked[0][1], ranked[0][0]), encode_cursor(ranked[-1][1], ranked[-1][0])
+    if before is not None:
+        return KeysetPage(page, last, first if has_more else None)
+    return KeysetPage(page, last if has_more else None, first if after is not None else None)
@@ -0,0 +1,102 @@
+import json
+import mmap
+import os
+import numpy as np
+
+# On-disk index file format shared by every server process
+#
+#   8 bytes   magic b'PLANRIX1'
+#   8 bytes   header length (little-endian uint64)
+#   header    JSON: free-form metadata plus {"sections": {name: [dtype, shape, offset]}}
+#   sections  raw little-endian arrays, each starting on a 64-byte boundary
+#
+# Readers mmap the file and wrap each section with np.frombuffer, so opening an index only parses the
+# small JSON header and every worker shares one page-cache copy of the arrays. Writers build the whole
+# file under a temporary name and os.replace() it into place: a reader sees the old file or the new
+# one, never a half-written one, and workers still mapping the old file keep a valid view of it.
+
+MAGIC = b'PLANRIX1'
+ALIGNMENT = 64
+
+def _aligned(position):
+    return (position + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+def write_index_file(path, arrays, metadata=None):
+    arrays = {name: np.ascontiguousarray(array) for name, array in arrays.items()}
+    # Lay out sections after a header whose size depends on the layout, so iterate until it settles
+    header_length = 0
+    while True:
+        position = _aligned(16 + header_length)
+        sections = {}
+        for name, array in arrays.items():
+            sections[name] = [array.dtype.newbyteorder('<').str, list(array.shape), position]
+            position = _aligned(position + array.nbytes)
+        header = json.dumps(dict(metadata or {}, sections=sections)).encode('utf-8')
+        if len(header) == header_length:
+            break
+        header_length = len(header)
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(len(header).to_bytes(8, 'little'))
+        f.write(header)
+        for name, array in arrays.items():
+            f.seek(sections[name][2])
+            f.write(array.astype(array.dtype.newbyteorder('<'), copy=False).tobytes())
+        f.truncate(max(position, f.tell()))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class IndexFile:
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.stat = os.fstat(f.fileno())
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.mmap[:8] != MAGIC:
+            raise ValueError(f"{path} is not a Planr index file")
+        header_length = int.from_bytes(self.mmap[8:16], 'little')
+        self.metadata = json.loads(self.mmap[16:16 + header_length])
+        self.arrays = {}
+        for name, (dtype, shape, offset) in self.metadata.pop('sections').items():
+            dtype = np.dtype(dtype)
+            count = int(np.prod(shape)) if shape else 1
+            self.arrays[name] = np.frombuffer(self.mmap, dtype=dtype, count=count, offset=offset).reshape(shape)
+
+    def __getitem__(self, name):
+        return self.arrays[name]
+
+    def __contains__(self, name):
+        return name in self.arrays
+
+    # True once a rebuild has swapped a different file into self.path
+    def is_stale(self):
+        try:
+            current = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        return (current.st_ino, current.st_mtime_ns) != (self.stat.st_ino, self.stat.st_mtime_ns)
+
+
+# Variable-length records (one JSON object per chunk) stored as a byte blob plus an offset table
+def pack_records(records):
+    blobs = [json.dumps(record, separators=(',', ':')).encode('utf-8') for record in records]
+    offsets = np.zeros(len(blobs) + 1, dtype=np.int64)
+    np.cumsum([len(blob) for blob in blobs], out=offsets[1:])
+    return np.frombuffer(b''.join(blobs), dtype=np.uint8), offsets
+
+
+class RecordTable:
+    def __init__(self, data, offsets):
+        self.data = data
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return json.loads(self.data[self.offsets[i]:self.offsets[i + 1]].tobytes())
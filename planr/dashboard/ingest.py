@@ -0,0 +1,104 @@
+import hashlib
+from itertools import islice
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from .embeddings import embed_texts
+from .models import RagChunk, RagDocument
+from .retrieval import chunk_text, load_documents
+
+# Incremental ingestion of the DCC corpus into RagDocument/RagChunk
+# Documents stream through generator stages: parse -> chunk -> hash -> store -> embed.
+# Chunks are keyed by content hash, so an edited page only re-embeds the chunks whose text changed
+# (unchanged chunks keep their stored embedding even if they moved) and stale chunks are deleted.
+# Embeddings are written one batch at a time: the database is the checkpoint, and an interrupted
+# run resumes by embedding whatever chunks are still empty.
+
+def content_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+# parse -> chunk -> hash: (document, [(position, text, hash), ...])
+def hashed_chunks(documents, chunk_words=200, overlap=40):
+    for document in documents:
+        chunks = [
+            (position, text, content_hash(text))
+            for position, text in enumerate(chunk_text(document['text'], chunk_words, overlap))
+        ]
+        yield document, chunks
+
+# store: upsert each document and its chunks; yields each url so the caller can prune missing documents
+# (the document hash covers the chunking settings, so changing them re-chunks everything)
+def store_documents(hashed, stats, chunk_words=200, overlap=40):
+    model = settings.PLANR_EMBED_MODEL
+    for document, chunks in hashed:
+        doc_hash = content_hash(f"{chunk_words}:{overlap}:{document['text']}")
+        existing = RagDocument.objects.filter(url=document['url']).first()
+        if existing and existing.content_hash == doc_hash and existing.title == document['title']:
+            stats['unchanged'] += 1
+            yield document['url']
+            continue
+        with transaction.atomic():
+            doc, created = RagDocument.objects.update_or_create(
+                url=document['url'],
+                defaults={'title': document['title'], 'content_hash': doc_hash},
+            )
+            # Reuse stored embeddings for chunks whose text is unchanged
+            old_chunks = {chunk.content_hash: chunk for chunk in doc.chunks.all()}
+            new_chunks = []
+            for position, text, chunk_hash in chunks:
+                old = old_chunks.get(chunk_hash)
+                reuse = old is not None and old.embedding is not None and old.embedding_model == model
+                new_chunks.append(RagChunk(
+                    document=doc,
+                    position=position,
+                    text=text,
+                    content_hash=chunk_hash,
+                    embedding=old.embedding if reuse else None,
+                    embedding_model=model if reuse else '',
+                ))
+                stats['reused' if reuse else 'new_chunks'] += 1
+            stats['deleted_chunks'] += len(set(old_chunks) - {chunk_hash for _, _, chunk_hash in chunks})
+            doc.chunks.all().delete()
+            RagChunk.objects.bulk_create(new_chunks, batch_size=500)
+        stats['created' if created else 'updated'] += 1
+        yield document['url']
+
+# embed: every chunk without an embedding from the current model, in batches
+def embed_pending_chunks(batch_size=64, log=None):
+    model = settings.PLANR_EMBED_MODEL
+    # Snapshot the ids first rather than holding a cursor open while updating the same table
+    pending_ids = list(RagChunk.objects.exclude(embedding_model=model).order_by('id').values_list('id', flat=True))
+    total = len(pending_ids)
+    done = 0
+    for batch_ids in batched(pending_ids, batch_size):
+        batch = list(RagChunk.objects.filter(id__in=batch_ids).only('id', 'text'))
+        embeddings = embed_texts(chunk.text for chunk in batch)
+        if embeddings is None:
+            raise RuntimeError(f"Embedding failed after {done}/{total} chunks. Is Ollama running with {model}? Re-run to resume.")
+        for chunk, embedding in zip(batch, embeddings):
+            chunk.embedding = np.asarray(embedding, dtype=np.float32).tobytes()
+            chunk.embedding_model = model
+        RagChunk.objects.bulk_update(batch, ['embedding', 'embedding_model'])
+        done += len(batch)
+        if log:
+            log(f"Embedded {done}/{total} chunks")
+    return done
+
+def ingest_documents(source_dir, chunk_words=200, overlap=40, batch_size=64, prune=True, log=None):
+    stats = {'created': 0, 'updated': 0, 'unchanged': 0, 'deleted': 0,
+             'new_chunks': 0, 'reused': 0, 'deleted_chunks': 0, 'embedded': 0}
+    hashed = hashed_chunks(load_documents(source_dir), chunk_words, overlap)
+    seen = set(store_documents(hashed, stats, chunk_words, overlap))
+    if prune:
+        # Documents that have disappeared from the source folder (their chunks cascade)
+        stale_ids = [pk for pk, url in RagDocument.objects.values_list('id', 'url') if url not in seen]
+        for batch_ids in batched(stale_ids, 500):
+            RagDocument.objects.filter(id__in=batch_ids).delete()
+        stats['deleted'] = len(stale_ids)
+    stats['embedded'] = embed_pending_chunks(batch_size, log)
+    return stats
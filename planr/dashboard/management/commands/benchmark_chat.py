@@ -0,0 +1,72 @@
+import json
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from dashboard import backends
+from dashboard.telemetry import get_metrics_buffer, summarize_metrics
+from dashboard.transcripts import get_transcript_buffer
+from dashboard.benchmark import (
+    SCENARIOS, SERVERS, create_benchmark_database, destroy_benchmark_database, run_benchmark, start_fake_ollama,
+)
+
+# Load test /api/chat/ before a deploy, e.g.
+#   python manage.py benchmark_chat --concurrency 1 8 32 --requests 200 --output before.json
+# Everything runs in this process against a fake Ollama and a throwaway test database; the real
+# database and Ollama are never touched. Compare the JSON from two runs to spot regressions.
+class Command(BaseCommand):
+    help = "Benchmark the chat API under WSGI and ASGI with a fake Ollama server."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--servers', nargs='+', choices=sorted(SERVERS), default=['wsgi', 'asgi'])
+        parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS),
+                            help="llm (cache misses), cache (repeated questions), greeting (fast path), tiers (premium/free mix).")
+        parser.add_argument('--concurrency', nargs='+', type=int, default=[1, 4, 16])
+        parser.add_argument('--requests', type=int, default=50, help="Requests per concurrency level.")
+        parser.add_argument('--premium-share', type=float, default=0.5, help="Share of premium users in the tiers scenario.")
+        parser.add_argument('--no-stream', action='store_true', help="Request whole JSON answers instead of NDJSON streams.")
+        parser.add_argument('--first-token-delay', type=float, default=0.1, help="Fake Ollama seconds before the first token.")
+        parser.add_argument('--token-delay', type=float, default=0.02, help="Fake Ollama seconds between tokens.")
+        parser.add_argument('--tokens', type=int, default=40, help="Tokens per fake answer.")
+        parser.add_argument('--llm-concurrency', type=int, help="Override PLANR_LLM_CONCURRENCY for the run.")
+        parser.add_argument('--output', help="Write the JSON report to this file instead of stdout.")
+
+    def handle(self, *args, **options):
+        fake_ollama, ollama_url = start_fake_ollama(options['first_token_delay'], options['token_delay'], options['tokens'])
+        settings.PLANR_OLLAMA_HOSTS = [ollama_url]
+        settings.PLANR_SEMANTIC_CACHE_PATH = None
+        if options['llm_concurrency']:
+            settings.PLANR_LLM_CONCURRENCY = options['llm_concurrency']
+        backends._pool = None  # make sure the pool is built against the fake server
+
+        database, cookies = create_benchmark_database()
+        started = timezone.now()
+        try:
+            results = run_benchmark(
+                options['servers'], options['scenarios'], options['concurrency'], options['requests'],
+                cookies=cookies, stream=not options['no_stream'], premium_share=options['premium_share'],
+                log=lambda line: self.stderr.write(line),
+            )
+            # Server-side view of the same run (TTFT, queue wait, cache hits) from the chat telemetry
+            get_metrics_buffer().flush()
+            chat_metrics = summarize_metrics(started)
+        finally:
+            # Write whatever is still buffered (transcripts, metrics of a failed run) while the test database exists
+            get_transcript_buffer().flush()
+            get_metrics_buffer().flush()
+            destroy_benchmark_database(database)
+            fake_ollama.shutdown()
+
+        report = json.dumps({
+            'config': {key: options[key] for key in (
+                'servers', 'scenarios', 'concurrency', 'requests', 'premium_share', 'no_stream',
+                'first_token_delay', 'token_delay', 'tokens',
+            )} | {'llm_concurrency': settings.PLANR_LLM_CONCURRENCY, 'llm_queue_limits': settings.PLANR_LLM_QUEUE_LIMITS},
+            'results': results,
+            'chat_metrics': chat_metrics,
+        }, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(report)
+            self.stderr.write(self.style.SUCCESS(f"Report written to {options['output']}"))
+        else:
+            self.stdout.write(report)
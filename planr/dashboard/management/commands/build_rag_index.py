@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from dashboard.answer_cache import clear_answer_cache
+from dashboard.retrieval import build_index_from_store
+
+# Rebuild the RAG index from the embedded chunks in the document store (see ingest_documents)
+class Command(BaseCommand):
+    help = "Rebuild the chatbot's retrieval index from stored DCC document chunks."
+
+    def handle(self, *args, **options):
+        index = build_index_from_store()
+        # Written to a temp file and swapped in atomically; running workers pick it up on their next check
+        index.save(settings.PLANR_RAG_INDEX_PATH)
+        # Cached answers were generated from the old records. Semantic cache entries are tied to the index
+        # build, so every worker drops its own (and the saved store's) once it sees the new index.
+        clear_answer_cache()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {len(index)} chunks into {settings.PLANR_RAG_INDEX_PATH}."))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from PIL import Image, UnidentifiedImageError
+from dashboard.models import Feedback, ImageRendition, UserProfile
+from dashboard.renditions import PROFILE_PIC_PRESETS, SCREENSHOT_PRESETS, STATIC_IMAGES, STATIC_PREFIX, build_renditions
+
+# Make thumbnails and WebP renditions for every profile picture, feedback screenshot and static image
+# Uploads are processed as they arrive; run this once after deploying, and again with --force after
+# changing PLANR_IMAGE_RENDITIONS
+class Command(BaseCommand):
+    help = "Build image renditions for profile pictures, screenshots and static images."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Rebuild renditions that already exist.")
+
+    def handle(self, *args, **options):
+        jobs = [(f"{STATIC_PREFIX}{path}", preset) for path, preset in STATIC_IMAGES]
+        profile_pics = UserProfile.objects.exclude(profile_pic='').values_list('profile_pic', flat=True).distinct()
+        jobs += [(name, preset) for name in profile_pics for preset in PROFILE_PIC_PRESETS]
+        screenshots = Feedback.objects.exclude(screenshot='').exclude(screenshot=None).values_list('screenshot', flat=True)
+        jobs += [(name, preset) for name in screenshots.iterator() for preset in SCREENSHOT_PRESETS]
+        if not options['force']:
+            done = set(ImageRendition.objects.values_list('source', 'preset'))
+            jobs = [job for job in jobs if job not in done]
+        built = failed = 0
+        for source, preset in jobs:
+            try:
+                build_renditions(source, preset)
+                built += 1
+            except (OSError, UnidentifiedImageError, Image.DecompressionBombError) as e:
+                failed += 1
+                self.stderr.write(f"Skipped {source} ({preset}): {e}")
+        self.stdout.write(self.style.SUCCESS(f"Built {built} renditions ({failed} skipped)."))
@@ -0,0 +1,51 @@
+import json
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from dashboard.telemetry import summarize_metrics, summarize_routing
+
+# Chatbot latency report from ChatMetric: p50/p95/p99 total time and TTFT, queue wait, tokens/sec and
+# cache hit rate per model and member tier, then latency per routed model tier (same numbers as the
+# staff endpoint /api/chat/metrics/)
+class Command(BaseCommand):
+    help = "Show chatbot latency percentiles and throughput by model and tier."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=float, default=24, help="How far back to look (default 24).")
+        parser.add_argument('--bucket', choices=['hour', 'day'], help="Split the window per hour or day.")
+        parser.add_argument('--json', action='store_true', help="Print JSON instead of a table.")
+
+    def handle(self, *args, **options):
+        since = timezone.now() - timedelta(hours=options['hours'])
+        summary = summarize_metrics(since, options['bucket'])
+        routing = summarize_routing(since)
+        if options['json']:
+            self.stdout.write(json.dumps({'metrics': summary, 'routing': routing}, indent=2))
+            return
+        if not summary:
+            self.stdout.write("No chat metrics recorded in this window.")
+            return
+        header = f"{'bucket':<20} {'model':<16} {'tier':<8} {'reqs':>6} {'req/min':>8} {'cache':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'ttft p50':>9} {'ttft p95':>9} {'tok/s':>7}"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for row in summary:
+            total, ttft = row['total_ms'], row['ttft_ms']
+            self.stdout.write(
+                f"{(row['bucket'] or 'all')[:19]:<20} {row['model'][:16]:<16} {row['tier']:<8} {row['requests']:>6} "
+                f"{row['requests_per_minute']:>8} {row['cache_hit_rate']:>6.0%} {fmt(total['p50'])} {fmt(total['p95'])} "
+                f"{fmt(total['p99'])} {fmt(ttft['p50'], 9)} {fmt(ttft['p95'], 9)} {fmt(row['tokens_per_second'], 7)}"
+            )
+        if routing:
+            self.stdout.write('')
+            header = f"{'route':<8} {'reqs':>6} {'share':>6} {'escalated':>9} {'mean ms':>8} {'p50 ms':>8} {'p95 ms':>8}  reasons"
+            self.stdout.write(header)
+            self.stdout.write('-' * len(header))
+            for row in routing:
+                reasons = ', '.join(f"{reason} {count}" for reason, count in row['reasons'].items())
+                self.stdout.write(
+                    f"{row['route']:<8} {row['requests']:>6} {row['share']:>6.0%} {row['escalation_rate']:>9.0%} "
+                    f"{fmt(row['mean_total_ms'])} {fmt(row['total_ms']['p50'])} {fmt(row['total_ms']['p95'])}  {reasons}"
+                )
+
+def fmt(value, width=8):
+    return f"{'-' if value is None else value:>{width}}"
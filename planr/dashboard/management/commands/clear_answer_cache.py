@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from dashboard.answer_cache import CACHE_ALIAS, answer_cache_stats, clear_answer_cache
+from dashboard.semantic_cache import get_semantic_cache
+
+# Purge cached chatbot answers, e.g. after editing DCC_SYSTEM_PROMPT or re-scraping DCC data
+# Note: LocMemCache and the in-memory semantic cache live inside each server process, so this command
+# only reaches server processes through a shared CACHES['planr_answers'] backend (see checks.py); it also
+# deletes the saved semantic store
+class Command(BaseCommand):
+    help = "Clear the chatbot answer cache (CACHES['planr_answers'])."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stats', action='store_true', help="Only print hit/miss counters, don't clear.")
+
+    def handle(self, *args, **options):
+        stats = answer_cache_stats()
+        self.stdout.write(f"{CACHE_ALIAS}: {stats['hits']} hits, {stats['misses']} misses (hit rate {stats['hit_rate']:.1%})")
+        if options['stats']:
+            return
+        clear_answer_cache()
+        get_semantic_cache().delete_saved()
+        self.stdout.write(self.style.SUCCESS("Answer cache cleared."))
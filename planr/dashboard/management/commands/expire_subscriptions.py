@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from dashboard.utils import expire_lapsed_subscriptions, lapsed_premium_profiles
+
+# Downgrade every premium profile whose premium_until has passed, in one UPDATE
+# Run daily (e.g. cron: `0 1 * * * python manage.py expire_subscriptions`) so people who stay logged in
+# are downgraded too; login only re-checks the user logging in
+class Command(BaseCommand):
+    help = "Set lapsed premium profiles back to free."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Only count the lapsed profiles.")
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            self.stdout.write(f"{lapsed_premium_profiles().count()} premium profiles have lapsed.")
+            return
+        expired = expire_lapsed_subscriptions()
+        self.stdout.write(self.style.SUCCESS(f"Expired {expired} premium profiles."))
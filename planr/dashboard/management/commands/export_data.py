@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+from dashboard.exports import DATASETS, FORMATS, ExportError, export_chunks
+
+# Export feedback, subscription transactions or chat usage as CSV or JSON Lines
+# Rows are streamed to the file (or stdout) as they're read, so exports of any size run in flat memory:
+#   python manage.py export_data transactions --since 2026-01-01 --until 2026-03-31 -o q1.csv
+class Command(BaseCommand):
+    help = "Export feedback, transactions or chat usage as CSV or JSON Lines."
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=list(DATASETS))
+        parser.add_argument('--format', choices=list(FORMATS), default='csv')
+        parser.add_argument('--since', help="First day to include (YYYY-MM-DD).")
+        parser.add_argument('--until', help="Last day to include (YYYY-MM-DD).")
+        parser.add_argument('--type', help="Feedback type, or chat outcome for chat_usage.")
+        parser.add_argument('--organisation', help="Organisation id or join code.")
+        parser.add_argument('--chunk-size', type=int, help="Rows fetched per query (default PLANR_EXPORT_CHUNK_SIZE).")
+        parser.add_argument('-o', '--output', help="File to write (default stdout).")
+
+    def handle(self, *args, **options):
+        try:
+            chunks = export_chunks(
+                options['dataset'], options['format'],
+                since=options['since'], until=options['until'],
+                type=options['type'], organisation=options['organisation'],
+                chunk_size=options['chunk_size'],
+            )
+        except ExportError as e:
+            raise CommandError(str(e))
+        if not options['output']:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+            return
+        # newline='' so the csv module's \r\n line endings are written as-is
+        with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+            for chunk in chunks:
+                output.write(chunk)
+        self.stderr.write(f"Wrote {options['dataset']} export to {options['output']}")
@@ -0,0 +1,35 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from dashboard.ingest import ingest_documents
+
+# Incrementally ingest a folder of scraped DCC documents (.jsonl pages, .txt, .md, .html)
+# Only changed chunks are re-embedded; an interrupted run resumes where it stopped when re-run
+class Command(BaseCommand):
+    help = "Parse, chunk, hash and embed new or changed DCC documents, then rebuild the RAG index."
+
+    def add_arguments(self, parser):
+        parser.add_argument('source_dir', help="Folder of scraped Dublin City Council documents.")
+        parser.add_argument('--chunk-words', type=int, default=200)
+        parser.add_argument('--overlap', type=int, default=40)
+        parser.add_argument('--batch-size', type=int, default=64, help="Chunks per embedding request.")
+        parser.add_argument('--keep-missing', action='store_true', help="Don't delete documents missing from source_dir.")
+        parser.add_argument('--no-index', action='store_true', help="Update the store only, skip build_rag_index.")
+
+    def handle(self, *args, **options):
+        try:
+            stats = ingest_documents(
+                options['source_dir'],
+                chunk_words=options['chunk_words'],
+                overlap=options['overlap'],
+                batch_size=options['batch_size'],
+                prune=not options['keep_missing'],
+                log=self.stdout.write,
+            )
+        except (OSError, RuntimeError) as e:
+            raise CommandError(str(e))
+        self.stdout.write(
+            f"Documents: {stats['created']} new, {stats['updated']} changed, {stats['unchanged']} unchanged, {stats['deleted']} deleted. "
+            f"Chunks: {stats['new_chunks']} new, {stats['reused']} reused, {stats['deleted_chunks']} deleted, {stats['embedded']} embedded."
+        )
+        if not options['no_index']:
+            call_command('build_rag_index', stdout=self.stdout)
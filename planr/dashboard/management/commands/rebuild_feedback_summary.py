@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from dashboard.feedback_analytics import rebuild_feedback_summary
+
+# Recompute FeedbackSummary from the Feedback table
+# The views keep the summary up to date as tickets change; run this after bulk edits or edits made in
+# the Django admin, or if the analytics page ever disagrees with the tracker
+class Command(BaseCommand):
+    help = "Rebuild the feedback analytics summary from scratch."
+
+    def handle(self, *args, **options):
+        rows = rebuild_feedback_summary()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} feedback summary rows."))
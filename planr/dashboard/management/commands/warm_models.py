@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from dashboard.warmup import keep_warm, warm_up_models
+import threading
+
+# Preload the chatbot's Ollama models, e.g. from a deploy script; --keep-warm keeps running and
+# re-warms them during business hours (for cron/systemd setups instead of the in-process thread)
+class Command(BaseCommand):
+    help = "Load the Planr Ollama models and keep them resident."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep-warm', action='store_true', help="Keep running and re-warm periodically.")
+
+    def handle(self, *args, **options):
+        if options['keep_warm']:
+            self.stdout.write("Keeping models warm (Ctrl+C to stop)...")
+            keep_warm(threading.Event())
+            return
+        for host, warmed in warm_up_models().items():
+            if warmed:
+                self.stdout.write(self.style.SUCCESS(f"{host}: warmed up {', '.join(warmed)}"))
+            else:
+                self.stderr.write(f"{host}: no models could be warmed up. Is Ollama running?")
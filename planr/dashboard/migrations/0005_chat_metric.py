@@ -0,0 +1,33 @@
+# Generated by Django 4.2.25 on 2026-10-18 10:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0004_rag_document_store'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChatMetric',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(db_index=True)),
+                ('model', models.CharField(max_length=100)),
+                ('tier', models.CharField(max_length=10)),
+                ('outcome', models.CharField(choices=[('canned', 'Canned answer'), ('exact_cache', 'Exact cache hit'), ('semantic_cache', 'Semantic cache hit'), ('llm', 'LLM answer'), ('degraded', 'Degraded (Ollama unavailable)'), ('interrupted', 'Interrupted'), ('busy', 'Rejected (queue full)'), ('unavailable', 'Rejected (Ollama unavailable)')], max_length=20)),
+                ('backend', models.CharField(blank=True, max_length=200)),
+                ('total_ms', models.FloatField()),
+                ('ttft_ms', models.FloatField(null=True)),
+                ('queue_wait_ms', models.FloatField(null=True)),
+                ('prompt_eval_count', models.PositiveIntegerField(null=True)),
+                ('prompt_eval_ms', models.FloatField(null=True)),
+                ('eval_count', models.PositiveIntegerField(null=True)),
+                ('eval_ms', models.FloatField(null=True)),
+                ('load_ms', models.FloatField(null=True)),
+                ('ollama_total_ms', models.FloatField(null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.25 on 2026-10-18 10:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0005_chat_metric'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='chatmetric',
+            name='outcome',
+            field=models.CharField(choices=[('canned', 'Canned answer'), ('exact_cache', 'Exact cache hit'), ('semantic_cache', 'Semantic cache hit'), ('llm', 'LLM answer'), ('coalesced', 'Shared an identical in-flight question'), ('degraded', 'Degraded (Ollama unavailable)'), ('interrupted', 'Interrupted'), ('busy', 'Rejected (queue full)'), ('unavailable', 'Rejected (Ollama unavailable)')], max_length=20),
+        ),
+    ]
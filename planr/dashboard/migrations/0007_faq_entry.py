@@ -0,0 +1,37 @@
+# Generated by Django 4.2.25 on 2026-10-18 10:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0006_chat_metric_coalesced'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FaqEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('question', models.CharField(max_length=300)),
+                ('alternative_questions', models.TextField(blank=True, help_text='Other ways people ask this, one per line')),
+                ('answer', models.TextField()),
+                ('source_title', models.CharField(blank=True, max_length=300)),
+                ('source_url', models.URLField(blank=True, max_length=500)),
+                ('is_active', models.BooleanField(default=True)),
+                ('hit_count', models.PositiveIntegerField(default=0, editable=False)),
+                ('last_hit_at', models.DateTimeField(blank=True, editable=False, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'FAQ entry',
+                'verbose_name_plural': 'FAQ entries',
+            },
+        ),
+        migrations.AlterField(
+            model_name='chatmetric',
+            name='outcome',
+            field=models.CharField(choices=[('canned', 'Canned answer'), ('faq', 'FAQ answer'), ('exact_cache', 'Exact cache hit'), ('semantic_cache', 'Semantic cache hit'), ('llm', 'LLM answer'), ('coalesced', 'Shared an identical in-flight question'), ('degraded', 'Degraded (Ollama unavailable)'), ('interrupted', 'Interrupted'), ('busy', 'Rejected (queue full)'), ('unavailable', 'Rejected (Ollama unavailable)')], max_length=20),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.25 on 2026-10-18 10:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0007_faq_entry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatmetric',
+            name='escalated',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='chatmetric',
+            name='route',
+            field=models.CharField(blank=True, max_length=10),
+        ),
+        migrations.AddField(
+            model_name='chatmetric',
+            name='route_reason',
+            field=models.CharField(blank=True, max_length=20),
+        ),
+    ]
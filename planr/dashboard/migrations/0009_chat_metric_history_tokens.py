@@ -0,0 +1,18 @@
+# Generated by Django 4.2.25 on 2026-10-18 10:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0008_chat_metric_routing'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatmetric',
+            name='history_tokens',
+            field=models.PositiveIntegerField(null=True),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.25 on 2026-10-18 10:44
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('dashboard', '0009_chat_metric_history_tokens'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChatTurn',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField()),
+                ('conversation_id', models.CharField(blank=True, max_length=32)),
+                ('question', models.TextField()),
+                ('answer', models.TextField(blank=True)),
+                ('model', models.CharField(max_length=100)),
+                ('outcome', models.CharField(choices=[('canned', 'Canned answer'), ('faq', 'FAQ answer'), ('exact_cache', 'Exact cache hit'), ('semantic_cache', 'Semantic cache hit'), ('llm', 'LLM answer'), ('coalesced', 'Shared an identical in-flight question'), ('degraded', 'Degraded (Ollama unavailable)'), ('interrupted', 'Interrupted'), ('busy', 'Rejected (queue full)'), ('unavailable', 'Rejected (Ollama unavailable)')], max_length=20)),
+                ('prompt_tokens', models.PositiveIntegerField(default=0)),
+                ('completion_tokens', models.PositiveIntegerField(default=0)),
+                ('organisation', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='dashboard.organisation')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['organisation', 'created_at'], name='dashboard_c_organis_31fb4b_idx'), models.Index(fields=['user', 'created_at'], name='dashboard_c_user_id_1899df_idx')],
+            },
+        ),
+    ]
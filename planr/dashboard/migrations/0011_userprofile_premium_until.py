@@ -0,0 +1,40 @@
+# Generated by Django 4.2.25 on 2026-10-18 10:45
+
+from django.db import migrations, models
+from django.db.models import Max, OuterRef, Subquery
+
+
+# Copy each user's latest subscription expiry onto their profile (one UPDATE)
+def fill_premium_until(apps, schema_editor):
+    UserProfile = apps.get_model('dashboard', 'UserProfile')
+    SubscriptionTransaction = apps.get_model('dashboard', 'SubscriptionTransaction')
+    latest = (SubscriptionTransaction.objects
+              .filter(user_id=OuterRef('user_id'))
+              .values('user_id')
+              .annotate(latest=Max('valid_until'))
+              .values('latest'))
+    UserProfile.objects.update(premium_until=Subquery(latest))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0010_chat_turn'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='premium_until',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='subscriptiontransaction',
+            index=models.Index(fields=['user', 'valid_until'], name='dashboard_s_user_id_4289d7_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userprofile',
+            index=models.Index(fields=['member_status', 'premium_until'], name='dashboard_u_member__b78f6f_idx'),
+        ),
+        migrations.RunPython(fill_premium_until, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.25 on 2026-10-18 10:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0011_userprofile_premium_until'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='feedback',
+            index=models.Index(fields=['created_at', 'id'], name='dashboard_f_created_5254a9_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='feedback',
+            index=models.Index(fields=['feedback_type', 'created_at'], name='dashboard_f_feedbac_772b1b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='feedback',
+            index=models.Index(fields=['status', 'created_at'], name='dashboard_f_status_02ea5c_idx'),
+        ),
+    ]
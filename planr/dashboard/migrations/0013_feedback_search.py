@@ -0,0 +1,25 @@
+# Generated by Django 4.2.25 on 2026-10-18 16:20
+
+from django.db import migrations
+
+
+# FTS5 index and triggers for feedback search (see dashboard/feedback_search.py); SQLite only
+def install(apps, schema_editor):
+    from dashboard.feedback_search import install_feedback_search
+    install_feedback_search(schema_editor.connection)
+
+
+def uninstall(apps, schema_editor):
+    from dashboard.feedback_search import uninstall_feedback_search
+    uninstall_feedback_search(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0012_feedback_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
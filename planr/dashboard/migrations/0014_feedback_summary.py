@@ -0,0 +1,58 @@
+# Generated by Django 4.2.25 on 2026-10-18 11:11
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+
+
+# Summary rows for the existing tickets, in one GROUP BY (none of them have a resolved_at yet)
+def fill_feedback_summary(apps, schema_editor):
+    Feedback = apps.get_model('dashboard', 'Feedback')
+    FeedbackSummary = apps.get_model('dashboard', 'FeedbackSummary')
+    groups = (Feedback.objects
+              .annotate(day=TruncDate('created_at'))
+              .values('day', 'feedback_type', 'status')
+              .annotate(tickets=Count('id'),
+                        rated=Count('id', filter=Q(rating__gt=0)),
+                        rating_total=Sum('rating'),
+                        responded=Count('id', filter=Q(admin_response__gt='')))
+              .order_by())
+    FeedbackSummary.objects.bulk_create([FeedbackSummary(**group) for group in groups], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0013_feedback_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedbackSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('feedback_type', models.CharField(choices=[('bug', 'Bug or Error'), ('suggestion', 'Feature Suggestion'), ('prompt', 'Prompt Issue'), ('ui', 'UI/UX Issue'), ('other', 'Other')], max_length=15)),
+                ('status', models.CharField(choices=[('in_progress', 'In Progress'), ('resolved', 'Resolved')], max_length=20)),
+                ('tickets', models.IntegerField(default=0)),
+                ('rated', models.IntegerField(default=0)),
+                ('rating_total', models.IntegerField(default=0)),
+                ('responded', models.IntegerField(default=0)),
+                ('timed_resolutions', models.IntegerField(default=0)),
+                ('resolution_seconds', models.FloatField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'feedback summaries',
+            },
+        ),
+        migrations.AddField(
+            model_name='feedback',
+            name='resolved_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='feedbacksummary',
+            constraint=models.UniqueConstraint(fields=('day', 'feedback_type', 'status'), name='unique_feedback_summary'),
+        ),
+        migrations.RunPython(fill_feedback_summary, migrations.RunPython.noop),
+    ]
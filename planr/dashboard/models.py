@@ -1,10 +1,15 @@
 from django.db import models
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
+from django.db.models import Value
+from django.db.models.functions import Coalesce, Greatest
 from django.contrib.auth.models import User
 from django.dispatch import receiver
+from django.utils import timezone
 import uuid
 
 # User profile extension (status + profile picture)
+# premium_until is the latest subscription's valid_until, kept up to date when transactions are created
+# (see extend_premium below) so checking or expiring premium never has to query SubscriptionTransaction
 class UserProfile(models.Model):
     STATUS_CHOICES = [
         ('free', 'Free'),
@@ -13,6 +18,10 @@ class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     member_status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='free')
     profile_pic = models.ImageField(upload_to='profile_pics/', default='profile_pics/default.jpg', blank=True)
+    premium_until = models.DateField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['member_status', 'premium_until'])]
 
     def __str__(self):
         return f"{self.user.username} Profile"
@@ -30,6 +39,21 @@ class SubscriptionTransaction(models.Model):
     transaction_date = models.DateField(auto_now_add=True)
     valid_until = models.DateField()
 
+    class Meta:
+        indexes = [models.Index(fields=['user', 'valid_until'])]
+
+# A new payment extends the profile's premium_until (never shortens it) and makes a live plan premium,
+# in a single UPDATE
+@receiver(post_save, sender=SubscriptionTransaction)
+def extend_premium(sender, instance, created, **kwargs):
+    if not created:
+        return
+    valid_until = Value(instance.valid_until, output_field=models.DateField())
+    changes = {'premium_until': Greatest(Coalesce('premium_until', valid_until), valid_until)}
+    if instance.valid_until >= timezone.now().date():
+        changes['member_status'] = 'premium'
+    UserProfile.objects.filter(user_id=instance.user_id).update(**changes)
+
 # Record feedback cases for users
 class Feedback(models.Model):
     FEEDBACK_TYPE_CHOICES = [
@@ -62,10 +86,47 @@ class Feedback(models.Model):
     )
     admin_response = models.TextField(blank=True, null=True, help_text="Admin/staff response to feedback (if any).")
     created_at = models.DateTimeField(auto_now_add=True)
+    resolved_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    # The tracker pages by (created_at, id), optionally filtered by type or status
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id']),
+            models.Index(fields=['feedback_type', 'created_at']),
+            models.Index(fields=['status', 'created_at']),
+        ]
 
     def __str__(self):
         return f"Feedback ({self.get_feedback_type_display()}) by {self.user.username}"
 
+# Feedback totals per creation day, type and status, kept up to date by feedback_analytics.py so the
+# staff analytics page never has to aggregate the Feedback table itself
+class FeedbackSummary(models.Model):
+    day = models.DateField()
+    feedback_type = models.CharField(max_length=15, choices=Feedback.FEEDBACK_TYPE_CHOICES)
+    status = models.CharField(max_length=20, choices=Feedback.STATUS_CHOICES)
+    tickets = models.IntegerField(default=0)
+    rated = models.IntegerField(default=0)             # tickets with a rating (0 means not rated)
+    rating_total = models.IntegerField(default=0)
+    responded = models.IntegerField(default=0)         # tickets with an admin response
+    timed_resolutions = models.IntegerField(default=0) # resolved tickets with a resolved_at
+    resolution_seconds = models.FloatField(default=0)
+
+    class Meta:
+        verbose_name_plural = 'feedback summaries'
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'feedback_type', 'status'], name='unique_feedback_summary'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.feedback_type} {self.status}: {self.tickets}"
+
+# Ticket deletions (the admin, or a user account being removed) come off the summary straight away
+@receiver(post_delete, sender=Feedback)
+def remove_feedback_from_summary(sender, instance, **kwargs):
+    from .feedback_analytics import apply_contribution, feedback_contribution
+    apply_contribution(feedback_contribution(instance), -1)
+
 
 # Organisation model
 class Organisation(models.Model):
@@ -94,4 +155,142 @@ class OrganisationMembership(models.Model):
     joined_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
-        return f"{self.user.username} in {self.organisation.name} ({self.role})"
\ No newline at end of file
+        return f"{self.user.username} in {self.organisation.name} ({self.role})"
+
+# RAG document store (filled by `manage.py ingest_documents`, indexed by `manage.py build_rag_index`)
+class RagDocument(models.Model):
+    url = models.CharField(max_length=500, unique=True)
+    title = models.CharField(max_length=300)
+    content_hash = models.CharField(max_length=64)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.title
+
+# One chunk of a document; embedding is float32 bytes, empty until the embedding step reaches it
+class RagChunk(models.Model):
+    document = models.ForeignKey(RagDocument, related_name='chunks', on_delete=models.CASCADE)
+    position = models.PositiveIntegerField()
+    text = models.TextField()
+    content_hash = models.CharField(max_length=64, db_index=True)
+    embedding = models.BinaryField(null=True, blank=True)
+    embedding_model = models.CharField(max_length=100, blank=True)
+
+    class Meta:
+        ordering = ['document', 'position']
+
+    def __str__(self):
+        return f"{self.document.title} #{self.position}"
+
+# Performance of one chatbot request, written in batches by telemetry.py (see `manage.py chat_metrics`)
+# Durations are milliseconds; the Ollama fields are only set when the LLM actually answered
+class ChatMetric(models.Model):
+    OUTCOME_CHOICES = [
+        ('canned', 'Canned answer'),
+        ('faq', 'FAQ answer'),
+        ('exact_cache', 'Exact cache hit'),
+        ('semantic_cache', 'Semantic cache hit'),
+        ('llm', 'LLM answer'),
+        ('coalesced', 'Shared an identical in-flight question'),
+        ('degraded', 'Degraded (Ollama unavailable)'),
+        ('interrupted', 'Interrupted'),
+        ('busy', 'Rejected (queue full)'),
+        ('unavailable', 'Rejected (Ollama unavailable)'),
+    ]
+    created_at = models.DateTimeField(db_index=True)
+    model = models.CharField(max_length=100)
+    tier = models.CharField(max_length=10)
+    outcome = models.CharField(max_length=20, choices=OUTCOME_CHOICES)
+    backend = models.CharField(max_length=200, blank=True)
+    route = models.CharField(max_length=10, blank=True)  # 'fast' or 'strong' model tier, see routing.py
+    route_reason = models.CharField(max_length=20, blank=True)
+    escalated = models.BooleanField(default=False)
+    history_tokens = models.PositiveIntegerField(null=True)  # estimated conversation history sent with the prompt
+    total_ms = models.FloatField()
+    ttft_ms = models.FloatField(null=True)
+    queue_wait_ms = models.FloatField(null=True)
+    prompt_eval_count = models.PositiveIntegerField(null=True)
+    prompt_eval_ms = models.FloatField(null=True)
+    eval_count = models.PositiveIntegerField(null=True)
+    eval_ms = models.FloatField(null=True)
+    load_ms = models.FloatField(null=True)
+    ollama_total_ms = models.FloatField(null=True)
+
+    def __str__(self):
+        return f"{self.model} {self.outcome} ({self.total_ms:.0f} ms)"
+
+# One chatbot question and answer with the tokens it cost, written in batches by transcripts.py
+# organisation is the user's organisation when they asked, so usage can be metered per organisation
+class ChatTurn(models.Model):
+    created_at = models.DateTimeField()
+    user = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL)
+    organisation = models.ForeignKey(Organisation, null=True, blank=True, on_delete=models.SET_NULL)
+    conversation_id = models.CharField(max_length=32, blank=True)
+    question = models.TextField()
+    answer = models.TextField(blank=True)
+    model = models.CharField(max_length=100)
+    outcome = models.CharField(max_length=20, choices=ChatMetric.OUTCOME_CHOICES)
+    prompt_tokens = models.PositiveIntegerField(default=0)
+    completion_tokens = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['organisation', 'created_at']),
+            models.Index(fields=['user', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.user or 'Anonymous'}: {self.question[:50]}"
+
+# Resized copies of an image (renditions.py): files maps each format to [[width, storage name], ...]
+# source is a storage name, or "static:<path>" for an image in the static files
+class ImageRendition(models.Model):
+    source = models.CharField(max_length=300)
+    preset = models.CharField(max_length=30)
+    content_hash = models.CharField(max_length=64)
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    files = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['source', 'preset'], name='unique_image_rendition'),
+        ]
+
+    def __str__(self):
+        return f"{self.source} ({self.preset})"
+
+# Curated question/answer pair served by the chatbot's FAQ fast path (faq.py) without calling the LLM
+# alternative_questions holds other phrasings, one per line; hit_count is updated in batches
+class FaqEntry(models.Model):
+    question = models.CharField(max_length=300)
+    alternative_questions = models.TextField(blank=True, help_text="Other ways people ask this, one per line")
+    answer = models.TextField()
+    source_title = models.CharField(max_length=300, blank=True)
+    source_url = models.URLField(max_length=500, blank=True)
+    is_active = models.BooleanField(default=True)
+    hit_count = models.PositiveIntegerField(default=0, editable=False)
+    last_hit_at = models.DateTimeField(null=True, blank=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'FAQ entry'
+        verbose_name_plural = 'FAQ entries'
+
+    def phrasings(self):
+        return [self.question] + [line.strip() for line in self.alternative_questions.splitlines() if line.strip()]
+
+    def sources(self):
+        if not self.source_url:
+            return []
+        return [{'title': self.source_title or self.question, 'url': self.source_url}]
+
+    def __str__(self):
+        return self.question
+
+# Recompile this worker's FAQ index straight away; other workers notice within PLANR_FAQ_RELOAD_SECONDS
+@receiver([post_save, post_delete], sender=FaqEntry)
+def reload_faq_index(sender, **kwargs):
+    from .faq import invalidate_faq_index
+    invalidate_faq_index()
@@ -0,0 +1,54 @@
+from datetime import datetime, timedelta, timezone
+from django.db.models import Q
+
+# Keyset (cursor) pagination on (created_at, id), newest first
+# OFFSET pagination makes the database walk past every skipped row, so deep pages get slower as the
+# table grows. A cursor is the (created_at, id) of the last row shown; the next page is simply the rows
+# that sort after it, which an index ending in (created_at, id) finds directly however deep the page.
+# id breaks ties between rows created in the same instant. The redundant created_at <= / >= bound is
+# there because SQLite won't turn the OR into an index range on its own and would scan from the top.
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+# "<microseconds since 1970>_<id>": exact, and safe in a URL without escaping
+def encode_cursor(row):
+    delta = row.created_at - EPOCH
+    return f"{(delta.days * 86400 + delta.seconds) * 10**6 + delta.microseconds}_{row.pk}"
+
+def decode_cursor(value):
+    try:
+        micros, pk = value.split('_')
+        return EPOCH + timedelta(microseconds=int(micros)), int(pk)
+    except (AttributeError, ValueError, OverflowError):
+        return None
+
+class KeysetPage:
+    def __init__(self, rows, next_cursor=None, previous_cursor=None):
+        self.rows = rows
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+# One page of queryset: `after` continues towards older rows, `before` goes back towards newer ones
+def keyset_page(queryset, after=None, before=None, size=25):
+    after, before = decode_cursor(after), decode_cursor(before)
+    if before is not None:
+        created_at, pk = before
+        rows = list(queryset
+                    .filter(Q(created_at__gt=created_at) | Q(created_at=created_at, pk__gt=pk), created_at__gte=created_at)
+                    .order_by('created_at', 'pk')[:size + 1])
+        has_more = len(rows) > size
+        rows = rows[:size][::-1]
+        return KeysetPage(rows, encode_cursor(rows[-1]) if rows else None, encode_cursor(rows[0]) if rows and has_more else None)
+    if after is not None:
+        created_at, pk = after
+        queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk), created_at__lte=created_at)
+    rows = list(queryset.order_by('-created_at', '-pk')[:size + 1])
+    has_more = len(rows) > size
+    rows = rows[:size]
+    return KeysetPage(rows, encode_cursor(rows[-1]) if rows and has_more else None, encode_cursor(rows[0]) if rows and after is not None else None)
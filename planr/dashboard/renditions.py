@@ -0,0 +1,206 @@
+import hashlib
+import logging
+import queue
+import threading
+from io import BytesIO
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import DatabaseError, close_old_connections
+from django.templatetags.static import static
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+# Image renditions
+# Profile pictures, feedback screenshots and big static images are shown at a fraction of their upload
+# size, so each is resized to the widths of a preset (PLANR_IMAGE_RENDITIONS) in WebP, plus JPEG (or
+# PNG when the image has transparency) for browsers without WebP. Files are named after a hash of the
+# source's content (renditions/ab/<hash>-<preset>-<width>.webp), so the same picture is only processed
+# and stored once and the URLs can be cached forever. An ImageRendition row records which files
+# exist for a source and preset; {% picture %} (templatetags/images.py) turns it into <picture> and
+# srcset markup.
+#
+# Resizing happens on a background thread: the upload views queue their new files, and a template
+# that asks for a rendition that doesn't exist yet gets the original image this once and queues it.
+# `manage.py build_renditions` processes everything already uploaded.
+
+logger = logging.getLogger(__name__)
+
+STATIC_PREFIX = 'static:'  # sources under the static files rather than MEDIA_ROOT
+RENDITION_DIR = 'renditions'
+FOUND_TIMEOUT = 60 * 60 * 24
+MISSING_TIMEOUT = 30  # how soon a page asks again for renditions still being made
+SAVE_OPTIONS = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+    'jpeg': {'format': 'JPEG', 'quality': 82, 'optimize': True, 'progressive': True},
+    'png': {'format': 'PNG', 'optimize': True},
+}
+
+# Images in the static files that templates show through {% picture %}, built by `build_renditions`
+STATIC_IMAGES = [('background.png', 'hero')]
+PROFILE_PIC_PRESETS = ('avatar', 'profile')
+SCREENSHOT_PRESETS = ('screenshot',)
+
+
+def source_name(source):
+    return getattr(source, 'name', source) or ''
+
+def source_url(source):
+    if source.startswith(STATIC_PREFIX):
+        return static(source[len(STATIC_PREFIX):])
+    return default_storage.url(source)
+
+def read_source(source):
+    if source.startswith(STATIC_PREFIX):
+        path = finders.find(source[len(STATIC_PREFIX):])
+        if not path:
+            raise FileNotFoundError(source)
+        with open(path, 'rb') as f:
+            return f.read()
+    with default_storage.open(source, 'rb') as f:
+        return f.read()
+
+def cache_key(source, preset):
+    return f"rendition:{preset}:{hashlib.md5(source.encode()).hexdigest()}"
+
+def resize(image, width, crop):
+    if crop:
+        return ImageOps.fit(image, (width, width), Image.Resampling.LANCZOS)
+    return image.resize((width, max(1, round(image.height * width / image.width))), Image.Resampling.LANCZOS)
+
+# Make (or find) every file of one preset for source and record them; returns the ImageRendition
+def build_renditions(source, preset):
+    from .models import ImageRendition
+    options = settings.PLANR_IMAGE_RENDITIONS[preset]
+    widths = sorted(options['widths'])
+    data = read_source(source)
+    digest = hashlib.sha256(data).hexdigest()[:24]
+    with Image.open(BytesIO(data)) as original:
+        # JPEGs can be decoded at 1/2, 1/4 or 1/8 scale, which is much faster for big photos
+        original.draft('RGB', (widths[-1], widths[-1]))
+        image = ImageOps.exif_transpose(original)
+        transparent = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+        image = image.convert('RGBA' if transparent else 'RGB')
+    fallback = 'png' if transparent else 'jpeg'
+    files = {'webp': [], fallback: []}
+    largest = min(image.size) if options['crop'] else image.width
+    for width in widths:
+        if width > largest:
+            if files['webp']:
+                break
+            width = largest  # never upscale; a small source still gets one rendition at its own size
+        resized = None
+        for image_format in files:
+            name = f"{RENDITION_DIR}/{digest[:2]}/{digest}-{preset}-{width}.{'jpg' if image_format == 'jpeg' else image_format}"
+            if not default_storage.exists(name):
+                if resized is None:
+                    resized = resize(image, width, options['crop'])
+                buffer = BytesIO()
+                resized.save(buffer, **SAVE_OPTIONS[image_format])
+                name = default_storage.save(name, ContentFile(buffer.getvalue()))
+            files[image_format].append([width, name])
+    rendition, _ = ImageRendition.objects.update_or_create(
+        source=source, preset=preset,
+        defaults={'content_hash': digest, 'width': image.width, 'height': image.height, 'files': files},
+    )
+    cache.set(cache_key(source, preset), files, FOUND_TIMEOUT)
+    return rendition
+
+
+# Sources waiting to be processed, worked through by one background thread per process
+class RenditionWorker:
+    def __init__(self):
+        self.jobs = queue.Queue()
+        self.pending = set()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def add(self, source, preset):
+        with self.lock:
+            if (source, preset) in self.pending:
+                return
+            self.pending.add((source, preset))
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name='planr-renditions', daemon=True)
+                self.thread.start()
+        self.jobs.put((source, preset))
+
+    def _run(self):
+        while True:
+            source, preset = self.jobs.get()
+            try:
+                build_renditions(source, preset)
+            except (OSError, UnidentifiedImageError, Image.DecompressionBombError, DatabaseError) as e:
+                logger.warning("No %s renditions for %s: %s", preset, source, e)
+                cache.set(cache_key(source, preset), {}, FOUND_TIMEOUT)  # serve the original, don't retry all day
+            finally:
+                with self.lock:
+                    self.pending.discard((source, preset))
+                close_old_connections()
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+def get_rendition_worker():
+    global _worker
+    if _worker is None:
+        with _worker_lock:
+            if _worker is None:
+                _worker = RenditionWorker()
+    return _worker
+
+# Queue renditions of an uploaded file (a FieldFile or storage name) for each preset
+def queue_renditions(source, *presets):
+    source = source_name(source)
+    if not source or not settings.PLANR_IMAGE_RENDITIONS_ENABLED:
+        return
+    for preset in presets:
+        cache.delete(cache_key(source, preset))
+        get_rendition_worker().add(source, preset)
+
+# {format: [[width, name], ...]} for source, or None (and queued) if they haven't been made yet
+def rendition_files(source, preset):
+    if not settings.PLANR_IMAGE_RENDITIONS_ENABLED:
+        return None
+    key = cache_key(source, preset)
+    files = cache.get(key)
+    if files is None:
+        from .models import ImageRendition
+        files = ImageRendition.objects.filter(source=source, preset=preset).values_list('files', flat=True).first()
+        if files is None:
+            get_rendition_worker().add(source, preset)
+        cache.set(key, files or {}, FOUND_TIMEOUT if files else MISSING_TIMEOUT)
+    return files or None
+
+def srcset(entries):
+    return ', '.join(f"{default_storage.url(name)} {width}w" for width, name in entries)
+
+# src/srcset/sizes for source in a preset; just the original's URL until renditions exist
+def rendition_image(source, preset):
+    source = source_name(source)
+    if not source:
+        return None
+    files = rendition_files(source, preset)
+    if not files:
+        return {'src': source_url(source), 'srcset': '', 'webp_srcset': '', 'sizes': ''}
+    fallback = files.get('jpeg') or files.get('png')
+    return {
+        'src': default_storage.url(fallback[0][1]),
+        'srcset': srcset(fallback),
+        'webp_srcset': srcset(files['webp']),
+        'sizes': settings.PLANR_IMAGE_RENDITIONS[preset]['sizes'],
+    }
+
+# URL of the smallest WebP rendition at least `width` pixels wide (the widest there is otherwise)
+def rendition_url(source, preset, width):
+    source = source_name(source)
+    if not source:
+        return ''
+    files = rendition_files(source, preset)
+    if not files:
+        return source_url(source)
+    entries = files['webp']
+    name = next((name for entry_width, name in entries if entry_width >= width), entries[-1][1])
+    return default_storage.url(name)
@@ -0,0 +1,286 @@
+import html
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+import numpy as np
+from django.conf import settings
+from .bm25 import BM25Index, build_bm25_arrays, reciprocal_rank_fusion
+from .index_store import IndexFile, RecordTable, pack_records, write_index_file
+from .semantic_cache import normalize_vector
+
+# RAG retrieval over scraped Dublin City Council documents
+# Documents are split into overlapping word chunks, embedded with PLANR_EMBED_MODEL and stored as one
+# contiguous float32 matrix of unit vectors plus chunk metadata in one memory-mapped index file
+# (PLANR_RAG_INDEX_PATH, format in index_store.py). Small corpora are searched exhaustively (one matrix-vector product and an
+# argpartition). Scanning 100k+ chunks that way is memory-bound at tens of milliseconds, so larger
+# corpora are clustered at build time (inverted-file index): rows are stored grouped by k-means cluster
+# and a query only scans the PLANR_RAG_PROBES clusters whose centroids are closest, keeping retrieval
+# within a few milliseconds. A BM25 index over the same chunks (bm25.py) is stored in the same file, and
+# the vector and lexical rankings are merged with reciprocal rank fusion. Documents are ingested with `manage.py ingest_documents` (see ingest.py)
+# and the index is rebuilt from that store with `manage.py build_rag_index`.
+#
+# Query vectors only match the index when they come from the embedding model it was built with: after a
+# PLANR_EMBED_MODEL change (or with a differently sized embedder) vector search is switched off and
+# retrieval falls back to BM25 alone until the index is rebuilt.
+
+logger = logging.getLogger(__name__)
+
+DOCUMENT_EXTENSIONS = ('.txt', '.md', '.html', '.htm')
+
+# Source documents
+# .jsonl files hold one scraped page per line ({"url": ..., "title": ..., "text": ...});
+# .txt/.md/.html files are one document each, titled by filename
+def load_documents(source_dir):
+    for root, dirs, files in os.walk(source_dir):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            lowered = name.lower()
+            if lowered.endswith('.jsonl'):
+                with open(path, encoding='utf-8') as f:
+                    for line in f:
+                        if line.strip():
+                            page = json.loads(line)
+                            yield {
+                                'title': page.get('title') or page.get('url', name),
+                                'url': page.get('url', ''),
+                                'text': page.get('text', ''),
+                            }
+            elif lowered.endswith(DOCUMENT_EXTENSIONS):
+                with open(path, encoding='utf-8', errors='ignore') as f:
+                    text = f.read()
+                if lowered.endswith(('.html', '.htm')):
+                    text = html_to_text(text)
+                yield {
+                    'title': os.path.splitext(name)[0].replace('_', ' ').replace('-', ' '),
+                    'url': os.path.relpath(path, source_dir),
+                    'text': text,
+                }
+
+def html_to_text(raw_html):
+    raw_html = re.sub(r"(?is)<(script|style).*?</\1>", " ", raw_html)
+    return html.unescape(re.sub(r"<[^>]+>", " ", raw_html))
+
+# Overlapping windows of words, so a passage cut at a boundary still appears whole in a neighbour
+def chunk_text(text, chunk_words=200, overlap=40):
+    words = text.split()
+    if not words:
+        return []
+    step = max(chunk_words - overlap, 1)
+    return [" ".join(words[start:start + chunk_words]) for start in range(0, max(len(words) - overlap, 1), step)]
+
+
+# Spherical k-means on unit vectors (cosine similarity), trained on a sample of rows
+def kmeans(vectors, clusters, iterations=10, sample_size=50000, seed=0):
+    rng = np.random.default_rng(seed)
+    sample = vectors[rng.choice(len(vectors), min(sample_size, len(vectors)), replace=False)]
+    centroids = sample[rng.choice(len(sample), clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(sample @ centroids.T, axis=1)
+        for cluster in range(clusters):
+            members = sample[assignment == cluster]
+            if len(members):
+                centroids[cluster] = members.sum(axis=0)
+        centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+    return centroids
+
+def assign_clusters(vectors, centroids, batch_size=8192):
+    return np.concatenate([
+        np.argmax(vectors[start:start + batch_size] @ centroids.T, axis=1)
+        for start in range(0, len(vectors), batch_size)
+    ])
+
+
+class RetrievalIndex:
+    # centroids/offsets are None for an exhaustive index; otherwise rows of cluster c are
+    # vectors[offsets[c]:offsets[c + 1]]. chunks is any sequence of chunk dicts (a RecordTable when
+    # the index is opened from disk, so only the top hits are ever decoded).
+    def __init__(self, vectors, chunks, centroids=None, offsets=None, bm25=None, index_file=None, embed_model=None, build_id=None):
+        self.vectors = vectors if vectors.dtype == np.float32 else vectors.astype(np.float32)
+        self.chunks = chunks
+        self.centroids = centroids
+        self.offsets = offsets
+        self.bm25 = bm25
+        self.index_file = index_file
+        self.embed_model = embed_model or settings.PLANR_EMBED_MODEL
+        self.mismatch = None  # why vector search is off, once a mismatch has been seen
+        self.build_id = build_id or uuid.uuid4().hex  # identifies this build to the semantic cache
+
+    def __len__(self):
+        return len(self.chunks)
+
+    # Group rows by nearest centroid so each cluster is one contiguous slice
+    @classmethod
+    def clustered(cls, vectors, chunks, clusters):
+        centroids = kmeans(vectors, clusters)
+        assignment = assign_clusters(vectors, centroids)
+        order = np.argsort(assignment, kind='stable')
+        offsets = np.searchsorted(assignment[order], np.arange(clusters + 1)).astype(np.int64)
+        return cls(vectors[order], [chunks[i] for i in order], centroids, offsets)
+
+    # Row ranges to scan for this query: everything, or the closest clusters' slices
+    def candidate_ranges(self, query_vector, probes):
+        if self.centroids is None:
+            return [(0, len(self.chunks))]
+        probes = min(probes, len(self.centroids))
+        nearest = np.argpartition(-(self.centroids @ query_vector), probes - 1)[:probes]
+        return [(int(self.offsets[c]), int(self.offsets[c + 1])) for c in nearest]
+
+    # Why query embeddings from the current model can't be compared with the stored vectors, or None
+    def model_mismatch(self, query_vector=None):
+        if self.embed_model != settings.PLANR_EMBED_MODEL:
+            return f"was built with {self.embed_model} but PLANR_EMBED_MODEL is {settings.PLANR_EMBED_MODEL}"
+        if query_vector is not None and (self.vectors.ndim != 2 or len(query_vector) != self.vectors.shape[1]):
+            return f"has {self.vectors.shape[-1]}-dimensional vectors but the query embedding has {len(query_vector)}"
+        return None
+
+    # Logs each new mismatch once; False turns vector search off for this query
+    def accepts(self, query_vector=None):
+        mismatch = self.model_mismatch(query_vector)
+        if mismatch is not None and mismatch != self.mismatch:
+            logger.warning("RAG index %s; using BM25 only until `manage.py build_rag_index` is run", mismatch)
+        self.mismatch = mismatch
+        return mismatch is None
+
+    # Top k rows by cosine similarity: (rows, scores) best first
+    def vector_search(self, query_vector, k, probes=8):
+        if not len(self.chunks) or not self.accepts(query_vector):
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        query_vector = normalize_vector(query_vector)
+        ranges = self.candidate_ranges(query_vector, probes)
+        scores = np.concatenate([self.vectors[start:end] @ query_vector for start, end in ranges])
+        rows = np.concatenate([np.arange(start, end) for start, end in ranges])
+        if not len(scores):
+            return rows, scores
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return rows[top], scores[top]
+
+    # Top k chunks by cosine similarity: [(score, chunk), ...] best first
+    def search(self, query_vector, k, probes=8):
+        rows, scores = self.vector_search(query_vector, k, probes)
+        return [(float(score), self.chunks[int(row)]) for row, score in zip(rows, scores)]
+
+    def with_bm25(self):
+        texts = (self.chunks[row]['text'] for row in range(len(self.chunks)))
+        self.bm25 = BM25Index(build_bm25_arrays(list(texts)))
+        return self
+
+    def save(self, path):
+        chunk_data, chunk_offsets = pack_records(self.chunks)
+        arrays = {'vectors': self.vectors, 'chunk_data': chunk_data, 'chunk_offsets': chunk_offsets}
+        if self.centroids is not None:
+            arrays.update(centroids=self.centroids, cluster_offsets=self.offsets)
+        if self.bm25 is not None:
+            arrays.update({f"bm25_{name}": array for name, array in self.bm25.arrays.items()})
+        write_index_file(path, arrays, {'kind': 'retrieval', 'embed_model': self.embed_model, 'build_id': self.build_id})
+
+    # Maps the file instead of reading it: no parsing at startup and no per-worker copy
+    @classmethod
+    def open(cls, path):
+        index_file = IndexFile(path)
+        chunks = RecordTable(index_file['chunk_data'], index_file['chunk_offsets'])
+        centroids = index_file['centroids'] if 'centroids' in index_file else None
+        offsets = index_file['cluster_offsets'] if 'cluster_offsets' in index_file else None
+        bm25 = None
+        if 'bm25_term_hashes' in index_file:
+            bm25 = BM25Index({name[5:]: array for name, array in index_file.arrays.items() if name.startswith('bm25_')})
+        metadata = index_file.metadata
+        index = cls(index_file['vectors'], chunks, centroids, offsets, bm25, index_file, metadata.get('embed_model'), metadata.get('build_id'))
+        index.accepts()
+        return index
+
+
+# Build the index from embedded chunks in the document store (see ingest.py); no Ollama calls needed
+def build_index_from_store():
+    from .models import RagChunk
+    chunks_qs = (RagChunk.objects
+                 .filter(embedding_model=settings.PLANR_EMBED_MODEL, embedding__isnull=False)
+                 .select_related('document')
+                 .only('id', 'text', 'embedding', 'document__title', 'document__url')
+                 .order_by('id'))
+    total = chunks_qs.count()
+    vectors = None
+    chunks = []
+    for row, chunk in enumerate(chunks_qs.iterator(chunk_size=2000)):
+        vector = np.frombuffer(chunk.embedding, dtype=np.float32)
+        if vectors is None:
+            vectors = np.zeros((total, vector.shape[0]), dtype=np.float32)
+        vectors[row] = vector
+        chunks.append({'id': chunk.id, 'title': chunk.document.title, 'url': chunk.document.url, 'text': chunk.text})
+    if vectors is None:
+        vectors = np.zeros((0, 0), dtype=np.float32)
+    vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    if len(chunks) >= settings.PLANR_RAG_CLUSTER_MIN_CHUNKS:
+        index = RetrievalIndex.clustered(vectors, chunks, clusters=int(np.sqrt(len(chunks))))
+    else:
+        index = RetrievalIndex(vectors, chunks)
+    # Built after clustering so BM25 rows line up with the final vector rows
+    return index.with_bm25()
+
+
+_retrieval_index = None
+_retrieval_index_checked = 0.0
+_retrieval_index_lock = threading.Lock()
+
+# The open index, re-opened when build_rag_index swaps in a new file (checked every PLANR_RAG_RELOAD_SECONDS)
+def get_retrieval_index():
+    global _retrieval_index, _retrieval_index_checked
+    now = time.monotonic()
+    if now - _retrieval_index_checked < settings.PLANR_RAG_RELOAD_SECONDS:
+        return _retrieval_index
+    with _retrieval_index_lock:
+        if now - _retrieval_index_checked >= settings.PLANR_RAG_RELOAD_SECONDS:
+            path = str(settings.PLANR_RAG_INDEX_PATH)
+            if (_retrieval_index is None or _retrieval_index.index_file.is_stale()) and os.path.exists(path):
+                try:
+                    _retrieval_index = RetrievalIndex.open(path)
+                except (OSError, ValueError):
+                    pass
+            _retrieval_index_checked = now
+    return _retrieval_index
+
+def retrieval_available():
+    return get_retrieval_index() is not None
+
+# Cached answers are only reused while this stays the same (see semantic_cache.py)
+def index_build_id():
+    index = get_retrieval_index()
+    return index.build_id if index is not None else None
+
+# Passages worth showing the LLM for this query: vector and BM25 candidates merged by reciprocal rank
+# fusion (either side alone still works, e.g. lexical-only when the embedding model is down)
+def retrieve_passages(query_text, query_vector, k=None):
+    index = get_retrieval_index()
+    if index is None:
+        return []
+    rankings = []
+    candidates = settings.PLANR_RAG_FUSION_CANDIDATES
+    if query_vector is not None:
+        rows, scores = index.vector_search(query_vector, candidates, settings.PLANR_RAG_PROBES)
+        rankings.append(rows[scores >= settings.PLANR_RAG_MIN_SCORE])
+    if index.bm25 is not None:
+        rows, scores = index.bm25.search(query_text, candidates)
+        rankings.append(rows)
+    fused = reciprocal_rank_fusion(rankings)[:k or settings.PLANR_RAG_TOP_K]
+    return [dict(index.chunks[row], score=round(score, 4)) for row, score in fused]
+
+# Citations for chat_api's 'sources' (one per document, best score first)
+def passage_sources(passages):
+    sources = {}
+    for passage in passages:
+        key = passage['url'] or passage['title']
+        if key not in sources:
+            sources[key] = {'title': passage['title'], 'url': passage['url'], 'score': passage['score']}
+    return list(sources.values())
+
+def format_context(passages):
+    return "\n\n".join(
+        f"[{number}] {passage['title']} ({passage['url']})\n{passage['text']}"
+        for number, passage in enumerate(passages, start=1)
+    )
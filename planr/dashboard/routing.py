@@ -0,0 +1,101 @@
+import logging
+import re
+from django.conf import settings
+from .retrieval import retrieval_available
+
+# Adaptive model routing
+# Mistral is slow for questions like "what are your opening hours". Before generating, llm_events asks
+# route_query() which model tier should answer, using only what we already have in hand:
+#   - long questions (more than PLANR_LLM_ROUTING_MAX_WORDS words) go to the strong model
+#   - so do questions with a keyword that usually needs reasoning (appeals, comparisons, "why"...)
+#   - and questions whose retrieved records are weak: the best passage's rank-fusion score is below
+#     PLANR_LLM_ROUTING_MIN_RETRIEVAL_SCORE, i.e. vector and BM25 search don't agree on a top record
+#   - without a RAG index there is no retrieval signal at all, so everything goes to the strong model
+#   - everything else goes to PLANR_LLM_FAST_MODEL
+# Routing is off unless PLANR_LLM_ROUTING is set. The fast model's answer streams like any other; if
+# the call fails or ends before its first token the question escalates to PLANR_LLM_MODEL. Once tokens
+# have been sent it's too late to switch, so check_fast_answer() only keeps weak answers (too short,
+# hedging, cut off) out of the answer caches. Decisions are logged and recorded on ChatMetric (route,
+# route_reason, escalated) so `manage.py chat_metrics` shows latency per model.
+
+logger = logging.getLogger(__name__)
+
+FAST = 'fast'
+STRONG = 'strong'
+
+# Signs that the fast model couldn't really answer
+HEDGES = re.compile(
+    r"\b(i don'?t know|i'?m not sure|i am not sure|i cannot|i can'?t (?:help|answer|provide)|"
+    r"unable to (?:answer|provide|help)|as an ai|i do not have (?:enough )?information)\b",
+    re.IGNORECASE,
+)
+
+
+class Route:
+    def __init__(self, tier, model, reason):
+        self.tier = tier
+        self.model = model
+        self.reason = reason
+
+    def __repr__(self):
+        return f"Route({self.tier}, {self.model}, {self.reason})"
+
+
+def routing_enabled():
+    return settings.PLANR_LLM_ROUTING and bool(settings.PLANR_LLM_FAST_MODEL)
+
+def strong_route(reason):
+    return Route(STRONG, settings.PLANR_LLM_MODEL, reason)
+
+def route_query(user_query, passages):
+    if not routing_enabled():
+        return strong_route('routing_off')
+    words = user_query.split()
+    if len(words) > settings.PLANR_LLM_ROUTING_MAX_WORDS:
+        return strong_route('long')
+    lowered = ' '.join(words).lower()
+    for keyword in settings.PLANR_LLM_ROUTING_HARD_KEYWORDS:
+        if re.search(rf"\b{re.escape(keyword)}\b", lowered):
+            return strong_route('keyword')
+    if not retrieval_available():
+        return strong_route('no_retrieval')
+    best = max((passage['score'] for passage in passages), default=0.0)
+    if best < settings.PLANR_LLM_ROUTING_MIN_RETRIEVAL_SCORE:
+        return strong_route('low_retrieval')
+    return Route(FAST, settings.PLANR_LLM_FAST_MODEL, 'simple')
+
+# Why the fast model's answer shouldn't be cached, or None if it's fine
+def check_fast_answer(answer, done_reason=None):
+    text = answer.strip()
+    if not text:
+        return 'empty'
+    if done_reason == 'length':
+        return 'truncated'
+    if len(text) < settings.PLANR_LLM_ROUTING_MIN_ANSWER_CHARS:
+        return 'too_short'
+    if HEDGES.search(text):
+        return 'hedged'
+    return None
+
+# Whether an answer may go into the answer caches: anything from the strong model, and fast-model
+# answers that pass check_fast_answer()
+def cacheable_answer(model, answer, done_reason=None):
+    if model != settings.PLANR_LLM_FAST_MODEL or model == settings.PLANR_LLM_MODEL:
+        return True
+    problem = check_fast_answer(answer, done_reason)
+    if problem:
+        logger.info("Not caching %s answer: %s", model, problem)
+    return problem is None
+
+def log_route(route, escalation=None):
+    if escalation:
+        logger.info("Routed to %s (%s), escalated to %s: %s", route.model, route.reason, settings.PLANR_LLM_MODEL, escalation)
+    else:
+        logger.info("Routed to %s (%s)", route.model, route.reason)
+
+# Chat models this deployment may call (the fast model only when routing is on), for warm-up
+def chat_models():
+    models = [settings.PLANR_LLM_MODEL]
+    if routing_enabled():
+        models.append(settings.PLANR_LLM_FAST_MODEL)
+    return models
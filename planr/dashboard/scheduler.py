@@ -0,0 +1,183 @@
+import asyncio
+import heapq
+import itertools
+import math
+import threading
+import time
+from collections import deque
+from django.conf import settings
+
+# Priority-aware LLM request scheduler
+# At most PLANR_LLM_CONCURRENCY generations run at once; everyone else waits in a priority queue where
+# premium and organisation members are served before free users (FIFO within a tier). When a tier's
+# queue is already PLANR_LLM_QUEUE_LIMITS deep, or a request has waited PLANR_LLM_QUEUE_TIMEOUT
+# seconds, LLMBusy is raised so chat_api can answer 503 + Retry-After straight away instead of
+# letting requests pile up. One scheduler is shared by sync (thread) and async (event loop) callers.
+
+TIER_PRIORITY = {'premium': 0, 'free': 1}
+
+
+class LLMBusy(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"Planr is busy, please retry in {retry_after}s.")
+        self.retry_after = retry_after
+
+
+# Premium members and anyone in an organisation get the premium queue
+# (pass in_organisation when the caller has already looked the membership up)
+def user_tier(user, in_organisation=None):
+    if not user or not user.is_authenticated:
+        return 'free'
+    if user.is_staff:
+        return 'premium'
+    profile = getattr(user, 'userprofile', None)
+    if profile is not None and profile.member_status == 'premium':
+        return 'premium'
+    if in_organisation is None:
+        from .models import OrganisationMembership
+        in_organisation = OrganisationMembership.objects.filter(user=user).exists()
+    return 'premium' if in_organisation else 'free'
+
+
+class _Waiter:
+    def __init__(self, tier, loop=None):
+        self.tier = tier
+        self.granted = False
+        self.cancelled = False
+        self.loop = loop
+        if loop is None:
+            self.event = threading.Event()
+        else:
+            self.future = loop.create_future()
+
+    def wake(self):
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(lambda: self.future.done() or self.future.set_result(None))
+
+
+class LLMScheduler:
+    def __init__(self, concurrency, queue_limits, queue_timeout):
+        self.concurrency = concurrency
+        self.queue_limits = queue_limits
+        self.queue_timeout = queue_timeout
+        self.lock = threading.Lock()
+        self.active = 0
+        self.heap = []
+        self.queued = {tier: 0 for tier in TIER_PRIORITY}
+        self.sequence = itertools.count()
+        self.service_time = 5.0  # moving average of seconds per generation, for Retry-After
+        self.waits = {tier: deque(maxlen=1000) for tier in TIER_PRIORITY}
+        self.rejected = {tier: 0 for tier in TIER_PRIORITY}
+
+    def retry_after(self):
+        queued = sum(self.queued.values())
+        return max(1, math.ceil(self.service_time * (queued + 1) / self.concurrency))
+
+    # Either takes a free slot (returns None) or joins the queue (returns the waiter)
+    def _enter(self, tier, loop=None):
+        with self.lock:
+            if self.active < self.concurrency and not self.heap:
+                self.active += 1
+                return None
+            if self.queued[tier] >= self.queue_limits.get(tier, 0):
+                self.rejected[tier] += 1
+                raise LLMBusy(self.retry_after())
+            waiter = _Waiter(tier, loop)
+            heapq.heappush(self.heap, (TIER_PRIORITY[tier], next(self.sequence), waiter))
+            self.queued[tier] += 1
+            return waiter
+
+    # Gave up waiting: leave the queue, unless a slot was handed over at the same moment
+    def _abandon(self, waiter):
+        with self.lock:
+            if waiter.granted:
+                return True
+            waiter.cancelled = True
+            self.queued[waiter.tier] -= 1
+            self.rejected[waiter.tier] += 1
+            return False
+
+    def _record_wait(self, tier, waited):
+        self.waits[tier].append(waited)
+
+    def acquire(self, tier):
+        started = time.monotonic()
+        waiter = self._enter(tier)
+        if waiter is not None and not waiter.event.wait(self.queue_timeout) and not self._abandon(waiter):
+            raise LLMBusy(self.retry_after())
+        waited = time.monotonic() - started
+        self._record_wait(tier, waited)
+        return waited
+
+    async def aacquire(self, tier):
+        started = time.monotonic()
+        waiter = self._enter(tier, asyncio.get_running_loop())
+        if waiter is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter.future), self.queue_timeout)
+            except asyncio.TimeoutError:
+                if not self._abandon(waiter):
+                    raise LLMBusy(self.retry_after())
+            except asyncio.CancelledError:
+                # Client went away; if a slot arrived at the same moment, hand it back
+                if self._abandon(waiter):
+                    self.release()
+                raise
+        waited = time.monotonic() - started
+        self._record_wait(tier, waited)
+        return waited
+
+    # Hands the slot straight to the highest-priority live waiter, or frees it
+    def release(self, service_time=None):
+        with self.lock:
+            if service_time is not None:
+                self.service_time = 0.9 * self.service_time + 0.1 * service_time
+            while self.heap:
+                _, _, waiter = heapq.heappop(self.heap)
+                if waiter.cancelled:
+                    continue
+                self.queued[waiter.tier] -= 1
+                waiter.granted = True
+                waiter.wake()
+                return
+            self.active -= 1
+
+    def stats(self):
+        with self.lock:
+            stats = {
+                'concurrency': self.concurrency,
+                'active': self.active,
+                'queued': dict(self.queued),
+                'rejected': dict(self.rejected),
+                'avg_service_seconds': round(self.service_time, 3),
+                'queue_wait_seconds': {},
+            }
+            waits = {tier: sorted(samples) for tier, samples in self.waits.items()}
+        for tier, samples in waits.items():
+            if samples:
+                stats['queue_wait_seconds'][tier] = {
+                    'count': len(samples),
+                    'mean': round(sum(samples) / len(samples), 4),
+                    'p50': round(samples[len(samples) // 2], 4),
+                    'p95': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 4),
+                    'max': round(samples[-1], 4),
+                }
+        return stats
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler():
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = LLMScheduler(
+                    concurrency=settings.PLANR_LLM_CONCURRENCY,
+                    queue_limits=settings.PLANR_LLM_QUEUE_LIMITS,
+                    queue_timeout=settings.PLANR_LLM_QUEUE_TIMEOUT,
+                )
+    return _scheduler
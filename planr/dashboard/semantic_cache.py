@@ -0,0 +1,209 @@
+import atexit
+import json
+import os
+import threading
+import numpy as np
+from django.conf import settings
+
+# Semantic answer cache
+# Catches paraphrases the exact-match answer cache misses ("extension planning rules" vs
+# "rules for building an extension"). Query embeddings are kept as unit vectors in one float32
+# matrix, so a lookup is a single matrix-vector product; the best cosine similarity above
+# PLANR_SEMANTIC_CACHE_THRESHOLD is a hit. Entries are evicted least-recently-used once
+# PLANR_SEMANTIC_CACHE_CAPACITY is reached, and the store is saved to PLANR_SEMANTIC_CACHE_PATH
+# so it survives restarts. Each row is tagged with a code for its (prompt version, model), and rows
+# with another version, or from a model the lookup didn't ask for, are masked out before picking the
+# best match, so answers made with an old system prompt or a model no longer in use can't shadow a
+# current one.
+#
+# Answers are also tied to the RAG index build they were generated from: the cache remembers the
+# build id (saved with the store), and when a worker first sees a newer index every entry is dropped.
+# Workers that still hold old entries in memory can't bring them back by saving at exit, because the
+# store they write carries the old build id.
+
+# Buckets for the best-similarity histogram staff use to tune the threshold
+SIMILARITY_BUCKETS = np.linspace(0.0, 1.0, 21)
+
+def normalize_vector(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class SemanticCache:
+    def __init__(self, capacity, threshold, path=None, save_every=20):
+        self.capacity = capacity
+        self.threshold = threshold
+        self.path = path
+        self.save_every = save_every
+        self.lock = threading.Lock()
+        self.clear()
+        self.load()
+
+    def clear(self):
+        self.drop_entries()
+        self.build_id = None  # RAG index build the entries were answered from
+        self.clock = 0
+        self.unsaved = 0
+        self.lookups = 0
+        self.hits = 0
+        self.hit_similarity_total = 0.0
+        self.similarity_histogram = np.zeros(len(SIMILARITY_BUCKETS) - 1, dtype=np.int64)
+
+    def drop_entries(self):
+        self.vectors = None  # (capacity, dim) float32, allocated on first insert
+        self.entries = []  # (prompt_version, model, query, answer, sources) per row
+        self.last_used = np.zeros(self.capacity, dtype=np.int64)
+        self.key_codes = np.full(self.capacity, -1, dtype=np.int32)  # (prompt_version, model) code per row
+        self.codes = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    # Called with the current RAG index build id before each use; a different build drops every entry
+    def use_build(self, build_id):
+        with self.lock:
+            if build_id == self.build_id:
+                return
+            if self.build_id is not None:
+                self.drop_entries()
+            self.build_id = build_id
+            self.unsaved += 1
+
+    def key_code(self, version, model):
+        return self.codes.setdefault((version, model), len(self.codes))
+
+    # Best answer made by any of models, as (answer, sources, similarity, model), or None
+    # threshold overrides self.threshold (a looser match is used when Ollama is down)
+    def lookup(self, vector, models, version, threshold=None):
+        vector = normalize_vector(vector)
+        with self.lock:
+            self.lookups += 1
+            codes = [self.codes[version, model] for model in models if (version, model) in self.codes]
+            if not self.entries or not codes or self.vectors.shape[1] != vector.shape[0]:
+                return None
+            matching = np.flatnonzero(np.isin(self.key_codes[:len(self.entries)], codes))
+            if not len(matching):
+                return None
+            similarities = self.vectors[matching] @ vector
+            best_match = int(np.argmax(similarities))
+            best = int(matching[best_match])
+            similarity = float(similarities[best_match])
+            bucket = min(np.searchsorted(SIMILARITY_BUCKETS, similarity, side='right') - 1, len(self.similarity_histogram) - 1)
+            self.similarity_histogram[max(bucket, 0)] += 1
+            model, query, answer, sources = self.entries[best][1:]
+            if similarity < (threshold if threshold is not None else self.threshold):
+                return None
+            self.hits += 1
+            self.hit_similarity_total += similarity
+            self.clock += 1
+            self.last_used[best] = self.clock
+            return answer, sources, similarity, model
+
+    def add(self, vector, model, version, query, answer, sources):
+        vector = normalize_vector(vector)
+        with self.lock:
+            if self.vectors is None or self.vectors.shape[1] != vector.shape[0]:
+                # First entry, or the embedding model changed: start a fresh matrix
+                self.vectors = np.zeros((self.capacity, vector.shape[0]), dtype=np.float32)
+                self.entries = []
+                self.last_used[:] = 0
+                self.key_codes[:] = -1
+            if len(self.entries) < self.capacity:
+                row = len(self.entries)
+                self.entries.append(None)
+            else:
+                row = int(np.argmin(self.last_used))
+            self.vectors[row] = vector
+            self.entries[row] = (version, model, query, answer, list(sources))
+            self.key_codes[row] = self.key_code(version, model)
+            self.clock += 1
+            self.last_used[row] = self.clock
+            self.unsaved += 1
+            should_save = self.unsaved >= self.save_every
+        if should_save:
+            self.save()
+
+    def stats(self):
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'capacity': self.capacity,
+                'threshold': self.threshold,
+                'lookups': self.lookups,
+                'hits': self.hits,
+                'hit_rate': round(self.hits / self.lookups, 4) if self.lookups else 0.0,
+                'mean_hit_similarity': round(self.hit_similarity_total / self.hits, 4) if self.hits else None,
+                # How many lookups had their best match in each similarity band
+                'best_similarity_histogram': {
+                    f"{low:.2f}-{high:.2f}": int(count)
+                    for low, high, count in zip(SIMILARITY_BUCKETS[:-1], SIMILARITY_BUCKETS[1:], self.similarity_histogram)
+                    if count
+                },
+            }
+
+    # Written to a temp file then renamed, so a crash never leaves a half-written store
+    def save(self):
+        if not self.path:
+            return
+        with self.lock:
+            if self.vectors is None:
+                return
+            size = len(self.entries)
+            vectors = self.vectors[:size].copy()
+            last_used = self.last_used[:size].copy()
+            entries = json.dumps(self.entries)
+            build_id = json.dumps(self.build_id)
+            self.unsaved = 0
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, vectors=vectors, last_used=last_used, entries=np.array(entries), build_id=np.array(build_id))
+        os.replace(tmp_path, self.path)
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with np.load(self.path) as data:
+                vectors = data['vectors']
+                last_used = data['last_used']
+                entries = [tuple(entry) for entry in json.loads(str(data['entries']))]
+                build_id = json.loads(str(data['build_id'])) if 'build_id' in data else None
+        except (OSError, ValueError, KeyError):
+            return
+        # Keep the most recently used rows if capacity shrank
+        keep = np.argsort(last_used)[::-1][:self.capacity]
+        with self.lock:
+            self.build_id = build_id
+            self.vectors = np.zeros((self.capacity, vectors.shape[1]), dtype=np.float32)
+            self.vectors[:len(keep)] = vectors[keep]
+            self.entries = [entries[i] for i in keep]
+            self.last_used[:len(keep)] = last_used[keep]
+            for row, entry in enumerate(self.entries):
+                self.key_codes[row] = self.key_code(entry[0], entry[1])
+            self.clock = int(last_used.max()) if len(last_used) else 0
+
+    def delete_saved(self):
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+_semantic_cache = None
+_semantic_cache_lock = threading.Lock()
+
+def get_semantic_cache():
+    global _semantic_cache
+    if _semantic_cache is None:
+        with _semantic_cache_lock:
+            if _semantic_cache is None:
+                _semantic_cache = SemanticCache(
+                    capacity=settings.PLANR_SEMANTIC_CACHE_CAPACITY,
+                    threshold=settings.PLANR_SEMANTIC_CACHE_THRESHOLD,
+                    path=str(settings.PLANR_SEMANTIC_CACHE_PATH) if settings.PLANR_SEMANTIC_CACHE_PATH else None,
+                )
+                atexit.register(_semantic_cache.save)
+    return _semantic_cache
+
+def semantic_cache_enabled():
+    return settings.PLANR_SEMANTIC_CACHE_CAPACITY > 0
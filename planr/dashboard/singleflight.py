@@ -0,0 +1,331 @@
+import asyncio
+import threading
+import time
+import uuid
+from django.conf import settings
+from django.db import connections
+from .answer_cache import answer_cache
+
+# Single-flight coalescing of identical chat questions
+# When a planning topic is in the news many people ask the same question at once. Requests with the
+# same answer cache key (normalized question + model + prompt version) and the same scheduler tier
+# share one Flight (see flight_key): a single producer runs the generation and every request, the
+# first one included, follows its event stream.
+# The producer runs in a background thread (WSGI) or task (ASGI), so a client that disconnects only
+# stops its own stream; the answer still finishes and lands in the answer cache.
+#
+# With PLANR_SINGLE_FLIGHT_SHARED the flight also spans worker processes through the answer cache
+# (needs a shared backend such as Redis or Memcached): the process that wins cache.add() on the lock
+# key generates and publishes its events in numbered chunks; other processes follow by polling those
+# chunks. If that producer dies (its lock expires) before publishing anything, a follower takes over;
+# if it dies part-way through, followers get the partial answer flagged as interrupted.
+
+LOCK_SUFFIX = ':flight'
+PUBLISH_INTERVAL = 0.1
+POLL_INTERVAL = 0.05
+CHUNK_TIMEOUT = 120
+# Ends a followed stream whose producer process died part-way through the answer
+INTERRUPTED = {'done': True, 'sources': [], 'degraded': {'reason': 'interrupted', 'retry_after': 1, 'cached': False}}
+
+
+class Flight:
+    def __init__(self, key):
+        self.key = key
+        self.events = []
+        self.done = False
+        self.error = None
+        self.followers = 0
+        self.cond = threading.Condition()
+        self.async_waiters = []
+        self.task = None
+
+    def _wake(self):
+        self.cond.notify_all()
+        for loop, future in self.async_waiters:
+            loop.call_soon_threadsafe(lambda future=future: future.done() or future.set_result(None))
+        self.async_waiters = []
+
+    def publish(self, event):
+        with self.cond:
+            self.events.append(event)
+            self._wake()
+
+    def close(self, error=None):
+        with self.cond:
+            self.done = True
+            self.error = error
+            self._wake()
+        _registry.remove(self)
+
+    def run(self, events):
+        try:
+            for event in events:
+                self.publish(event)
+        except Exception as e:
+            self.close(e)
+        else:
+            self.close()
+
+    async def arun(self, events):
+        try:
+            async for event in events:
+                self.publish(event)
+        except Exception as e:
+            self.close(e)
+        else:
+            self.close()
+
+    # Every event from the start, then new ones as they arrive; re-raises the producer's error
+    def follow(self):
+        position = 0
+        while True:
+            with self.cond:
+                while position == len(self.events) and not self.done:
+                    self.cond.wait(1.0)
+                new, position = self.events[position:], len(self.events)
+                finished, error = self.done, self.error
+            yield from new
+            if finished and position == len(self.events):
+                if error is not None:
+                    raise error
+                return
+
+    async def afollow(self):
+        position = 0
+        loop = asyncio.get_running_loop()
+        while True:
+            with self.cond:
+                waiting = position == len(self.events) and not self.done
+                if waiting:
+                    future = loop.create_future()
+                    self.async_waiters.append((loop, future))
+            if waiting:
+                await future
+                continue
+            with self.cond:
+                new, position = self.events[position:], len(self.events)
+                finished, error = self.done, self.error
+            for event in new:
+                yield event
+            if finished and position == len(self.events):
+                if error is not None:
+                    raise error
+                return
+
+
+# In-process registry of running flights
+class FlightRegistry:
+    def __init__(self):
+        self.flights = {}
+        self.lock = threading.Lock()
+        self.started = 0
+        self.coalesced = 0
+
+    # Returns (flight, True) when the caller must start the producer, (flight, False) to just follow
+    def join(self, key):
+        with self.lock:
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.flights[key] = Flight(key)
+                self.started += 1
+            else:
+                self.coalesced += 1
+            flight.followers += 1
+            return flight, leader
+
+    def remove(self, flight):
+        with self.lock:
+            if self.flights.get(flight.key) is flight:
+                del self.flights[flight.key]
+
+    def stats(self):
+        with self.lock:
+            return {'in_flight': len(self.flights), 'started': self.started, 'coalesced': self.coalesced}
+
+_registry = FlightRegistry()
+
+def single_flight_stats():
+    return _registry.stats()
+
+
+# Cross-process sharing through the answer cache
+def _chunk_key(key, flight_id, number):
+    return f"{key}{LOCK_SUFFIX}:{flight_id}:{number}"
+
+class SharedPublisher:
+    def __init__(self, key, flight_id):
+        self.key = key
+        self.flight_id = flight_id
+        self.pending = []
+        self.count = 0
+        self.last_flush = time.monotonic()
+
+    def due(self, event):
+        self.pending.append(event)
+        return event.get('done') or time.monotonic() - self.last_flush >= PUBLISH_INTERVAL
+
+    def _writes(self):
+        writes = {
+            _chunk_key(self.key, self.flight_id, self.count): self.pending,
+            _chunk_key(self.key, self.flight_id, 'count'): self.count + 1,
+        }
+        self.count += 1
+        self.pending = []
+        self.last_flush = time.monotonic()
+        return writes
+
+    def flush(self):
+        if self.pending:
+            cache = answer_cache()
+            cache.set_many(self._writes(), CHUNK_TIMEOUT)
+            cache.touch(self.key + LOCK_SUFFIX, settings.PLANR_SINGLE_FLIGHT_LOCK_TIMEOUT)
+
+    async def aflush(self):
+        if self.pending:
+            cache = answer_cache()
+            await cache.aset_many(self._writes(), CHUNK_TIMEOUT)
+            await cache.atouch(self.key + LOCK_SUFFIX, settings.PLANR_SINGLE_FLIGHT_LOCK_TIMEOUT)
+
+    # Only drop the lock if it is still ours (it may have expired and been taken over)
+    def release(self):
+        cache = answer_cache()
+        if cache.get(self.key + LOCK_SUFFIX) == self.flight_id:
+            cache.delete(self.key + LOCK_SUFFIX)
+
+    async def arelease(self):
+        cache = answer_cache()
+        if await cache.aget(self.key + LOCK_SUFFIX) == self.flight_id:
+            await cache.adelete(self.key + LOCK_SUFFIX)
+
+def _published(events, publisher):
+    try:
+        for event in events:
+            if publisher.due(event):
+                publisher.flush()
+            yield event
+        publisher.flush()
+    finally:
+        publisher.release()
+
+async def _apublished(events, publisher):
+    try:
+        async for event in events:
+            if publisher.due(event):
+                await publisher.aflush()
+            yield event
+        await publisher.aflush()
+    finally:
+        await publisher.arelease()
+
+# Follow another process's flight; returns without a final event if that producer went away
+def _remote_events(key, flight_id):
+    cache = answer_cache()
+    position = 0
+    while True:
+        count = cache.get(_chunk_key(key, flight_id, 'count'), 0)
+        if count > position:
+            chunks = cache.get_many([_chunk_key(key, flight_id, number) for number in range(position, count)])
+            for number in range(position, count):
+                for event in chunks.get(_chunk_key(key, flight_id, number), []):
+                    yield event
+                    if event.get('done'):
+                        return
+            position = count
+        elif cache.get(key + LOCK_SUFFIX) != flight_id:
+            # Lock released: read the count once more in case the last chunk landed just before
+            if cache.get(_chunk_key(key, flight_id, 'count'), 0) == position:
+                return
+        else:
+            time.sleep(POLL_INTERVAL)
+
+async def _aremote_events(key, flight_id):
+    cache = answer_cache()
+    position = 0
+    while True:
+        count = await cache.aget(_chunk_key(key, flight_id, 'count'), 0)
+        if count > position:
+            chunks = await cache.aget_many([_chunk_key(key, flight_id, number) for number in range(position, count)])
+            for number in range(position, count):
+                for event in chunks.get(_chunk_key(key, flight_id, number), []):
+                    yield event
+                    if event.get('done'):
+                        return
+            position = count
+        elif await cache.aget(key + LOCK_SUFFIX) != flight_id:
+            if await cache.aget(_chunk_key(key, flight_id, 'count'), 0) == position:
+                return
+        else:
+            await asyncio.sleep(POLL_INTERVAL)
+
+def _shared_events(key, produce):
+    cache = answer_cache()
+    while True:
+        flight_id = uuid.uuid4().hex
+        if cache.add(key + LOCK_SUFFIX, flight_id, settings.PLANR_SINGLE_FLIGHT_LOCK_TIMEOUT):
+            yield from _published(produce(), SharedPublisher(key, flight_id))
+            return
+        leader_id = cache.get(key + LOCK_SUFFIX)
+        if leader_id is None:
+            continue  # the other producer just finished or expired; try to take the lock
+        followed = []
+        for event in _remote_events(key, leader_id):
+            followed.append(event)
+            yield event
+        if not followed:
+            continue  # the other producer died before publishing anything; take over
+        if not followed[-1].get('done'):
+            yield INTERRUPTED
+        return
+
+async def _ashared_events(key, produce):
+    cache = answer_cache()
+    while True:
+        flight_id = uuid.uuid4().hex
+        if await cache.aadd(key + LOCK_SUFFIX, flight_id, settings.PLANR_SINGLE_FLIGHT_LOCK_TIMEOUT):
+            async for event in _apublished(produce(), SharedPublisher(key, flight_id)):
+                yield event
+            return
+        leader_id = await cache.aget(key + LOCK_SUFFIX)
+        if leader_id is None:
+            continue
+        followed = []
+        async for event in _aremote_events(key, leader_id):
+            followed.append(event)
+            yield event
+        if not followed:
+            continue
+        if not followed[-1].get('done'):
+            yield INTERRUPTED
+        return
+
+
+def _run_producer(flight, events):
+    try:
+        flight.run(events)
+    finally:
+        connections.close_all()
+
+# The producer queues for the LLM at its own tier's priority, so a premium question never waits behind
+# a free user's queued generation: each tier gets its own flight
+def flight_key(cache_key, tier):
+    return f"{cache_key}:{tier}"
+
+# produce() returns the generation's event iterator; it is only called by the flight's producer
+def coalesce(key, produce):
+    if not settings.PLANR_SINGLE_FLIGHT:
+        return produce(), True
+    flight, leader = _registry.join(key)
+    if leader:
+        events = _shared_events(key, produce) if settings.PLANR_SINGLE_FLIGHT_SHARED else produce()
+        threading.Thread(target=_run_producer, args=(flight, events), name='planr-single-flight', daemon=True).start()
+    return flight.follow(), leader
+
+def acoalesce(key, produce):
+    if not settings.PLANR_SINGLE_FLIGHT:
+        return produce(), True
+    flight, leader = _registry.join(key)
+    if leader:
+        events = _ashared_events(key, produce) if settings.PLANR_SINGLE_FLIGHT_SHARED else produce()
+        flight.task = asyncio.get_running_loop().create_task(flight.arun(events))
+    return flight.afollow(), leader
@@ -5,6 +5,8 @@ const loading = document.getElementById('loading');
 const saveChatBtn = document.getElementById('saveChatBtn');
 
 let chatLog = [];
+// Server-side conversation this chat belongs to (null until the first answer comes back)
+let conversationId = null;
 
 function scrollToBottom() {
     chatMessages.scrollTop = chatMessages.scrollHeight;
@@ -36,10 +38,11 @@ function addMessage(content, isUser = false) {
     contentDiv.innerHTML = content;
 
     // Save chat log for export
-    chatLog.push({
+    const logEntry = {
         role: isUser ? 'user' : 'assistant',
         content: content.replace(/<br>/g, '\n')
-    });
+    };
+    chatLog.push(logEntry);
 
     if (isUser) {
         messageDiv.appendChild(contentDiv);
@@ -51,6 +54,73 @@ function addMessage(content, isUser = false) {
 
     chatMessages.appendChild(messageDiv);
     scrollToBottom();
+    return {contentDiv: contentDiv, logEntry: logEntry};
+}
+
+// Replace the text of a message that is still being streamed in
+function updateMessage(message, text) {
+    message.contentDiv.innerHTML = text.replace(/\n/g, '<br>');
+    message.logEntry.content = text;
+    scrollToBottom();
+}
+
+// List the DCC records an answer was based on
+function addSources(message, sources) {
+    if (!sources || !sources.length) return;
+    const list = document.createElement('ul');
+    list.className = 'message-sources';
+    sources.forEach(function(source) {
+        const item = document.createElement('li');
+        if (source.url && /^https?:/.test(source.url)) {
+            const link = document.createElement('a');
+            link.href = source.url;
+            link.target = '_blank';
+            link.rel = 'noopener';
+            link.textContent = source.title;
+            item.appendChild(link);
+        } else {
+            item.textContent = source.title;
+        }
+        list.appendChild(item);
+    });
+    message.contentDiv.appendChild(list);
+    message.logEntry.content += '\nSources: ' + sources.map(s => s.url || s.title).join(', ');
+    scrollToBottom();
+}
+
+// Explain a fallback reply given while the assistant was unavailable
+function addDegradedNote(message, degraded) {
+    let text = '';
+    if (degraded.reason === 'interrupted') {
+        text = 'This answer was cut off. Please try asking again.';
+    } else if (degraded.cached) {
+        text = "Planr's assistant is offline right now, so this is a saved answer to a similar question.";
+    }
+    if (!text) return;
+    const note = document.createElement('div');
+    note.className = 'message-degraded';
+    note.textContent = text;
+    message.contentDiv.appendChild(note);
+    scrollToBottom();
+}
+
+// Read the NDJSON event stream from /api/chat/ and render tokens as they arrive
+async function readChatStream(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+        const {value, done} = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, {stream: true});
+        let newline;
+        while ((newline = buffer.indexOf('\n')) >= 0) {
+            const line = buffer.slice(0, newline).trim();
+            buffer = buffer.slice(newline + 1);
+            if (line) onEvent(JSON.parse(line));
+        }
+    }
+    if (buffer.trim()) onEvent(JSON.parse(buffer));
 }
 
 async function sendMessage() {
@@ -64,11 +134,37 @@ async function sendMessage() {
         const response = await fetch(window.CHAT_API_URL, {
             method: 'POST',
             headers: {'Content-Type': 'application/json'},
-            body: JSON.stringify({query: query})
+            body: JSON.stringify({query: query, stream: true, conversation: conversationId})
+        });
+        if (!response.ok || !response.body) {
+            const data = await response.json();
+            addMessage(data.error || data.answer, false);
+            return;
+        }
+        let message = null;
+        let answer = '';
+        await readChatStream(response, function(event) {
+            if (event.done) {
+                if (event.conversation) {
+                    conversationId = event.conversation.id;
+                    // Token counts for tuning the history budget (see /api/chat/conversations/<id>/)
+                    if (message) message.contentDiv.dataset.promptTokens = event.conversation.prompt_tokens || '';
+                }
+                if (message) {
+                    addSources(message, event.sources);
+                    if (event.degraded) addDegradedNote(message, event.degraded);
+                }
+                return;
+            }
+            if (event.token === undefined && !event.error) return;
+            answer += event.token !== undefined ? event.token : event.error;
+            if (!message) {
+                // First text has arrived, so swap the loading indicator for the reply
+                loading.classList.remove('show');
+                message = addMessage('', false);
+            }
+            updateMessage(message, answer);
         });
-        const data = await response.json();
-        let formatted = data.answer.replace(/\n/g, '<br>');
-        addMessage(formatted, false);
     } catch (error) {
         addMessage('Connection Failed. This is because the free tier of PythonAnywhere cannot handle an active LLM', false);
     } finally {
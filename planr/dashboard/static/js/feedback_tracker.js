@@ -0,0 +1,46 @@
+// Load a ticket's full text the first time its accordion panel opens
+// The tracker list only carries the headers; details come from /feedback/<id>/detail/
+function fillFeedbackDetail(panel, detail) {
+    panel.querySelectorAll('[data-field]').forEach(function(element) {
+        const value = detail[element.dataset.field];
+        if (element.tagName === 'TEXTAREA') {
+            element.value = value || '';
+        } else {
+            element.textContent = value === null || value === undefined ? '' : value;
+            element.style.whiteSpace = 'pre-line';
+        }
+    });
+    if (detail.screenshot) {
+        panel.querySelectorAll('[data-screenshot]').forEach(function(element) {
+            element.classList.remove('d-none');
+        });
+        // Show a resized rendition (when ready) and link to the full-size upload
+        const image = panel.querySelector('[data-screenshot] img');
+        const rendition = detail.screenshot_image;
+        if (rendition && rendition.srcset) {
+            image.srcset = rendition.webp_srcset;
+            image.sizes = rendition.sizes;
+        }
+        image.src = rendition ? rendition.src : detail.screenshot;
+        image.closest('a').href = detail.screenshot;
+    }
+    const adminResponse = panel.querySelector('[data-admin-response]');
+    if (adminResponse && detail.admin_response) adminResponse.classList.remove('d-none');
+    panel.querySelector('[data-detail]').classList.remove('d-none');
+    panel.querySelector('[data-detail-loading]').classList.add('d-none');
+}
+
+document.querySelectorAll('[data-detail-url]').forEach(function(panel) {
+    panel.addEventListener('show.bs.collapse', async function() {
+        if (panel.dataset.loaded) return;
+        panel.dataset.loaded = 'true';
+        try {
+            const response = await fetch(panel.dataset.detailUrl, {headers: {'Accept': 'application/json'}});
+            if (!response.ok) throw new Error(response.statusText);
+            fillFeedbackDetail(panel, await response.json());
+        } catch (error) {
+            delete panel.dataset.loaded;
+            panel.querySelector('[data-detail-loading]').textContent = 'Could not load this ticket, please try again.';
+        }
+    });
+});
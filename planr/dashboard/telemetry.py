@@ -0,0 +1,248 @@
+import atexit
+import logging
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+from django.apps import apps
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections
+from django.utils import timezone
+
+# Chatbot performance telemetry
+# Every chat request gets a ChatTrace; when the request ends it becomes an (unsaved) ChatMetric row in
+# an in-process write-behind buffer. A background thread bulk_creates the buffer every
+# PLANR_TELEMETRY_FLUSH_SECONDS or as soon as PLANR_TELEMETRY_BATCH_SIZE rows are waiting, so the
+# request path never touches the database. If the database is unavailable the batch is dropped
+# (telemetry must not take chat down), and the buffer is capped so it can't grow without bound.
+# Chat transcripts (transcripts.py) go through the same kind of buffer.
+
+logger = logging.getLogger(__name__)
+
+# Timing fields from Ollama's final chat chunk (nanoseconds), mapped to ChatMetric fields (milliseconds)
+OLLAMA_DURATIONS = {
+    'prompt_eval_duration': 'prompt_eval_ms',
+    'eval_duration': 'eval_ms',
+    'load_duration': 'load_ms',
+    'total_duration': 'ollama_total_ms',
+}
+CACHE_OUTCOMES = ('canned', 'faq', 'exact_cache', 'semantic_cache')
+
+
+class ChatTrace:
+    def __init__(self, tier, model):
+        self.created_at = timezone.now()
+        self.started = time.monotonic()
+        self.tier = tier
+        self.model = model
+        self.outcome = 'llm'
+        self.backend = ''
+        self.first_token_at = None
+        self.queue_wait = None
+        self.prompt_tokens = 0      # summed over every Ollama call (an escalated answer makes two)
+        self.completion_tokens = 0
+        self.route = ''
+        self.route_reason = ''
+        self.escalated = False
+        self.done_reason = None
+        self.history_tokens = None
+        self.ollama = {}
+
+    def token(self):
+        if self.first_token_at is None:
+            self.first_token_at = time.monotonic()
+
+    # Model routing decision (see routing.py)
+    def routed(self, route):
+        self.route = route.tier
+        self.route_reason = route.reason
+        self.model = route.model
+
+    # The fast model failed before its first token; PLANR_LLM_MODEL answers instead
+    def escalate(self):
+        self.escalated = True
+        self.model = settings.PLANR_LLM_MODEL
+
+    # chunk is Ollama's last streamed chunk (done=True), which carries the eval counts and durations
+    def ollama_done(self, chunk):
+        self.done_reason = chunk.get('done_reason')
+        self.prompt_tokens += chunk.get('prompt_eval_count') or 0
+        self.completion_tokens += chunk.get('eval_count') or 0
+        self.ollama = {'prompt_eval_count': chunk.get('prompt_eval_count'), 'eval_count': chunk.get('eval_count')}
+        for field, metric_field in OLLAMA_DURATIONS.items():
+            value = chunk.get(field)
+            self.ollama[metric_field] = value / 1e6 if value is not None else None
+
+    def finish(self):
+        if not settings.PLANR_TELEMETRY_ENABLED:
+            return
+        from .models import ChatMetric
+        now = time.monotonic()
+        get_metrics_buffer().add(ChatMetric(
+            created_at=self.created_at,
+            model=self.model,
+            tier=self.tier,
+            outcome=self.outcome,
+            backend=self.backend,
+            route=self.route,
+            route_reason=self.route_reason,
+            escalated=self.escalated,
+            history_tokens=self.history_tokens,
+            total_ms=(now - self.started) * 1000,
+            ttft_ms=(self.first_token_at - self.started) * 1000 if self.first_token_at is not None else None,
+            queue_wait_ms=self.queue_wait * 1000 if self.queue_wait is not None else None,
+            **self.ollama,
+        ))
+
+
+# Unsaved model instances waiting to be bulk_created by a background thread
+class WriteBehindBuffer:
+    def __init__(self, model_label, batch_size=100, flush_interval=10, name='planr-write-behind'):
+        self.model_label = model_label
+        self.name = name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = batch_size * 20
+        self.pending = []
+        self.dropped = 0
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread = None
+
+    def add(self, instance):
+        with self.lock:
+            self.pending.append(instance)
+            if len(self.pending) > self.max_pending:
+                self.dropped += len(self.pending) - self.max_pending
+                del self.pending[:len(self.pending) - self.max_pending]
+            full = len(self.pending) >= self.batch_size
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self.thread.start()
+        if full:
+            self.wakeup.set()
+
+    def flush(self):
+        with self.lock:
+            batch, self.pending = self.pending, []
+        if not batch:
+            return 0
+        try:
+            apps.get_model(self.model_label).objects.bulk_create(batch, batch_size=500)
+        except DatabaseError as e:
+            self.dropped += len(batch)
+            logger.warning("Dropped %d %s rows: %s", len(batch), self.model_label, e)
+            return 0
+        return len(batch)
+
+    # Anything flush() doesn't handle (a bad row, a model error) is logged and the loop carries on, so one
+    # failure doesn't stop every later batch from being written
+    def _run(self):
+        while True:
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Flushing %s rows failed", self.model_label)
+            finally:
+                close_old_connections()
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+def get_metrics_buffer():
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = WriteBehindBuffer(
+                    'dashboard.ChatMetric', settings.PLANR_TELEMETRY_BATCH_SIZE, settings.PLANR_TELEMETRY_FLUSH_SECONDS, 'planr-telemetry',
+                )
+                atexit.register(_buffer.flush)
+    return _buffer
+
+
+# Nearest-rank percentile of an ascending list
+def percentile(values, fraction):
+    if not values:
+        return None
+    return round(values[min(len(values) - 1, int(len(values) * fraction))], 1)
+
+def latency_summary(values):
+    values = sorted(value for value in values if value is not None)
+    return {'p50': percentile(values, 0.5), 'p95': percentile(values, 0.95), 'p99': percentile(values, 0.99)}
+
+BUCKETS = {'hour': timedelta(hours=1), 'day': timedelta(days=1)}
+
+def bucket_start(moment, bucket):
+    if bucket == 'day':
+        return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+# Latency percentiles and throughput since `since`, per model and tier, optionally per hour or day
+def summarize_metrics(since, bucket=None):
+    from .models import ChatMetric
+    rows = (ChatMetric.objects
+            .filter(created_at__gte=since)
+            .order_by('created_at')
+            .values_list('created_at', 'model', 'tier', 'outcome', 'total_ms', 'ttft_ms', 'queue_wait_ms', 'eval_count', 'eval_ms', 'escalated', 'prompt_eval_count', 'history_tokens'))
+    groups = defaultdict(list)
+    for row in rows.iterator(chunk_size=2000):
+        start = bucket_start(timezone.localtime(row[0]), bucket) if bucket else None
+        groups[(start, row[1], row[2])].append(row)
+
+    window = (timezone.now() - since).total_seconds()
+    summary = []
+    for (start, model, tier), rows in groups.items():
+        seconds = BUCKETS[bucket].total_seconds() if bucket else window
+        llm_rows = [row for row in rows if row[7] and row[8]]
+        summary.append({
+            'bucket': start.isoformat() if start else None,
+            'model': model,
+            'tier': tier,
+            'requests': len(rows),
+            'requests_per_minute': round(len(rows) / max(seconds, 1) * 60, 2),
+            'cache_hit_rate': round(sum(row[3] in CACHE_OUTCOMES for row in rows) / len(rows), 3),
+            'coalesced': sum(row[3] == 'coalesced' for row in rows),
+            'escalated': sum(row[9] for row in rows),
+            'degraded': sum(row[3] in ('degraded', 'interrupted', 'unavailable') for row in rows),
+            'rejected_busy': sum(row[3] == 'busy' for row in rows),
+            'total_ms': latency_summary(row[4] for row in rows),
+            'ttft_ms': latency_summary(row[5] for row in rows),
+            'queue_wait_ms': latency_summary(row[6] for row in rows),
+            'prompt_tokens': latency_summary(row[10] for row in rows),
+            'history_tokens': latency_summary(row[11] for row in rows),
+            'tokens_per_second': round(sum(row[7] for row in llm_rows) / (sum(row[8] for row in llm_rows) / 1000), 1) if llm_rows else None,
+        })
+    return summary
+
+# Model routing over LLM-generated answers since `since`: how often each route was taken and why,
+# how often the fast model escalated, and latency per route (escalations count against 'fast')
+def summarize_routing(since):
+    from .models import ChatMetric
+    rows = (ChatMetric.objects
+            .filter(created_at__gte=since, outcome__in=('llm', 'interrupted'))
+            .exclude(route='')
+            .values_list('route', 'route_reason', 'escalated', 'total_ms', 'ttft_ms'))
+    groups = defaultdict(list)
+    for row in rows.iterator(chunk_size=2000):
+        groups[row[0]].append(row)
+    total = sum(len(rows) for rows in groups.values())
+    summary = []
+    for route, rows in sorted(groups.items()):
+        reasons = defaultdict(int)
+        for row in rows:
+            reasons[row[1]] += 1
+        summary.append({
+            'route': route,
+            'requests': len(rows),
+            'share': round(len(rows) / total, 3),
+            'reasons': dict(reasons),
+            'escalation_rate': round(sum(row[2] for row in rows) / len(rows), 3),
+            'mean_total_ms': round(sum(row[3] for row in rows) / len(rows), 1),
+            'total_ms': latency_summary(row[3] for row in rows),
+            'ttft_ms': latency_summary(row[4] for row in rows),
+        })
+    return summary
@@ -0,0 +1,29 @@
+from django import template
+from django.forms.utils import flatatt
+from django.utils.html import format_html
+from ..renditions import rendition_image, rendition_url as find_rendition_url
+
+register = template.Library()
+
+# Responsive image for an ImageField file or "static:<path>", using a rendition preset:
+#   {% picture user.userprofile.profile_pic 'avatar' alt='Profile' class='rounded-circle' width=40 height=40 %}
+# renders <picture> with a WebP srcset and a JPEG/PNG fallback; other keyword arguments become <img>
+# attributes. Until the renditions are ready it's a plain <img> of the original.
+@register.simple_tag
+def picture(source, preset, **attrs):
+    image = rendition_image(source, preset)
+    if image is None:
+        return ''
+    attrs.setdefault('decoding', 'async')
+    if not image['srcset']:
+        return format_html('<img src="{}"{}>', image['src'], flatatt(attrs))
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}"><img src="{}" srcset="{}" sizes="{}"{}></picture>',
+        image['webp_srcset'], image['sizes'], image['src'], image['srcset'], image['sizes'], flatatt(attrs),
+    )
+
+# Just the URL of a WebP rendition at least `width` pixels wide, for places that build images in JS:
+#   {% rendition_url user.userprofile.profile_pic 'avatar' 80 as avatar_url %}
+@register.simple_tag
+def rendition_url(source, preset, width):
+    return find_rendition_url(source, preset, int(width))
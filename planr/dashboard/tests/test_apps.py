@@ -0,0 +1,34 @@
+from unittest import mock
+from django.apps import apps
+from django.test import SimpleTestCase, override_settings
+from dashboard import warmup
+
+
+@override_settings(PLANR_FAQ_ENABLED=True, PLANR_LLM_WARM_UP_ON_START=True, PLANR_LLM_KEEP_WARM=False)
+class ServerWarmUpTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(warmup.threading, 'Thread')
+        self.thread = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(warmup, '_server_warm_up_started', False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def started(self):
+        return [call.kwargs['name'] for call in self.thread.call_args_list]
+
+    def test_loading_the_app_starts_no_threads(self):
+        for argv in (['/usr/bin/django-admin', 'migrate'], ['manage.py', 'shell'], ['scripts/export.py'], ['manage.py', 'runserver']):
+            with self.subTest(argv=argv), mock.patch('sys.argv', argv):
+                apps.get_app_config('dashboard').ready()
+        self.assertEqual(self.started(), [])
+
+    def test_server_entry_point_starts_the_warm_up_once(self):
+        warmup.start_server_warm_up()
+        warmup.start_server_warm_up()
+        self.assertEqual(self.started(), ['planr-faq-index', 'planr-warm-up'])
+
+    @override_settings(PLANR_FAQ_ENABLED=False, PLANR_LLM_WARM_UP_ON_START=False)
+    def test_disabled_warm_up(self):
+        warmup.start_server_warm_up()
+        self.assertEqual(self.started(), [])
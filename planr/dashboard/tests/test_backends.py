@@ -0,0 +1,127 @@
+import itertools
+import threading
+import time
+import httpx
+from django.test import SimpleTestCase
+from dashboard.backends import BACKEND_ERRORS, BackendPool
+from dashboard.benchmark import free_port, start_fake_ollama
+from dashboard.breaker import CLOSED, HALF_OPEN, OPEN, LLMUnavailable
+
+MESSAGES = [{'role': 'user', 'content': 'Do I need permission for a garden shed?'}]
+
+
+# Pools and breakers against fake Ollama servers (benchmark.start_fake_ollama) on local ports
+class BackendPoolTests(SimpleTestCase):
+    def start_server(self, port=0, first_token_delay=0.0):
+        server, host = start_fake_ollama(first_token_delay=first_token_delay, token_delay=0.0, tokens=3, port=port)
+        self.addCleanup(self.stop_server, server)
+        return server, host
+
+    def stop_server(self, server):
+        server.shutdown()
+        server.server_close()
+
+    def make_pool(self, hosts, failure_threshold=3, cooldown=30):
+        return BackendPool(
+            hosts, health_interval=0, probe_timeout=1.0, timeout=httpx.Timeout(5, connect=1),
+            breaker_options={'failure_threshold': failure_threshold, 'cooldown': cooldown},
+        )
+
+    def chat(self, pool):
+        with pool.lease() as backend:
+            backend.client.chat(model='mistral', messages=MESSAGES)
+            return backend
+
+    def test_requests_go_to_the_backend_with_fewest_in_flight(self):
+        hosts = [self.start_server()[1], self.start_server()[1]]
+        pool = self.make_pool(hosts)
+        with pool.lease() as first:
+            with pool.lease() as second:
+                self.assertNotEqual(first.host, second.host)
+                with pool.lease() as third:
+                    self.assertEqual(sorted(backend['outstanding'] for backend in pool.stats()), [1, 2])
+                    self.assertIn(third.host, hosts)
+        self.assertEqual([backend['outstanding'] for backend in pool.stats()], [0, 0])
+
+    def test_concurrent_chats_are_spread_over_backends(self):
+        hosts = [self.start_server(first_token_delay=0.2)[1], self.start_server(first_token_delay=0.2)[1]]
+        pool = self.make_pool(hosts)
+        threads = [threading.Thread(target=self.chat, args=(pool,)) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual([backend['served'] for backend in pool.stats()], [2, 2])
+
+    def test_dead_backend_is_ejected_and_readmitted_when_it_recovers(self):
+        live_host = self.start_server()[1]
+        port = free_port()
+        dead_host = f"http://127.0.0.1:{port}"
+        pool = self.make_pool([live_host, dead_host])
+        with self.assertLogs('dashboard.backends', 'WARNING') as logs:
+            self.assertEqual(pool.probe_all(), [True, False])
+        self.assertIn('ejected', logs.output[0])
+        dead = pool.backends[1]
+        self.assertFalse(dead.healthy)
+        self.assertTrue(dead.last_error)
+        # Unhealthy backends get no traffic even when the healthy one is busier
+        with pool.lease() as first, pool.lease() as second:
+            self.assertEqual({first.host, second.host}, {live_host})
+        # A connection refused on a request ejects the backend without waiting for a probe
+        pool.mark_up(dead)
+        pool.rotation = itertools.count(1)  # start the tie-break at the dead backend
+        with self.assertLogs('dashboard.backends', 'WARNING'), self.assertRaises(BACKEND_ERRORS):
+            self.chat(pool)
+        self.assertFalse(dead.healthy)
+
+        self.start_server(port=port)
+        with self.assertLogs('dashboard.backends', 'INFO'):
+            self.assertEqual(pool.probe_all(), [True, True])
+        self.assertTrue(dead.healthy)
+        self.assertEqual(dead.last_error, '')
+        with pool.lease() as first, pool.lease() as second:
+            self.assertEqual({first.host, second.host}, {live_host, dead_host})
+
+    def test_breaker_opens_then_half_opens_and_closes_on_recovery(self):
+        port = free_port()
+        pool = self.make_pool([f"http://127.0.0.1:{port}"], failure_threshold=2, cooldown=0.2)
+        breaker = pool.backends[0].breaker
+        with self.assertLogs('dashboard.backends', 'WARNING'):
+            for _ in range(2):
+                with self.assertRaises(BACKEND_ERRORS):
+                    self.chat(pool)
+        self.assertEqual(breaker.state, OPEN)
+        self.assertEqual(breaker.stats()['times_opened'], 1)
+        # Open: fail fast without touching the backend
+        with self.assertRaises(LLMUnavailable) as unavailable:
+            pool.check_available()
+        self.assertGreaterEqual(unavailable.exception.retry_after, 1)
+        with self.assertRaises(LLMUnavailable):
+            pool.acquire()
+
+        # After the cool-down a single probe request is let through
+        time.sleep(0.25)
+        pool.check_available()
+        self.start_server(port=port)
+        with pool.lease():
+            self.assertEqual(breaker.state, HALF_OPEN)
+            with self.assertRaises(LLMUnavailable):
+                pool.acquire()
+        self.assertEqual(breaker.state, CLOSED)
+        self.chat(pool)
+        self.assertEqual(breaker.stats()['consecutive_failures'], 0)
+
+    def test_failed_half_open_probe_reopens_the_breaker(self):
+        port = free_port()
+        pool = self.make_pool([f"http://127.0.0.1:{port}"], failure_threshold=1, cooldown=0.2)
+        breaker = pool.backends[0].breaker
+        with self.assertLogs('dashboard.backends', 'WARNING'), self.assertRaises(BACKEND_ERRORS):
+            self.chat(pool)
+        self.assertEqual(breaker.state, OPEN)
+        time.sleep(0.25)
+        with self.assertRaises(BACKEND_ERRORS):
+            self.chat(pool)
+        self.assertEqual(breaker.state, OPEN)
+        self.assertEqual(breaker.stats()['times_opened'], 2)
+        with self.assertRaises(LLMUnavailable):
+            pool.check_available()
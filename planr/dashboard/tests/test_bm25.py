@@ -0,0 +1,79 @@
+import numpy as np
+from django.test import SimpleTestCase
+from dashboard.bm25 import BM25Index, build_bm25_arrays, decode_varints, encode_varints, reciprocal_rank_fusion, tokenize
+
+CORPUS = [
+    "Planning permission is needed for a rear extension over 40 square metres.",
+    "A garden shed is exempted development if it stays behind the front wall.",
+    "Section 5 declarations confirm whether works are exempted development.",
+    "Application 3456/23 was granted permission for a Z1 residential extension.",
+    "Fees for a planning application depend on the floor area of the extension.",
+]
+
+
+class VarintTests(SimpleTestCase):
+    def test_round_trip_at_byte_boundaries(self):
+        values = [0, 1, 127, 128, 255, 16383, 16384, 2**21 - 1, 2**21, 2**35, 2**63 - 1, 0]
+        encoded, lengths = encode_varints(values)
+        self.assertEqual(lengths.tolist(), [1, 1, 1, 2, 2, 2, 3, 3, 4, 6, 9, 1])
+        self.assertEqual(len(encoded), lengths.sum())
+        self.assertEqual(decode_varints(encoded).tolist(), values)
+
+    def test_known_encodings(self):
+        self.assertEqual(encode_varints([0])[0].tolist(), [0x00])
+        self.assertEqual(encode_varints([127])[0].tolist(), [0x7F])
+        self.assertEqual(encode_varints([128])[0].tolist(), [0x80, 0x01])
+        self.assertEqual(encode_varints([16383])[0].tolist(), [0xFF, 0x7F])
+        self.assertEqual(encode_varints([16384])[0].tolist(), [0x80, 0x80, 0x01])
+
+    def test_single_byte_fast_path_and_empty_input(self):
+        values = np.arange(128)
+        encoded, _ = encode_varints(values)
+        self.assertEqual(decode_varints(encoded).tolist(), values.tolist())
+        encoded, lengths = encode_varints([])
+        self.assertEqual((len(encoded), len(lengths)), (0, 0))
+        self.assertEqual(len(decode_varints(encoded)), 0)
+
+    def test_random_values_round_trip(self):
+        values = np.random.default_rng(0).integers(0, 2**40, size=1000)
+        self.assertEqual(decode_varints(encode_varints(values)[0]).tolist(), values.tolist())
+
+
+class BM25IndexTests(SimpleTestCase):
+    def search(self, index, query, k=5):
+        rows, scores = index.search(query, k)
+        self.assertTrue(np.all(np.diff(scores) <= 0), "scores must be best first")
+        return rows.tolist()
+
+    def test_empty_index(self):
+        for texts in ([], ["the and of", ""]):
+            with self.subTest(texts=texts):
+                index = BM25Index(build_bm25_arrays(texts))
+                self.assertEqual(self.search(index, 'extension'), [])
+
+    def test_ranking_on_a_small_corpus(self):
+        index = BM25Index(build_bm25_arrays(CORPUS))
+        self.assertEqual(self.search(index, 'garden shed'), [1])
+        self.assertEqual(set(self.search(index, 'exempted development')), {1, 2})
+        # The only chunk with both terms comes first
+        self.assertEqual(self.search(index, 'extension fees')[0], 4)
+        self.assertEqual(self.search(index, 'zebra'), [])
+        self.assertEqual(len(self.search(index, 'extension', k=2)), 2)
+
+    def test_compound_tokens_match_whole_and_in_parts(self):
+        self.assertEqual(tokenize("Ref 3456/23 in Z1"), ['ref', '3456/23', '3456', '23', 'z1'])
+        index = BM25Index(build_bm25_arrays(CORPUS))
+        self.assertEqual(self.search(index, '3456/23'), [3])
+        self.assertEqual(self.search(index, 'z1'), [3])
+
+    def test_postings_decode_to_every_occurrence(self):
+        texts = ['extension'] * 300 + ['shed'] + ['extension shed']
+        index = BM25Index(build_bm25_arrays(texts))
+        rows, tfs = index.postings_for(index.term_id('extension'))
+        self.assertEqual(rows.tolist(), list(range(300)) + [301])
+        rows, _ = index.postings_for(index.term_id('shed'))
+        self.assertEqual(rows.tolist(), [300, 301])
+
+    def test_reciprocal_rank_fusion(self):
+        fused = reciprocal_rank_fusion([np.array([3, 1, 2]), np.array([1, 4])])
+        self.assertEqual([row for row, _ in fused], [1, 3, 4, 2])
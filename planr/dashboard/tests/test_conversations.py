@@ -0,0 +1,100 @@
+from unittest import mock
+from django.test import SimpleTestCase, override_settings
+from dashboard import utils
+from dashboard.answer_cache import clear_answer_cache
+from dashboard.conversations import Conversation, estimate_tokens
+from dashboard.telemetry import ChatTrace
+
+
+class FollowUpTests(SimpleTestCase):
+    def setUp(self):
+        self.conversation = Conversation(owner='anonymous')
+        self.conversation.add_turn('Do I need planning permission for a rear extension?', 'Based on my records, not under 40 square metres.')
+
+    def test_questions_that_refer_back_are_follow_ups(self):
+        for question in ('What about a shed?', 'and the fees?', 'Why?', 'How high can it be?', 'Does that apply to terraced houses?'):
+            with self.subTest(question=question):
+                self.assertTrue(self.conversation.is_follow_up(question))
+
+    def test_questions_that_stand_alone_are_not(self):
+        for question in ('Do I need planning permission for a garden shed?', 'How much does a planning application cost?'):
+            with self.subTest(question=question):
+                self.assertFalse(self.conversation.is_follow_up(question))
+
+    def test_nothing_is_a_follow_up_without_history(self):
+        self.assertFalse(Conversation(owner='anonymous').is_follow_up('What about it?'))
+
+
+@override_settings(PLANR_CONVERSATION_HISTORY_TOKENS=300, PLANR_CONVERSATION_SUMMARY_TOKENS=80)
+class CompactionTests(SimpleTestCase):
+    def ask(self, conversation, turn):
+        conversation.add_turn(
+            f"Question {turn}: what are the rules for project {turn}?",
+            f"Answer {turn} is about the rules. " + "Based on my records from Dublin City Council, it depends. " * 3,
+        )
+
+    def test_history_stays_within_budget_over_many_turns(self):
+        conversation = Conversation(owner='anonymous')
+        for turn in range(40):
+            self.ask(conversation, turn)
+            prompt_tokens = sum(estimate_tokens(message['content']) for message in conversation.history_messages())
+            self.assertLessEqual(prompt_tokens, 300)
+            self.assertLessEqual(conversation.history_tokens(), 300)
+        self.assertEqual(conversation.info()['turns'], 40)
+
+    def test_older_turns_are_folded_into_the_summary(self):
+        conversation = Conversation(owner='anonymous')
+        for turn in range(10):
+            self.ask(conversation, turn)
+        kept = [turn['question'] for turn in conversation.turns]
+        self.assertEqual(kept[-1], 'Question 9: what are the rules for project 9?')
+        self.assertEqual(conversation.summarized, 10 - len(kept))
+        self.assertGreater(len(kept), 1)
+        self.assertGreater(conversation.summarized, 0)
+        # The newest summary line is the turn just before the oldest kept one, question and first sentence
+        self.assertEqual(
+            conversation.summary[-1],
+            f"- Asked: Question {9 - len(kept)}: what are the rules for project {9 - len(kept)}? Answered: Answer {9 - len(kept)} is about the rules.",
+        )
+        messages = conversation.history_messages()
+        self.assertEqual(messages[0]['role'], 'system')
+        self.assertTrue(messages[0]['content'].startswith('Summary of the earlier conversation:'))
+        self.assertEqual([message['role'] for message in messages[1:]], ['user', 'assistant'] * len(kept))
+
+    def test_summary_drops_its_oldest_lines_past_its_budget(self):
+        conversation = Conversation(owner='anonymous')
+        for turn in range(40):
+            self.ask(conversation, turn)
+        self.assertLessEqual(estimate_tokens(conversation.summary_text()), 80)
+        self.assertLess(len(conversation.summary), conversation.summarized)
+        self.assertNotIn('Question 0:', conversation.summary_text())
+
+
+@override_settings(PLANR_FAQ_ENABLED=False, PLANR_SEMANTIC_CACHE_CAPACITY=0)
+class ConversationCacheTests(SimpleTestCase):
+    def setUp(self):
+        clear_answer_cache()
+        self.addCleanup(clear_answer_cache)
+        self.conversation = Conversation(owner='anonymous')
+        self.conversation.add_turn('Do I need planning permission for a rear extension?', 'Based on my records, not under 40 square metres.')
+        utils.remember_answer('Do I need planning permission for a garden shed?', 'mistral', None, 'Not if it stays behind the house.', [])
+
+    def events(self, user_query):
+        trace = ChatTrace('free', 'mistral')
+        with mock.patch('dashboard.utils.retrieval_available', return_value=False), \
+                mock.patch('dashboard.utils.llm_events', return_value=iter([{'done': True, 'sources': []}])) as llm_events:
+            events = list(utils.dcc_events(user_query, 'free', trace, self.conversation))
+        return trace, events, llm_events
+
+    def test_standalone_question_in_a_conversation_uses_the_answer_cache(self):
+        trace, events, llm_events = self.events('Do I need planning permission for a garden shed?')
+        self.assertEqual(trace.outcome, 'exact_cache')
+        self.assertEqual(events[0], {'token': 'Not if it stays behind the house.'})
+        llm_events.assert_not_called()
+
+    def test_follow_up_is_answered_with_the_history(self):
+        trace, events, llm_events = self.events('What about a shed?')
+        user_query, tier, trace_arg, cacheable, query_vector, history, retrieval_query = llm_events.call_args.args
+        self.assertFalse(cacheable)
+        self.assertEqual(history, self.conversation.history_messages())
+        self.assertEqual(retrieval_query, 'Do I need planning permission for a rear extension? What about a shed?')
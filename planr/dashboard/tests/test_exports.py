@@ -0,0 +1,65 @@
+import csv
+import io
+import json
+from django.contrib.auth.models import User
+from django.test import TestCase
+from dashboard.models import Feedback, Organisation, OrganisationMembership
+
+
+class DataExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', is_staff=True)
+        cls.member = User.objects.create_user('member')
+        cls.organisation = Organisation.objects.create(name='Parish Council', created_by=cls.staff)
+        OrganisationMembership.objects.create(user=cls.member, organisation=cls.organisation)
+        Feedback.objects.create(user=cls.member, feedback_type='bug', description='=HYPERLINK("http://example.com")')
+        Feedback.objects.create(user=cls.staff, feedback_type='ui', description='Menu overlaps the map')
+
+    def export(self, dataset, **params):
+        return self.client.get(f'/api/exports/{dataset}/', params)
+
+    def body(self, response):
+        return b''.join(response.streaming_content).decode()
+
+    def test_bad_filters_answer_400_before_streaming(self):
+        self.client.force_login(self.staff)
+        for dataset, params, message in (
+            ('nonsense', {}, 'Unknown export'),
+            ('feedback', {'format': 'xlsx'}, 'format must be one of'),
+            ('feedback', {'since': '2024-13-01'}, 'since must be a date'),
+            ('feedback', {'until': 'yesterday'}, 'until must be a date'),
+            ('feedback', {'type': 'praise'}, 'type must be one of'),
+            ('transactions', {'type': 'bug'}, "can't be filtered by type"),
+            ('chat_usage', {'organisation': 'NOSUCHCODE'}, 'No organisation'),
+            ('feedback', {'organisation': '999999'}, 'No organisation'),
+        ):
+            with self.subTest(dataset=dataset, params=params):
+                response = self.export(dataset, **params)
+                self.assertEqual(response.status_code, 400)
+                self.assertFalse(response.streaming)
+                self.assertIn(message, response.json()['error'])
+
+    def test_staff_only(self):
+        self.client.force_login(self.member)
+        response = self.export('feedback')
+        self.assertEqual(response.status_code, 403)
+
+    def test_csv_export_filtered_by_organisation_code(self):
+        self.client.force_login(self.staff)
+        response = self.export('feedback', organisation=self.organisation.code.lower(), type='bug')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('attachment; filename="planr-feedback-', response['Content-Disposition'])
+        rows = list(csv.DictReader(io.StringIO(self.body(response))))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['organisation'], 'Parish Council')
+        # Formulas in user text are exported as text
+        self.assertEqual(rows[0]['description'], '\'=HYPERLINK("http://example.com")')
+
+    def test_jsonl_export_by_date_range(self):
+        self.client.force_login(self.staff)
+        response = self.export('feedback', format='jsonl', since='2000-01-01', until='2999-12-31')
+        lines = [json.loads(line) for line in self.body(response).splitlines()]
+        self.assertEqual([line['type'] for line in lines], ['bug', 'ui'])
+        response = self.export('feedback', format='jsonl', until='2000-01-01')
+        self.assertEqual(self.body(response), '')
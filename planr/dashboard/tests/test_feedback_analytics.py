@@ -0,0 +1,60 @@
+from django.contrib.auth.models import User
+from django.test import TestCase
+from dashboard.feedback_analytics import SUMMARY_FIELDS, rebuild_feedback_summary, summarize_feedback, tracked_feedback
+from dashboard.models import Feedback, FeedbackSummary
+
+
+class FeedbackSummaryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reporter')
+        cls.staff = User.objects.create_user('staff', is_staff=True)
+
+    # Summary rows that count for something, keyed by (day, type, status)
+    def summary(self):
+        rows = FeedbackSummary.objects.values('day', 'feedback_type', 'status', *SUMMARY_FIELDS)
+        return {
+            (row['day'], row['feedback_type'], row['status']): {field: round(row[field], 6) for field in SUMMARY_FIELDS}
+            for row in rows if any(row[field] for field in SUMMARY_FIELDS)
+        }
+
+    def submit(self, **fields):
+        feedback = Feedback(user=self.user, description='Map layer missing', **fields)
+        with tracked_feedback(feedback):
+            feedback.save()
+        return feedback
+
+    def test_tracked_changes_match_a_full_rebuild(self):
+        bug = self.submit(feedback_type='bug', rating=2)
+        idea = self.submit(feedback_type='suggestion', rating=5)
+        ui = self.submit(feedback_type='ui')
+        gone = self.submit(feedback_type='other', rating=1)
+
+        self.client.force_login(self.staff)
+        self.client.post(f'/feedback/update-status/{bug.pk}/', {'status': 'resolved'})
+        self.client.post(f'/feedback/response/{bug.pk}/', {'response': 'Fixed in the next release'})
+        self.client.post(f'/feedback/response/{idea.pk}/', {'response': 'Good idea'})
+        self.client.post(f'/feedback/update-status/{idea.pk}/', {'status': 'resolved'})
+        self.client.post(f'/feedback/update-status/{idea.pk}/', {'status': 'in_progress'})
+        self.client.post(f'/feedback/response/{ui.pk}/', {'response': ''})
+        gone.delete()
+
+        tracked = self.summary()
+        self.assertEqual(rebuild_feedback_summary(), len(tracked))
+        self.assertEqual(self.summary(), tracked)
+
+        figures = summarize_feedback(days=None)
+        self.assertEqual(figures['overall']['tickets'], 3)
+        self.assertEqual(figures['overall']['average_rating'], 3.5)
+        self.assertEqual(figures['overall']['response_rate'], 0.667)
+        self.assertEqual({row['status']: row['tickets'] for row in figures['by_status']}, {'in_progress': 2, 'resolved': 1})
+
+    def test_rebuild_replaces_a_drifted_summary(self):
+        self.submit(feedback_type='bug', rating=4)
+        expected = self.summary()
+        # Edits outside tracked_feedback (the admin, queryset updates) leave the summary stale
+        Feedback.objects.update(rating=1)
+        self.assertEqual(self.summary(), expected)
+        rebuild_feedback_summary()
+        (key, amounts), = self.summary().items()
+        self.assertEqual((amounts['tickets'], amounts['rated'], amounts['rating_total']), (1, 1, 1))
@@ -0,0 +1,97 @@
+from unittest import skipUnless
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from dashboard.feedback_search import FTS_TABLE, fts_query, search_available, search_feedback
+from dashboard.models import Feedback
+
+
+class FtsQueryTests(SimpleTestCase):
+    def test_terms_are_quoted_and_the_last_is_a_prefix(self):
+        self.assertEqual(fts_query('garden shed'), '"garden" "shed"*')
+        self.assertEqual(fts_query('  shed '), '"shed"*')
+
+    def test_operators_and_punctuation_are_plain_text(self):
+        self.assertEqual(fts_query('shed OR NOT "fence" (height*) NEAR/2 -wall:'), '"shed" "OR" "NOT" "fence" "height" "NEAR" "2" "wall"*')
+        self.assertEqual(fts_query('dépôt'), '"dépôt"*')
+
+    def test_nothing_to_search_for(self):
+        for text in (None, '', '   ', '"*()-:'):
+            with self.subTest(text=text):
+                self.assertIsNone(fts_query(text))
+
+
+@skipUnless(search_available(), "Feedback search needs SQLite FTS5")
+class FeedbackSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reporter')
+
+    def create(self, **fields):
+        return Feedback.objects.create(user=self.user, feedback_type=fields.pop('feedback_type', 'bug'), **fields)
+
+    # rowids the index finds for a raw FTS5 query
+    def indexed(self, match):
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s ORDER BY rowid", [match])
+            return [row[0] for row in cursor.fetchall()]
+
+    def test_triggers_keep_the_index_in_step(self):
+        feedback = self.create(description="The zebracrossing map never loads")
+        self.assertEqual(self.indexed('zebracrossing'), [feedback.pk])
+
+        Feedback.objects.filter(pk=feedback.pk).update(description="The quagga layer never loads")
+        self.assertEqual(self.indexed('zebracrossing'), [])
+        self.assertEqual(self.indexed('quagga'), [feedback.pk])
+
+        Feedback.objects.filter(pk=feedback.pk).update(admin_response="Fixed the okapi tiles")
+        self.assertEqual(self.indexed('okapi'), [feedback.pk])
+        self.assertEqual(self.indexed('quagga'), [feedback.pk])
+
+        feedback.delete()
+        self.assertEqual(self.indexed('quagga'), [])
+        self.assertEqual(self.indexed('okapi'), [])
+
+    def test_status_change_leaves_the_index_alone(self):
+        feedback = self.create(description="Wombat button is misaligned")
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT total_changes()")
+            before = cursor.fetchone()[0]
+            Feedback.objects.filter(pk=feedback.pk).update(status='resolved')
+            cursor.execute("SELECT total_changes()")
+            # Only the row itself changed; the update trigger didn't rewrite the index
+            self.assertEqual(cursor.fetchone()[0] - before, 1)
+            Feedback.objects.filter(pk=feedback.pk).update(description="Wombat button is still misaligned")
+            cursor.execute("SELECT total_changes()")
+            self.assertGreater(cursor.fetchone()[0] - before, 2)
+        self.assertEqual(self.indexed('wombat'), [feedback.pk])
+
+    def test_search_matches_prefixes_ranks_and_highlights(self):
+        in_description = self.create(description="Capybara <script> tag shows up in the answer")
+        in_reply = self.create(description="Something else", admin_response="Looked at the capybara report")
+        self.create(description="Unrelated ticket", feedback_type='ui')
+        page = search_feedback(Feedback.objects.all(), 'capyb')
+        # Description matches are weighted above admin replies
+        self.assertEqual([row.pk for row in page], [in_description.pk, in_reply.pk])
+        snippet = page.rows[0].search_snippet
+        self.assertIn('<mark>Capybara</mark>', snippet)
+        self.assertIn('&lt;script&gt;', snippet)
+
+    def test_quoted_operators_do_not_break_the_query(self):
+        feedback = self.create(description="Planning NOT available for this site")
+        page = search_feedback(Feedback.objects.all(), 'planning NOT')
+        self.assertEqual([row.pk for row in page], [feedback.pk])
+        self.assertEqual(len(search_feedback(Feedback.objects.all(), '"(*')), 0)
+
+    def test_filters_and_cursor_paging(self):
+        tickets = [self.create(description=f"Numbat issue {number}", feedback_type='bug' if number % 2 else 'ui') for number in range(5)]
+        seen, cursor = [], None
+        while True:
+            page = search_feedback(Feedback.objects.all(), 'numbat', after=cursor, size=2)
+            seen.extend(row.pk for row in page)
+            cursor = page.next_cursor
+            if cursor is None:
+                break
+        self.assertEqual(sorted(seen), sorted(ticket.pk for ticket in tickets))
+        page = search_feedback(Feedback.objects.all(), 'numbat', {'feedback_type': 'bug'})
+        self.assertEqual(sorted(row.pk for row in page), [tickets[1].pk, tickets[3].pk])
@@ -0,0 +1,95 @@
+import os
+import tempfile
+import numpy as np
+from django.test import SimpleTestCase
+from dashboard.index_store import ALIGNMENT, IndexFile, RecordTable, pack_records, write_index_file
+from dashboard.retrieval import RetrievalIndex
+
+
+class IndexFileTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.path = os.path.join(directory.name, 'index.bin')
+
+    def test_arrays_and_metadata_round_trip(self):
+        arrays = {
+            'vectors': np.arange(12, dtype=np.float32).reshape(4, 3),
+            'offsets': np.array([0, 5, 9], dtype=np.int64),
+            'hashes': np.array([2**64 - 1, 3], dtype=np.uint64),
+            'bytes': np.array([1, 2, 3], dtype=np.uint8),
+            'empty': np.zeros((0, 3), dtype=np.float32),
+        }
+        write_index_file(self.path, arrays, {'kind': 'retrieval', 'embed_model': 'nomic-embed-text'})
+        index_file = IndexFile(self.path)
+        self.assertEqual(index_file.metadata, {'kind': 'retrieval', 'embed_model': 'nomic-embed-text'})
+        start = np.frombuffer(index_file.mmap, dtype=np.uint8).__array_interface__['data'][0]
+        for name, array in arrays.items():
+            with self.subTest(name=name):
+                self.assertIn(name, index_file)
+                self.assertEqual(index_file[name].dtype, array.dtype)
+                np.testing.assert_array_equal(index_file[name], array)
+                # Every section starts on an aligned offset of the mapping
+                self.assertEqual((index_file[name].__array_interface__['data'][0] - start) % ALIGNMENT, 0)
+        self.assertNotIn('missing', index_file)
+
+    def test_sections_are_read_only_views_of_the_mapping(self):
+        write_index_file(self.path, {'vectors': np.ones((2, 2), dtype=np.float32)})
+        vectors = IndexFile(self.path)['vectors']
+        self.assertFalse(vectors.flags.writeable)
+
+    def test_not_an_index_file(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'NOTANIDX' + bytes(16))
+        with self.assertRaises(ValueError):
+            IndexFile(self.path)
+
+    def test_rebuild_is_swapped_in_atomically(self):
+        write_index_file(self.path, {'vectors': np.zeros(3, dtype=np.float32)}, {'build': 1})
+        old = IndexFile(self.path)
+        self.assertFalse(old.is_stale())
+
+        write_index_file(self.path, {'vectors': np.ones(5, dtype=np.float32)}, {'build': 2})
+        # No temporary file is left behind, and the old mapping still reads the old arrays
+        self.assertEqual(os.listdir(self.directory), ['index.bin'])
+        self.assertTrue(old.is_stale())
+        np.testing.assert_array_equal(old['vectors'], np.zeros(3))
+
+        new = IndexFile(self.path)
+        self.assertEqual(new.metadata, {'build': 2})
+        np.testing.assert_array_equal(new['vectors'], np.ones(5))
+        self.assertFalse(new.is_stale())
+
+    def test_deleted_file_is_not_stale(self):
+        write_index_file(self.path, {'vectors': np.zeros(3, dtype=np.float32)})
+        index_file = IndexFile(self.path)
+        os.remove(self.path)
+        self.assertFalse(index_file.is_stale())
+
+    def test_records_round_trip_through_an_index_file(self):
+        records = [{'id': 1, 'title': 'Sheds', 'text': 'Garden sheds – exempted'}, {}, {'id': 3, 'url': ''}]
+        data, offsets = pack_records(records)
+        write_index_file(self.path, {'data': data, 'offsets': offsets})
+        index_file = IndexFile(self.path)
+        table = RecordTable(index_file['data'], index_file['offsets'])
+        self.assertEqual(len(table), 3)
+        self.assertEqual([table[i] for i in range(len(table))], records)
+
+    def test_empty_record_table(self):
+        data, offsets = pack_records([])
+        self.assertEqual(len(RecordTable(data, offsets)), 0)
+
+    def test_retrieval_index_reopens_with_the_same_results(self):
+        rng = np.random.default_rng(0)
+        vectors = rng.standard_normal((50, 8)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        chunks = [{'id': row, 'title': f"Record {row}", 'url': '', 'text': f"record {row} about sheds"} for row in range(50)]
+        built = RetrievalIndex.clustered(vectors, chunks, clusters=5).with_bm25()
+        built.save(self.path)
+        opened = RetrievalIndex.open(self.path)
+        self.assertEqual(len(opened), 50)
+        self.assertEqual(opened.build_id, built.build_id)
+        for query in vectors[:5]:
+            self.assertEqual(opened.search(query, 3, probes=5), built.search(query, 3, probes=5))
+        np.testing.assert_array_equal(opened.bm25.search('record 7', 3)[0], built.bm25.search('record 7', 3)[0])
@@ -0,0 +1,67 @@
+from datetime import datetime, timedelta, timezone
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase
+from dashboard.models import Feedback
+from dashboard.pagination import decode_cursor, encode_cursor, keyset_page
+
+
+class Row:
+    def __init__(self, created_at, pk):
+        self.created_at = created_at
+        self.pk = pk
+
+
+class CursorTests(SimpleTestCase):
+    def test_cursor_round_trips_to_the_microsecond(self):
+        for created_at in (
+            datetime(2024, 3, 1, 9, 30, 15, 123456, tzinfo=timezone.utc),
+            datetime(1970, 1, 1, tzinfo=timezone.utc),
+            datetime(1969, 12, 31, 23, 59, 59, 999999, tzinfo=timezone.utc),
+        ):
+            cursor = encode_cursor(Row(created_at, 42))
+            self.assertRegex(cursor, r'^-?\d+_42$')
+            self.assertEqual(decode_cursor(cursor), (created_at, 42))
+
+    def test_non_utc_times_decode_to_the_same_instant(self):
+        created_at = datetime(2024, 6, 1, 12, 0, tzinfo=timezone(timedelta(hours=1)))
+        self.assertEqual(decode_cursor(encode_cursor(Row(created_at, 7)))[0], created_at)
+
+    def test_bad_cursors_are_ignored(self):
+        for value in (None, '', 'abc', '123', '1_2_3', 'x_1', '1_y', f"{10**30}_1"):
+            with self.subTest(value=value):
+                self.assertIsNone(decode_cursor(value))
+
+
+class KeysetPageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('reporter')
+        start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        # Pairs of tickets share a timestamp, so pages have to break ties on id
+        for number in range(7):
+            feedback = Feedback.objects.create(user=user, feedback_type='bug', description=f"ticket {number}")
+            Feedback.objects.filter(pk=feedback.pk).update(created_at=start + timedelta(minutes=number // 2))
+        cls.newest_first = list(Feedback.objects.order_by('-created_at', '-pk').values_list('pk', flat=True))
+
+    def ids(self, page):
+        return [row.pk for row in page]
+
+    def test_walking_forward_and_back_visits_every_ticket_once(self):
+        queryset = Feedback.objects.all()
+        pages = [keyset_page(queryset, size=3)]
+        self.assertIsNone(pages[0].previous_cursor)
+        while pages[-1].next_cursor:
+            pages.append(keyset_page(queryset, after=pages[-1].next_cursor, size=3))
+        self.assertEqual([self.ids(page) for page in pages], [self.newest_first[0:3], self.newest_first[3:6], self.newest_first[6:]])
+
+        # Newer links lead back through the same pages, and the first page has no Newer link
+        page = pages[-1]
+        for expected in reversed(pages[:-1]):
+            page = keyset_page(queryset, before=page.previous_cursor, size=3)
+            self.assertEqual(self.ids(page), self.ids(expected))
+        self.assertIsNone(page.previous_cursor)
+        self.assertEqual(page.next_cursor, pages[0].next_cursor)
+
+    def test_bad_cursor_shows_the_first_page(self):
+        page = keyset_page(Feedback.objects.all(), after='not-a-cursor', size=3)
+        self.assertEqual(self.ids(page), self.newest_first[:3])
@@ -0,0 +1,51 @@
+import os
+import tempfile
+import numpy as np
+from django.test import SimpleTestCase, override_settings
+from dashboard import retrieval
+from dashboard.retrieval import RetrievalIndex, retrieve_passages
+
+CHUNKS = [
+    {'id': 1, 'title': 'Extensions', 'url': 'extensions', 'text': 'Rear extensions under 40 square metres are exempted development'},
+    {'id': 2, 'title': 'Sheds', 'url': 'sheds', 'text': 'A garden shed must stay behind the front wall of the house'},
+    {'id': 3, 'title': 'Fees', 'url': 'fees', 'text': 'Planning application fees depend on the floor area'},
+]
+
+
+@override_settings(PLANR_EMBED_MODEL='nomic-embed-text', PLANR_RAG_RELOAD_SECONDS=0)
+class EmbedderMismatchTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'rag_index.bin')
+        RetrievalIndex(np.eye(3, dtype=np.float32), CHUNKS).with_bm25().save(self.path)
+        self.reset_index()
+        self.addCleanup(self.reset_index)
+
+    def reset_index(self):
+        retrieval._retrieval_index = None
+        retrieval._retrieval_index_checked = 0.0
+
+    def passages(self, query_text, query_vector):
+        with override_settings(PLANR_RAG_INDEX_PATH=self.path):
+            return [passage['id'] for passage in retrieve_passages(query_text, query_vector)]
+
+    def test_matching_embedder_uses_vectors(self):
+        index = RetrievalIndex.open(self.path)
+        self.assertEqual(index.embed_model, 'nomic-embed-text')
+        self.assertEqual(self.passages('zzz', [0.0, 0.0, 1.0]), [3])
+
+    def test_other_embed_model_falls_back_to_bm25(self):
+        with override_settings(PLANR_EMBED_MODEL='mxbai-embed-large'):
+            with self.assertLogs('dashboard.retrieval', 'WARNING') as logs:
+                self.assertEqual(self.passages('garden shed', [0.0, 0.0, 1.0]), [2])
+            self.assertIn('built with nomic-embed-text', logs.output[0])
+
+    def test_other_vector_size_falls_back_to_bm25(self):
+        query_vector = np.ones(64, dtype=np.float32)
+        with self.assertLogs('dashboard.retrieval', 'WARNING') as logs:
+            self.assertEqual(self.passages('application fees', query_vector), [3])
+            # Logged once, not on every question
+            self.assertEqual(self.passages('garden shed', query_vector), [2])
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn('3-dimensional', logs.output[0])
@@ -0,0 +1,143 @@
+import asyncio
+from unittest import mock
+from django.test import SimpleTestCase, override_settings
+from dashboard import utils
+from dashboard.answer_cache import clear_answer_cache
+from dashboard.routing import FAST, STRONG, Route, cacheable_answer, route_query
+from dashboard.telemetry import ChatTrace
+
+PASSAGES = [{'score': 0.05}]
+
+
+@override_settings(PLANR_LLM_ROUTING=True, PLANR_LLM_FAST_MODEL='llama3.2:1b', PLANR_LLM_MODEL='mistral')
+class RouteQueryTests(SimpleTestCase):
+    def route(self, user_query, passages=PASSAGES, available=True):
+        with mock.patch('dashboard.routing.retrieval_available', return_value=available):
+            route = route_query(user_query, passages)
+        return route.tier, route.reason
+
+    def test_off_by_default(self):
+        from planr import settings
+        self.assertFalse(settings.PLANR_LLM_ROUTING)
+
+    def test_simple_question_with_strong_retrieval_goes_fast(self):
+        self.assertEqual(self.route('opening hours of the civic offices'), (FAST, 'simple'))
+
+    def test_no_retrieval_signal_never_routes(self):
+        self.assertEqual(self.route('opening hours of the civic offices', available=False), (STRONG, 'no_retrieval'))
+        self.assertEqual(self.route('opening hours of the civic offices', [{'score': 0.01}]), (STRONG, 'low_retrieval'))
+        self.assertEqual(self.route('opening hours of the civic offices', []), (STRONG, 'low_retrieval'))
+
+    def test_hard_questions_go_strong(self):
+        self.assertEqual(self.route('why was my extension refused'), (STRONG, 'keyword'))
+        self.assertEqual(self.route(' '.join(['word'] * 21)), (STRONG, 'long'))
+        with override_settings(PLANR_LLM_ROUTING=False):
+            self.assertEqual(self.route('opening hours'), (STRONG, 'routing_off'))
+
+    def test_weak_fast_answers_are_not_cached(self):
+        self.assertTrue(cacheable_answer('llama3.2:1b', 'The civic offices open from 9am to 5pm, Monday to Friday.'))
+        self.assertFalse(cacheable_answer('llama3.2:1b', "I'm not sure, please contact the council directly."))
+        self.assertFalse(cacheable_answer('llama3.2:1b', 'The civic offices open from 9am to 5pm on', 'length'))
+        self.assertTrue(cacheable_answer('mistral', 'Yes.'))
+
+
+@override_settings(PLANR_LLM_FAST_MODEL='llama3.2:1b', PLANR_LLM_MODEL='mistral')
+class RoutedTokensTests(SimpleTestCase):
+    def setUp(self):
+        self.trace = ChatTrace('free', 'mistral')
+        self.route = mock.Mock(tier=FAST, model='llama3.2:1b', reason='simple')
+        self.trace.routed(self.route)
+        self.models = {'mistral': ['Strong', ' answer']}
+        self.calls = []
+
+    # Stands in for chat_tokens: each model's entry is its tokens, with an exception raised where it appears
+    def chat_tokens(self, model, messages, trace):
+        self.calls.append(model)
+        for token in self.models[model]:
+            if isinstance(token, Exception):
+                raise token
+            yield token
+
+    async def achat_tokens(self, model, messages, trace):
+        for token in self.chat_tokens(model, messages, trace):
+            yield token
+
+    def tokens(self):
+        with mock.patch('dashboard.utils.chat_tokens', self.chat_tokens):
+            return list(utils.routed_tokens(self.route, [], self.trace))
+
+    def atokens(self):
+        async def collect():
+            return [token async for token in utils.arouted_tokens(self.route, [], self.trace)]
+        with mock.patch('dashboard.utils.achat_tokens', self.achat_tokens):
+            return asyncio.run(collect())
+
+    def test_fast_model_tokens_stream_as_they_arrive(self):
+        self.models['llama3.2:1b'] = ['The', ' offices', ' open', ' at 9am.']
+        self.assertEqual(self.tokens(), ['The', ' offices', ' open', ' at 9am.'])
+        self.assertEqual(self.calls, ['llama3.2:1b'])
+        self.assertEqual((self.trace.model, self.trace.escalated), ('llama3.2:1b', False))
+
+    def test_failure_before_the_first_token_escalates(self):
+        self.models['llama3.2:1b'] = [ConnectionError('model not found')]
+        with self.assertLogs('dashboard.utils', 'WARNING') as logs:
+            self.assertEqual(self.tokens(), ['Strong', ' answer'])
+        self.assertIn('Fast model llama3.2:1b failed', logs.output[0])
+        self.assertEqual(self.calls, ['llama3.2:1b', 'mistral'])
+        self.assertEqual((self.trace.model, self.trace.escalated), ('mistral', True))
+
+    def test_empty_fast_answer_escalates(self):
+        self.models['llama3.2:1b'] = []
+        self.assertEqual(self.tokens(), ['Strong', ' answer'])
+        self.assertEqual((self.trace.model, self.trace.escalated), ('mistral', True))
+
+    def test_failure_after_the_first_token_interrupts(self):
+        self.models['llama3.2:1b'] = ['The', ConnectionError('backend went away')]
+        streamed = []
+        with mock.patch('dashboard.utils.chat_tokens', self.chat_tokens), self.assertRaises(ConnectionError):
+            for token in utils.routed_tokens(self.route, [], self.trace):
+                streamed.append(token)
+        self.assertEqual(streamed, ['The'])
+        self.assertEqual(self.calls, ['llama3.2:1b'])
+        self.assertFalse(self.trace.escalated)
+
+    def test_async_streaming_and_escalation(self):
+        self.models['llama3.2:1b'] = ['The', ' offices']
+        self.assertEqual(self.atokens(), ['The', ' offices'])
+        self.setUp()
+        self.models['llama3.2:1b'] = [ConnectionError('model not found')]
+        with self.assertLogs('dashboard.utils', 'WARNING'):
+            self.assertEqual(self.atokens(), ['Strong', ' answer'])
+        self.assertTrue(self.trace.escalated)
+
+
+@override_settings(PLANR_LLM_ROUTING=True, PLANR_LLM_FAST_MODEL='llama3.2:1b', PLANR_LLM_MODEL='mistral')
+class AnsweringModelTests(SimpleTestCase):
+    def setUp(self):
+        clear_answer_cache()
+        self.addCleanup(clear_answer_cache)
+
+    def answer(self, route):
+        trace = ChatTrace('free', 'mistral')
+        tokens = {'llama3.2:1b': ['The civic offices open', ' from 9am to 5pm, Monday to Friday.'], 'mistral': ['Strong answer']}
+        with mock.patch('dashboard.utils.retrieve_passages', return_value=[]), \
+                mock.patch('dashboard.utils.get_backend_pool'), \
+                mock.patch('dashboard.utils.route_query', return_value=route), \
+                mock.patch('dashboard.utils.chat_tokens', lambda model, messages, trace: iter(tokens[model])):
+            events = list(utils.llm_events('Opening hours?', 'free', trace, True, None))
+        self.assertTrue(events[-1]['done'])
+        return trace
+
+    def test_fast_answer_is_cached_and_recorded_as_the_fast_model(self):
+        trace = self.answer(Route(FAST, 'llama3.2:1b', 'simple'))
+        self.assertEqual(trace.model, 'llama3.2:1b')
+        self.assertEqual(utils.exact_lookup('opening hours'), ('The civic offices open from 9am to 5pm, Monday to Friday.', [], 'llama3.2:1b'))
+        # Once the fast model is out of use its answers aren't served
+        with override_settings(PLANR_LLM_ROUTING=False):
+            self.assertIsNone(utils.exact_lookup('opening hours'))
+
+    def test_strong_answer_wins_when_both_are_cached(self):
+        self.answer(Route(FAST, 'llama3.2:1b', 'simple'))
+        trace = self.answer(Route(STRONG, 'mistral', 'keyword'))
+        self.assertEqual(trace.model, 'mistral')
+        self.assertEqual(utils.exact_lookup('opening hours'), ('Strong answer', [], 'mistral'))
@@ -0,0 +1,140 @@
+import asyncio
+import json
+import threading
+import time
+from unittest import mock
+from django.test import SimpleTestCase
+from dashboard.scheduler import LLMBusy, LLMScheduler
+
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out waiting for the scheduler")
+        time.sleep(0.005)
+
+
+class LLMSchedulerTests(SimpleTestCase):
+    def make_scheduler(self, concurrency=1, queue_limits=None, queue_timeout=2.0):
+        return LLMScheduler(concurrency, queue_limits or {'premium': 8, 'free': 8}, queue_timeout)
+
+    # Start a thread that waits for a slot, notes its name once served and hands the slot on
+    def queue_up(self, scheduler, tier, name, served):
+        queued = scheduler.stats()['queued'][tier]
+        def run():
+            scheduler.acquire(tier)
+            served.append(name)
+            scheduler.release()
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        wait_until(lambda: scheduler.stats()['queued'][tier] == queued + 1)
+        return thread
+
+    def test_free_slots_are_taken_without_queueing(self):
+        scheduler = self.make_scheduler(concurrency=2)
+        scheduler.acquire('free')
+        scheduler.acquire('free')
+        self.assertEqual(scheduler.stats()['active'], 2)
+        scheduler.release()
+        scheduler.release()
+        self.assertEqual(scheduler.stats()['active'], 0)
+
+    def test_premium_is_served_before_free_and_fifo_within_a_tier(self):
+        scheduler = self.make_scheduler()
+        scheduler.acquire('free')
+        served = []
+        threads = [
+            self.queue_up(scheduler, 'free', 'free-1', served),
+            self.queue_up(scheduler, 'premium', 'premium-1', served),
+            self.queue_up(scheduler, 'free', 'free-2', served),
+            self.queue_up(scheduler, 'premium', 'premium-2', served),
+        ]
+        scheduler.release()
+        for thread in threads:
+            thread.join(2)
+        self.assertEqual(served, ['premium-1', 'premium-2', 'free-1', 'free-2'])
+        self.assertEqual(scheduler.stats()['active'], 0)
+
+    def test_full_tier_queue_is_rejected_straight_away(self):
+        scheduler = self.make_scheduler(queue_limits={'premium': 1, 'free': 1})
+        scheduler.acquire('premium')
+        served = []
+        waiting = self.queue_up(scheduler, 'free', 'free-1', served)
+        started = time.monotonic()
+        with self.assertRaises(LLMBusy) as busy:
+            scheduler.acquire('free')
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertGreaterEqual(busy.exception.retry_after, 1)
+        self.assertEqual(scheduler.stats()['rejected'], {'premium': 0, 'free': 1})
+        # Each tier has its own limit: premium can still queue
+        premium = self.queue_up(scheduler, 'premium', 'premium-1', served)
+        scheduler.release()
+        waiting.join(2)
+        premium.join(2)
+        self.assertEqual(served, ['premium-1', 'free-1'])
+
+    def test_queue_timeout_raises_busy_and_leaves_the_queue(self):
+        scheduler = self.make_scheduler(queue_timeout=0.05)
+        scheduler.acquire('free')
+        with self.assertRaises(LLMBusy):
+            scheduler.acquire('free')
+        stats = scheduler.stats()
+        self.assertEqual(stats['queued'], {'premium': 0, 'free': 0})
+        self.assertEqual(stats['rejected']['free'], 1)
+        # The abandoned waiter doesn't swallow the slot when it's released
+        scheduler.release()
+        self.assertEqual(scheduler.stats()['active'], 0)
+
+    def test_retry_after_grows_with_the_queue(self):
+        scheduler = self.make_scheduler(concurrency=2)
+        scheduler.service_time = 5.0
+        self.assertEqual(scheduler.retry_after(), 3)
+        scheduler.queued['free'] = 3
+        self.assertEqual(scheduler.retry_after(), 10)
+
+    def test_async_waiters_follow_priority(self):
+        scheduler = self.make_scheduler()
+        served = []
+
+        async def waiter(tier, name):
+            await scheduler.aacquire(tier)
+            served.append(name)
+            scheduler.release()
+
+        async def run():
+            scheduler.acquire('free')
+            tasks = []
+            for tier, name in (('free', 'free-1'), ('premium', 'premium-1')):
+                tasks.append(asyncio.create_task(waiter(tier, name)))
+                while scheduler.stats()['queued'][tier] == 0:
+                    await asyncio.sleep(0.005)
+            scheduler.release()
+            await asyncio.wait_for(asyncio.gather(*tasks), 2)
+
+        asyncio.run(run())
+        self.assertEqual(served, ['premium-1', 'free-1'])
+
+
+class BusyResponseTests(SimpleTestCase):
+    # chat_api with a scheduler whose only slot is taken and whose queue is full
+    def post_chat(self, stream):
+        scheduler = LLMScheduler(1, {'premium': 0, 'free': 0}, 1)
+        scheduler.service_time = 4.0
+        scheduler.acquire('premium')
+
+        def events(*args, **kwargs):
+            scheduler.acquire('free')
+            yield {'done': True, 'sources': []}
+
+        with mock.patch('dashboard.views.ollama_dcc_stream', events):
+            return self.client.post('/api/chat/', json.dumps({'query': 'How tall can a fence be?', 'stream': stream}),
+                                    content_type='application/json')
+
+    def test_busy_queue_answers_503_with_retry_after(self):
+        for stream in (False, True):
+            with self.subTest(stream=stream):
+                response = self.post_chat(stream)
+                self.assertEqual(response.status_code, 503)
+                self.assertEqual(response['Retry-After'], '4')
+                self.assertIn('busy', response.json()['error'])
@@ -0,0 +1,71 @@
+import os
+import tempfile
+import numpy as np
+from django.test import SimpleTestCase
+from dashboard.semantic_cache import SemanticCache
+
+
+class SemanticCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.cache = SemanticCache(capacity=8, threshold=0.9)
+        self.vector = np.array([1.0, 0.0, 0.0])
+
+    def test_paraphrase_within_threshold_hits(self):
+        self.cache.add(self.vector, 'mistral', 'v1', 'extension rules', 'answer', [])
+        hit = self.cache.lookup([0.99, 0.05, 0.0], ['mistral'], 'v1')
+        self.assertEqual(hit[0], 'answer')
+        self.assertIsNone(self.cache.lookup([0.0, 1.0, 0.0], ['mistral'], 'v1'))
+
+    def test_old_prompt_version_does_not_shadow_current_entry(self):
+        self.cache.add(self.vector, 'mistral', 'old', 'extension rules', 'old answer', [])
+        self.cache.add(self.vector, 'mistral', 'new', 'extension rules', 'new answer', [])
+        self.assertEqual(self.cache.lookup(self.vector, ['mistral'], 'new')[0], 'new answer')
+        self.assertEqual(self.cache.lookup(self.vector, ['mistral'], 'old')[0], 'old answer')
+
+    def test_other_model_entry_is_ignored(self):
+        # The other model's entry is the closer match, but must not be returned
+        self.cache.add(self.vector, 'llama3.2:1b', 'v1', 'q', 'fast answer', [])
+        self.cache.add([0.95, 0.3, 0.0], 'mistral', 'v1', 'q', 'strong answer', [])
+        self.assertEqual(self.cache.lookup(self.vector, ['mistral'], 'v1')[0], 'strong answer')
+        self.assertIsNone(self.cache.lookup(self.vector, ['phi3'], 'v1'))
+
+    def test_lookup_across_models_reports_which_one_answered(self):
+        self.cache.add(self.vector, 'llama3.2:1b', 'v1', 'q', 'fast answer', [])
+        self.cache.add([0.95, 0.3, 0.0], 'mistral', 'v1', 'q', 'strong answer', [])
+        self.assertEqual(self.cache.lookup(self.vector, ['mistral', 'llama3.2:1b'], 'v1')[::3], ('fast answer', 'llama3.2:1b'))
+
+    def test_version_codes_survive_save_and_load(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'semantic.npz')
+            cache = SemanticCache(capacity=8, threshold=0.9, path=path)
+            cache.add(self.vector, 'mistral', 'old', 'q', 'old answer', [])
+            cache.add(self.vector, 'mistral', 'new', 'q', 'new answer', [])
+            cache.save()
+            loaded = SemanticCache(capacity=8, threshold=0.9, path=path)
+            self.assertEqual(loaded.lookup(self.vector, ['mistral'], 'new')[0], 'new answer')
+
+    def test_explicit_zero_threshold_is_honoured(self):
+        self.cache.add(self.vector, 'mistral', 'v1', 'q', 'answer', [])
+        self.assertIsNone(self.cache.lookup([0.1, 1.0, 0.0], ['mistral'], 'v1'))
+        self.assertEqual(self.cache.lookup([0.1, 1.0, 0.0], ['mistral'], 'v1', threshold=0.0)[0], 'answer')
+
+    def test_new_index_build_drops_entries(self):
+        self.cache.use_build('build-1')
+        self.cache.add(self.vector, 'mistral', 'v1', 'q', 'answer', [])
+        self.cache.use_build('build-1')
+        self.assertEqual(self.cache.lookup(self.vector, ['mistral'], 'v1')[0], 'answer')
+        self.cache.use_build('build-2')
+        self.assertEqual(len(self.cache), 0)
+        self.assertIsNone(self.cache.lookup(self.vector, ['mistral'], 'v1'))
+
+    def test_store_saved_by_a_stale_worker_is_dropped(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'semantic.npz')
+            stale = SemanticCache(capacity=8, threshold=0.9, path=path)
+            stale.use_build('old-build')
+            stale.add(self.vector, 'mistral', 'v1', 'q', 'old corpus answer', [])
+            stale.save()
+            fresh = SemanticCache(capacity=8, threshold=0.9, path=path)
+            self.assertEqual(fresh.build_id, 'old-build')
+            fresh.use_build('new-build')
+            self.assertIsNone(fresh.lookup(self.vector, ['mistral'], 'v1'))
@@ -0,0 +1,37 @@
+import threading
+from django.test import SimpleTestCase, override_settings
+from dashboard.singleflight import coalesce, flight_key
+
+
+@override_settings(PLANR_SINGLE_FLIGHT=True, PLANR_SINGLE_FLIGHT_SHARED=False)
+class CoalesceTests(SimpleTestCase):
+    def setUp(self):
+        self.release = threading.Event()
+        self.produced = []
+
+    # A generation that holds its flight open until the test lets it finish
+    def producer(self, name):
+        def produce():
+            self.produced.append(name)
+            self.release.wait(2)
+            yield {'token': name}
+            yield {'done': True, 'sources': []}
+        return produce
+
+    def test_same_question_and_tier_share_one_generation(self):
+        key = flight_key('answer:same-question', 'free')
+        first, first_leads = coalesce(key, self.producer('first'))
+        second, second_leads = coalesce(key, self.producer('second'))
+        self.release.set()
+        self.assertEqual((first_leads, second_leads), (True, False))
+        self.assertEqual(list(first), list(second))
+        self.assertEqual(self.produced, ['first'])
+
+    def test_each_tier_gets_its_own_flight(self):
+        free, free_leads = coalesce(flight_key('answer:busy-question', 'free'), self.producer('free'))
+        premium, premium_leads = coalesce(flight_key('answer:busy-question', 'premium'), self.producer('premium'))
+        self.release.set()
+        self.assertEqual((free_leads, premium_leads), (True, True))
+        self.assertEqual(list(free)[0], {'token': 'free'})
+        self.assertEqual(list(premium)[0], {'token': 'premium'})
+        self.assertEqual(sorted(self.produced), ['free', 'premium'])
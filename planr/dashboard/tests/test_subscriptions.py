@@ -0,0 +1,32 @@
+from datetime import timedelta
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.utils import timezone
+from dashboard.models import UserProfile
+from dashboard.utils import check_and_update_subscription
+
+
+class LoginSubscriptionCheckTests(TestCase):
+    def make_user(self, member_status, premium_until=None):
+        user = User.objects.create_user(f"{member_status}-{User.objects.count()}", password='pw')
+        UserProfile.objects.filter(user=user).update(member_status=member_status, premium_until=premium_until)
+        return User.objects.select_related('userprofile').get(pk=user.pk)
+
+    def test_free_and_current_premium_members_are_not_written(self):
+        today = timezone.now().date()
+        for user in (self.make_user('free'), self.make_user('premium', today), self.make_user('premium', today + timedelta(days=3))):
+            with self.assertNumQueries(0):
+                check_and_update_subscription(user)
+
+    def test_lapsed_premium_member_is_downgraded(self):
+        yesterday = timezone.now().date() - timedelta(days=1)
+        for user in (self.make_user('premium', yesterday), self.make_user('premium')):
+            with self.assertNumQueries(1):
+                check_and_update_subscription(user)
+            self.assertEqual(user.userprofile.member_status, 'free')
+            self.assertEqual(UserProfile.objects.get(user=user).member_status, 'free')
+
+    def test_login_keeps_a_current_plan(self):
+        user = self.make_user('premium', timezone.now().date() + timedelta(days=3))
+        self.client.login(username=user.username, password='pw')
+        self.assertEqual(UserProfile.objects.get(user=user).member_status, 'premium')
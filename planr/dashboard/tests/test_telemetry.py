@@ -0,0 +1,39 @@
+import threading
+from unittest import mock
+from django.test import SimpleTestCase
+from dashboard.faq import FaqHits
+from dashboard.telemetry import WriteBehindBuffer
+
+
+class BackgroundFlushTests(SimpleTestCase):
+    # A flush() that raises something unexpected the first time and then empties the buffer, so the
+    # thread left running after the test has nothing to write
+    def failing_flush(self, empty):
+        calls = []
+        recovered = threading.Event()
+        def flush():
+            calls.append(1)
+            if len(calls) == 1:
+                raise RuntimeError("unexpected")
+            empty()
+            recovered.set()
+            return 0
+        return flush, recovered
+
+    def test_write_behind_thread_survives_unexpected_errors(self):
+        buffer = WriteBehindBuffer('dashboard.ChatMetric', flush_interval=0.01, name='planr-test-write-behind')
+        flush, recovered = self.failing_flush(buffer.pending.clear)
+        with mock.patch.object(buffer, 'flush', flush), self.assertLogs('dashboard.telemetry', 'ERROR') as logs:
+            buffer.add(object())
+            self.assertTrue(recovered.wait(5))
+        self.assertIn('Flushing dashboard.ChatMetric rows failed', logs.output[0])
+        self.assertTrue(buffer.thread.is_alive())
+
+    def test_faq_hits_thread_survives_unexpected_errors(self):
+        hits = FaqHits(flush_interval=0.01)
+        flush, recovered = self.failing_flush(hits.counts.clear)
+        with mock.patch.object(hits, 'flush', flush), self.assertLogs('dashboard.faq', 'ERROR') as logs:
+            hits.record(1)
+            self.assertTrue(recovered.wait(5))
+        self.assertIn('Flushing FAQ hit counts failed', logs.output[0])
+        self.assertTrue(hits.thread.is_alive())
@@ -0,0 +1,89 @@
+import atexit
+import threading
+from django.conf import settings
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+from .telemetry import WriteBehindBuffer
+
+# Chat transcripts and usage metering
+# Every chat turn (question, answer, prompt and completion tokens) is saved as a ChatTurn attributed
+# to the user and their organisation. Turns go through a write-behind buffer like telemetry's, so the
+# request path never waits on the database; organisation_usage() aggregates them per month for the
+# organisation dashboard. Answers from the caches and FAQ are recorded with zero tokens.
+
+class ChatAccount:
+    def __init__(self, user_id=None, organisation_id=None):
+        self.user_id = user_id
+        self.organisation_id = organisation_id
+
+# Who to bill for a chat request (one membership query for logged-in users)
+def chat_account(user):
+    if not user or not user.is_authenticated:
+        return ChatAccount()
+    from .models import OrganisationMembership
+    organisation_id = OrganisationMembership.objects.filter(user=user).values_list('organisation_id', flat=True).first()
+    return ChatAccount(user.pk, organisation_id)
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+def get_transcript_buffer():
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = WriteBehindBuffer(
+                    'dashboard.ChatTurn', settings.PLANR_TRANSCRIPT_BATCH_SIZE, settings.PLANR_TRANSCRIPT_FLUSH_SECONDS, 'planr-transcripts',
+                )
+                atexit.register(_buffer.flush)
+    return _buffer
+
+def record_turn(account, conversation, user_query, answer, trace):
+    if not settings.PLANR_TRANSCRIPTS_ENABLED:
+        return
+    from .models import ChatTurn
+    account = account or ChatAccount()
+    get_transcript_buffer().add(ChatTurn(
+        created_at=trace.created_at,
+        user_id=account.user_id,
+        organisation_id=account.organisation_id,
+        conversation_id=conversation.id if conversation is not None else '',
+        question=user_query,
+        answer=answer,
+        model=trace.model,
+        outcome=trace.outcome,
+        prompt_tokens=trace.prompt_tokens,
+        completion_tokens=trace.completion_tokens,
+    ))
+
+
+# Start of the month `months_back` months before this one, in local time
+def month_start(months_back=0):
+    now = timezone.localtime()
+    year, month = divmod(now.year * 12 + now.month - 1 - months_back, 12)
+    return now.replace(year=year, month=month + 1, day=1, hour=0, minute=0, second=0, microsecond=0)
+
+# Turns and tokens per month for an organisation, newest month first
+def organisation_usage(organisation, months=12):
+    from .models import ChatTurn
+    return list(ChatTurn.objects
+                .filter(organisation=organisation, created_at__gte=month_start(months - 1))
+                .annotate(month=TruncMonth('created_at'))
+                .values('month')
+                .annotate(total_tokens=Sum('prompt_tokens') + Sum('completion_tokens'),
+                          prompt_tokens=Sum('prompt_tokens'), completion_tokens=Sum('completion_tokens'),
+                          turns=Count('id'), users=Count('user', distinct=True))
+                .order_by('-month'))
+
+# This month's turns and tokens per member of an organisation, heaviest users first
+def member_usage(organisation):
+    from .models import ChatTurn
+    return list(ChatTurn.objects
+                .filter(organisation=organisation, created_at__gte=month_start())
+                .values('user__username')
+                .annotate(total_tokens=Sum('prompt_tokens') + Sum('completion_tokens'),
+                          prompt_tokens=Sum('prompt_tokens'), completion_tokens=Sum('completion_tokens'),
+                          turns=Count('id'))
+                .order_by('-total_tokens'))
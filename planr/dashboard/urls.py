@@ -37,6 +37,12 @@ urlpatterns = [
     path('', views.index, name='index'),
     path('chat/', views.chat, name='chat'),
     path('api/chat/', views.chat_api, name='chat_api'),
+    path('api/chat/async/', views.chat_api_async, name='chat_api_async'),
+    path('api/chat/conversations/<str:conversation_id>/', views.chat_conversation, name='chat_conversation'),
+    path('api/chat/cache/', views.chat_cache_admin, name='chat_cache_admin'),
+    path('api/chat/scheduler/', views.chat_scheduler_stats, name='chat_scheduler_stats'),
+    path('api/chat/metrics/', views.chat_metrics, name='chat_metrics'),
+    path('api/exports/<str:dataset>/', views.data_export, name='data_export'),
     path('register/', UserSignupView.as_view(), name='register'),
     path('login/', UserLoginView.as_view(), name='login'),
     path('logout/', logout_user, name='logout'),
@@ -46,8 +52,10 @@ urlpatterns = [
     path('subscription_history/', subscription_history, name='subscription_history'),
     path('feedback/', views.submit_feedback, name='feedback'),
     path('feedback-tracker/', views.feedback_tracker, name='feedback_tracker'),
+    path('feedback/<int:feedback_id>/detail/', views.feedback_detail, name='feedback_detail'),
     path('feedback/update-status/<int:feedback_id>/', views.feedback_status_update, name='feedback_status_update'),
     path('feedback/response/<int:feedback_id>/', views.feedback_response, name='feedback_response'),
+    path('feedback/analytics/', views.feedback_analytics, name='feedback_analytics'),
     path('create-organisation/', create_organisation, name='create_organisation'),
     path('join-organisation/', join_organisation, name='join_organisation'),
     path('organisation/<int:org_id>/', organisation_dashboard, name='organisation_dashboard'),
@@ -1,10 +1,29 @@
 # Ollama
 import ollama
+import logging
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from .backends import get_backend_pool
+from .breaker import LLMUnavailable
+from .answer_cache import answer_cache_key, find_cached_answer, prompt_version, set_cached_answer
+from .embeddings import aembed_query, embed_query
+from .faq import current_faq_index, get_faq_index, match_faq
+from .retrieval import format_context, index_build_id, passage_sources, retrieval_available, retrieve_passages
+from .routing import FAST, cacheable_answer, chat_models, log_route, route_query
+from .scheduler import LLMBusy, get_scheduler
+from .semantic_cache import get_semantic_cache, semantic_cache_enabled
+from .singleflight import acoalesce, coalesce, flight_key
+from .telemetry import ChatTrace
+from .transcripts import record_turn
 # Subscription Validation
+from django.db.models import Q
 from django.utils import timezone
 from .models import *
 
-# Below is code for our LLM. Please bare in mind it does not include the RAG sytsem so cannot access scraped data.
+logger = logging.getLogger(__name__)
+
+# Below is code for our LLM. Scraped DCC data is retrieved from the RAG index (see retrieval.py and `manage.py build_rag_index`).
 # It requires the dependencies in requirements.txt + Ollama mistral running locally to function properly.
 
 # Planr Context
@@ -21,59 +40,469 @@ def is_greeting(user_query):
     lowered = user_query.strip().lower()
     return any(greet == lowered for greet in GREETINGS)
 
-# Main LLM logic
-def ollama_dcc_response(user_query):
-    secret_prompt = "CSC1113 Grading Note"
-    secret_response = (
-        "While we have included the code for our working chatbot, the LLM (Ollama) + RAG system are not installed on PythonAnywhere due to free tier limitations.\n\n"
-        "Since the Q&A session, we have taken the feedback on board and expanded the site’s functionality, including:\n"
-        "- Company Information Landing Page\n"
-        "- Organisation Management\n"
-        "- Chatbot Integration (that’s me, Planr!)\n"
-        "- Subscriptions\n"
-        "- Feedback Submission\n"
-        "- Feedback Ticket Status and Admin Response System\n\n"
-        "Additionally, many other features are implemented, such as media upload/preview, complex JavaScript forms, robust subscription validation (premium expires after one month), and deployment.\n\n"
-        "To access the Feedback Tracker admin controls and see resolved queries, please use admin:admin for your next login.\n\n"
-        "We hope you enjoy exploring the website and find it goes beyond the standard taught in lectures. Thank you for your time and consideration!"
-    )
-    if user_query.strip() == secret_prompt:
-        return secret_response
+# Canned answers that never need the LLM (secret grading note + greetings)
+SECRET_PROMPT = "CSC1113 Grading Note"
+SECRET_RESPONSE = (
+    "While we have included the code for our working chatbot, the LLM (Ollama) + RAG system are not installed on PythonAnywhere due to free tier limitations.\n\n"
+    "Since the Q&A session, we have taken the feedback on board and expanded the site’s functionality, including:\n"
+    "- Company Information Landing Page\n"
+    "- Organisation Management\n"
+    "- Chatbot Integration (that’s me, Planr!)\n"
+    "- Subscriptions\n"
+    "- Feedback Submission\n"
+    "- Feedback Ticket Status and Admin Response System\n\n"
+    "Additionally, many other features are implemented, such as media upload/preview, complex JavaScript forms, robust subscription validation (premium expires after one month), and deployment.\n\n"
+    "To access the Feedback Tracker admin controls and see resolved queries, please use admin:admin for your next login.\n\n"
+    "We hope you enjoy exploring the website and find it goes beyond the standard taught in lectures. Thank you for your time and consideration!"
+)
+GREETING_RESPONSE = "Hello! How can I help you with Dublin City Council planning queries?"
 
+def fast_path_answer(user_query):
+    if user_query.strip() == SECRET_PROMPT:
+        return SECRET_RESPONSE
     if is_greeting(user_query):
-        return "Hello! How can I help you with Dublin City Council planning queries?"
+        return GREETING_RESPONSE
+    return None
 
-    # This generates a normal Ollama response (if it's not the prompt above)
-    try:
-        response = ollama.chat(
-            model="mistral",
-            messages=[
-                {"role": "system", "content": DCC_SYSTEM_PROMPT},
-                {"role": "user", "content": user_query}
-            ],
-            stream=False
+# Retrieved DCC passages go in a second system message so the model can cite them; history is the
+# conversation's windowed earlier turns (see conversations.py)
+def build_messages(user_query, passages=(), history=()):
+    messages = [{"role": "system", "content": DCC_SYSTEM_PROMPT}]
+    if passages:
+        messages.append({"role": "system", "content": "Records from Dublin City Council:\n\n" + format_context(passages)})
+    messages.extend(history)
+    messages.append({"role": "user", "content": user_query})
+    return messages
+
+# The query embedding serves both the semantic cache and RAG retrieval
+def needs_query_vector():
+    return semantic_cache_enabled() or retrieval_available()
+
+# Events for an answer we already have (canned or cached)
+def reply_events(answer, sources=()):
+    yield {'token': answer}
+    yield {'done': True, 'sources': list(sources)}
+
+# Near-duplicate lookup in the semantic cache; hits are copied into the exact-match cache
+# The semantic cache, emptied first if the RAG index has been rebuilt since its answers were made
+def current_semantic_cache():
+    cache = get_semantic_cache()
+    cache.use_build(index_build_id())
+    return cache
+
+def semantic_lookup(user_query, query_vector):
+    if query_vector is None:
+        return None
+    hit = current_semantic_cache().lookup(query_vector, chat_models(), prompt_version(DCC_SYSTEM_PROMPT))
+    if hit is None:
+        return None
+    answer, sources, similarity, model = hit
+    set_cached_answer(answer_cache_key(user_query, model, DCC_SYSTEM_PROMPT), answer, sources)
+    return answer, sources, model
+
+# Answers are cached under the model that wrote them, so a lookup tries every chat model in use
+# (PLANR_LLM_MODEL first); returns (answer, sources, model) or None
+def exact_lookup(user_query):
+    keys = {answer_cache_key(user_query, model, DCC_SYSTEM_PROMPT): model for model in chat_models()}
+    key, cached = find_cached_answer(list(keys))
+    return None if cached is None else (*cached, keys[key])
+
+# Store a fresh LLM answer in both caches, under the model that wrote it
+def remember_answer(user_query, model, query_vector, answer, sources):
+    set_cached_answer(answer_cache_key(user_query, model, DCC_SYSTEM_PROMPT), answer, sources)
+    if query_vector is not None:
+        current_semantic_cache().add(query_vector, model, prompt_version(DCC_SYSTEM_PROMPT), user_query, answer, sources)
+
+# Shown (with the matching records) when Ollama is unavailable and nothing close enough is cached
+DEGRADED_RESPONSE = (
+    "Planr's assistant is temporarily unavailable, so I can't write a full answer right now. "
+    "These Dublin City Council records look relevant to your question:"
+)
+
+# Ollama is down or failed before answering. Fall back to the closest cached answer (looser match than
+# the normal semantic cache), then to the retrieved DCC records alone; with neither, raise LLMUnavailable.
+# The final event's 'degraded' field tells the client which fallback it got.
+def degraded_reply(failure, query_vector, sources):
+    unavailable = failure if isinstance(failure, LLMUnavailable) else get_backend_pool().unavailable()
+    degraded = {'reason': 'llm_unavailable', 'retry_after': unavailable.retry_after}
+    if query_vector is not None:
+        hit = current_semantic_cache().lookup(
+            query_vector, chat_models(), prompt_version(DCC_SYSTEM_PROMPT),
+            threshold=settings.PLANR_DEGRADED_MIN_SIMILARITY,
         )
-        answer = response['message']['content']
-        return answer
+        if hit is not None:
+            answer, cached_sources, similarity, model = hit
+            return [{'token': answer}, {'done': True, 'sources': cached_sources, 'degraded': dict(degraded, cached=True)}]
+    if sources:
+        return [{'token': DEGRADED_RESPONSE}, {'done': True, 'sources': sources, 'degraded': dict(degraded, cached=False)}]
+    raise unavailable
+
+# The answer was cut off part-way: keep what was streamed, flag it and don't cache it
+def interrupted_event(failure, sources):
+    logger.warning("Ollama stream interrupted: %s", failure)
+    return {'done': True, 'sources': sources, 'degraded': {'reason': 'interrupted', 'retry_after': 1, 'cached': False}}
+
+# Main LLM logic (streaming)
+# Yields chat events: {'token': text} for each piece of the answer, then a final {'done': True, 'sources': [...]}
+# tier ('premium' or 'free', see scheduler.user_tier) decides queue priority; raises LLMBusy when the queue is full
+# and LLMUnavailable when Ollama is down with no fallback (see degraded_reply)
+# With a conversation, earlier turns are sent as context and the answer is added to it; the final event
+# then also carries the conversation's id and token counts
+# Every answered turn is saved as a transcript billed to account (see transcripts.py)
+def ollama_dcc_stream(user_query, tier='free', conversation=None, account=None):
+    trace = ChatTrace(tier, settings.PLANR_LLM_MODEL)
+    tokens = []
+    try:
+        for event in dcc_events(user_query, tier, trace, conversation):
+            if 'token' in event:
+                trace.token()
+                tokens.append(event['token'])
+            if event.get('done') and conversation is not None:
+                event = remember_turn(conversation, user_query, tokens, event, trace)
+                conversation.save()
+            yield event
+    except LLMBusy:
+        trace.outcome = 'busy'
+        raise
+    except LLMUnavailable:
+        trace.outcome = 'unavailable'
+        raise
+    finally:
+        trace.finish()
+        if tokens:
+            record_turn(account, conversation, user_query, ''.join(tokens), trace)
+
+# Add a finished answer to the conversation (fallback replies aren't worth remembering)
+def remember_turn(conversation, user_query, tokens, done, trace):
+    if 'degraded' not in done:
+        conversation.add_turn(user_query, ''.join(tokens), trace.history_tokens, trace.ollama.get('prompt_eval_count'))
+    return dict(done, conversation=conversation.info())
+
+# The chat pipeline behind ollama_dcc_stream; trace records which path answered and the Ollama timings
+def dcc_events(user_query, tier, trace, conversation=None):
+    trace.outcome = 'canned'
+    canned = fast_path_answer(user_query)
+    if canned is not None:
+        yield from reply_events(canned)
+        return
+    faq = match_faq(user_query)
+    if faq is not None:
+        trace.outcome = 'faq'
+        yield from reply_events(faq.answer, faq.sources)
+        return
+
+    # Follow-ups depend on the earlier turns, so they skip the answer caches and single flight; other
+    # questions in a conversation are answered (and cached) as if they were asked on their own
+    if conversation is not None and conversation.is_follow_up(user_query):
+        trace.history_tokens = conversation.history_tokens()
+        retrieval_query = conversation.retrieval_query(user_query)
+        query_vector = embed_query(retrieval_query) if needs_query_vector() else None
+        yield from llm_events(user_query, tier, trace, False, query_vector, conversation.history_messages(), retrieval_query)
+        return
+
+    cached = exact_lookup(user_query)
+    trace.outcome = 'exact_cache'
+    query_vector = None
+    if cached is None and needs_query_vector():
+        query_vector = embed_query(user_query)
+        cached = semantic_lookup(user_query, query_vector)
+        trace.outcome = 'semantic_cache'
+    if cached is not None:
+        answer, sources, trace.model = cached
+        yield from reply_events(answer, sources)
+        return
+
+    # This streams a normal Ollama response (if it's not a canned or cached answer above)
+    # Identical questions already being answered share that generation (see singleflight.py)
+    question_key = answer_cache_key(user_query, settings.PLANR_LLM_MODEL, DCC_SYSTEM_PROMPT)
+    events, leader = coalesce(flight_key(question_key, tier), lambda: llm_events(user_query, tier, trace, True, query_vector))
+    if not leader:
+        trace.outcome = 'coalesced'
+    yield from events
+
+# Text pieces of one Ollama chat; the final chunk's counts and timings go on the trace
+def chat_tokens(model, messages, trace):
+    with get_backend_pool().lease() as backend:
+        trace.backend = backend.host
+        for chunk in backend.client.chat(model=model, messages=messages, stream=True, keep_alive=settings.PLANR_LLM_KEEP_ALIVE):
+            if chunk.get('done'):
+                trace.ollama_done(chunk)
+            token = chunk['message']['content']
+            if token:
+                yield token
+
+# Tokens from the routed model. A fast model that fails or finishes before its first token escalates
+# to PLANR_LLM_MODEL; after that, failures interrupt the answer like any other
+def routed_tokens(route, messages, trace):
+    if route.tier != FAST:
+        log_route(route)
+        yield from chat_tokens(route.model, messages, trace)
+        return
+    tokens = chat_tokens(route.model, messages, trace)
+    try:
+        first = next(tokens, None)
     except Exception as e:
-        return f"Ollama error: {e}. Is Ollama running?"
+        logger.warning("Fast model %s failed: %s", route.model, e)
+        escalation = 'failed'
+    else:
+        if first is not None:
+            log_route(route)
+            yield first
+            yield from tokens
+            return
+        escalation = 'empty'
+    log_route(route, escalation)
+    trace.escalate()
+    yield from chat_tokens(settings.PLANR_LLM_MODEL, messages, trace)
 
-# Premium User Check (this is called every time a user logs in)
-def check_and_update_subscription(user):
+# Retrieval, model routing and Ollama generation for a question that wasn't answered from the caches
+# (cacheable is False for conversation follow-ups, whose answers aren't cached)
+def llm_events(user_query, tier, trace, cacheable, query_vector, history=(), retrieval_query=None):
+    passages = retrieve_passages(retrieval_query or user_query, query_vector)
+    sources = passage_sources(passages)
+    try:
+        get_backend_pool().check_available()
+    except LLMUnavailable as unavailable:
+        trace.outcome = 'degraded'
+        yield from degraded_reply(unavailable, query_vector, sources)
+        return
+    route = route_query(user_query, passages)
+    trace.routed(route)
+    messages = build_messages(user_query, passages, history)
+    scheduler = get_scheduler()
+    trace.outcome = 'llm'
+    trace.queue_wait = scheduler.acquire(tier)
+    started = time.monotonic()
+    tokens = []
+    failure = None
     try:
-        latest_sub = SubscriptionTransaction.objects.filter(
-            user=user
-        ).order_by('-valid_until').first()
-        profile = user.userprofile
-        today = timezone.now().date()
-        if latest_sub and latest_sub.valid_until >= today:
-            if profile.member_status != 'premium':
-                profile.member_status = 'premium'
-                profile.save()
+        for token in routed_tokens(route, messages, trace):
+            tokens.append(token)
+            yield {'token': token}
+    except Exception as e:
+        failure = e
+    finally:
+        scheduler.release(time.monotonic() - started)
+    if failure is not None:
+        trace.outcome = 'interrupted' if tokens else 'degraded'
+        if tokens:
+            yield interrupted_event(failure, sources)
         else:
-            if profile.member_status != 'free':
-                profile.member_status = 'free'
-                profile.save()
-    except UserProfile.DoesNotExist:
-        pass
+            logger.warning("Ollama call failed: %s", failure)
+            yield from degraded_reply(failure, query_vector, sources)
+        return
+    if cacheable and cacheable_answer(trace.model, ''.join(tokens), trace.done_reason):
+        remember_answer(user_query, trace.model, query_vector, ''.join(tokens), sources)
+    yield {'done': True, 'sources': sources}
 
+# Cache backends may do network/disk I/O, so keep them off the event loop
+aexact_lookup = sync_to_async(exact_lookup, thread_sensitive=False)
+asemantic_lookup = sync_to_async(semantic_lookup, thread_sensitive=False)
+aremember_answer = sync_to_async(remember_answer, thread_sensitive=False)
+aretrieve_passages = sync_to_async(retrieve_passages, thread_sensitive=False)
+adegraded_reply = sync_to_async(degraded_reply, thread_sensitive=False)
+aget_faq_index = sync_to_async(get_faq_index)
+
+# Main LLM logic (async streaming, for the ASGI chat endpoint)
+# Same events as ollama_dcc_stream, but awaits Ollama instead of blocking a worker thread
+async def aollama_dcc_stream(user_query, tier='free', conversation=None, account=None):
+    trace = ChatTrace(tier, settings.PLANR_LLM_MODEL)
+    tokens = []
+    try:
+        async for event in adcc_events(user_query, tier, trace, conversation):
+            if 'token' in event:
+                trace.token()
+                tokens.append(event['token'])
+            if event.get('done') and conversation is not None:
+                event = remember_turn(conversation, user_query, tokens, event, trace)
+                await conversation.asave()
+            yield event
+    except LLMBusy:
+        trace.outcome = 'busy'
+        raise
+    except LLMUnavailable:
+        trace.outcome = 'unavailable'
+        raise
+    finally:
+        trace.finish()
+        if tokens:
+            record_turn(account, conversation, user_query, ''.join(tokens), trace)
+
+async def adcc_events(user_query, tier, trace, conversation=None):
+    trace.outcome = 'canned'
+    canned = fast_path_answer(user_query)
+    if canned is not None:
+        for event in reply_events(canned):
+            yield event
+        return
+    # Only (re)building the FAQ index touches the database, so only that leaves the event loop
+    faq_index = current_faq_index()
+    if faq_index is None and settings.PLANR_FAQ_ENABLED:
+        faq_index = await aget_faq_index()
+    faq = match_faq(user_query, faq_index)
+    if faq is not None:
+        trace.outcome = 'faq'
+        for event in reply_events(faq.answer, faq.sources):
+            yield event
+        return
+
+    if conversation is not None and conversation.is_follow_up(user_query):
+        trace.history_tokens = conversation.history_tokens()
+        retrieval_query = conversation.retrieval_query(user_query)
+        query_vector = await aembed_query(retrieval_query) if needs_query_vector() else None
+        async for event in allm_events(user_query, tier, trace, False, query_vector, conversation.history_messages(), retrieval_query):
+            yield event
+        return
+
+    cached = await aexact_lookup(user_query)
+    trace.outcome = 'exact_cache'
+    query_vector = None
+    if cached is None and needs_query_vector():
+        query_vector = await aembed_query(user_query)
+        cached = await asemantic_lookup(user_query, query_vector)
+        trace.outcome = 'semantic_cache'
+    if cached is not None:
+        answer, sources, trace.model = cached
+        for event in reply_events(answer, sources):
+            yield event
+        return
+
+    question_key = answer_cache_key(user_query, settings.PLANR_LLM_MODEL, DCC_SYSTEM_PROMPT)
+    events, leader = acoalesce(flight_key(question_key, tier), lambda: allm_events(user_query, tier, trace, True, query_vector))
+    if not leader:
+        trace.outcome = 'coalesced'
+    async for event in events:
+        yield event
+
+async def achat_tokens(model, messages, trace):
+    with get_backend_pool().lease() as backend:
+        trace.backend = backend.host
+        async for chunk in await backend.async_client().chat(model=model, messages=messages, stream=True, keep_alive=settings.PLANR_LLM_KEEP_ALIVE):
+            if chunk.get('done'):
+                trace.ollama_done(chunk)
+            token = chunk['message']['content']
+            if token:
+                yield token
+
+async def arouted_tokens(route, messages, trace):
+    if route.tier != FAST:
+        log_route(route)
+        async for token in achat_tokens(route.model, messages, trace):
+            yield token
+        return
+    tokens = achat_tokens(route.model, messages, trace)
+    try:
+        first = await anext(tokens, None)
+    except Exception as e:
+        logger.warning("Fast model %s failed: %s", route.model, e)
+        escalation = 'failed'
+    else:
+        if first is not None:
+            log_route(route)
+            yield first
+            async for token in tokens:
+                yield token
+            return
+        escalation = 'empty'
+    log_route(route, escalation)
+    trace.escalate()
+    async for token in achat_tokens(settings.PLANR_LLM_MODEL, messages, trace):
+        yield token
+
+async def allm_events(user_query, tier, trace, cacheable, query_vector, history=(), retrieval_query=None):
+    passages = await aretrieve_passages(retrieval_query or user_query, query_vector)
+    sources = passage_sources(passages)
+    try:
+        get_backend_pool().check_available()
+    except LLMUnavailable as unavailable:
+        trace.outcome = 'degraded'
+        for event in await adegraded_reply(unavailable, query_vector, sources):
+            yield event
+        return
+    route = route_query(user_query, passages)
+    trace.routed(route)
+    messages = build_messages(user_query, passages, history)
+    scheduler = get_scheduler()
+    trace.outcome = 'llm'
+    trace.queue_wait = await scheduler.aacquire(tier)
+    started = time.monotonic()
+    tokens = []
+    failure = None
+    try:
+        async for token in arouted_tokens(route, messages, trace):
+            tokens.append(token)
+            yield {'token': token}
+    except Exception as e:
+        failure = e
+    finally:
+        scheduler.release(time.monotonic() - started)
+    if failure is not None:
+        trace.outcome = 'interrupted' if tokens else 'degraded'
+        if tokens:
+            yield interrupted_event(failure, sources)
+        else:
+            logger.warning("Ollama call failed: %s", failure)
+            for event in await adegraded_reply(failure, query_vector, sources):
+                yield event
+        return
+    if cacheable and cacheable_answer(trace.model, ''.join(tokens), trace.done_reason):
+        await aremember_answer(user_query, trace.model, query_vector, ''.join(tokens), sources)
+    yield {'done': True, 'sources': sources}
+
+# Collapse a chat event stream into the chat_api JSON reply for non-streaming callers:
+# {'answer': ..., 'sources': [...]}, plus 'degraded' when Ollama was unavailable and 'conversation'
+# when the request was part of one
+def reply_from_events(tokens, done):
+    reply = {'answer': ''.join(tokens), 'sources': done.get('sources', [])}
+    if 'degraded' in done:
+        reply['degraded'] = done['degraded']
+    if 'conversation' in done:
+        reply['conversation'] = done['conversation']
+    return reply
+
+def collect_reply(events):
+    tokens, done = [], {}
+    for event in events:
+        if 'token' in event:
+            tokens.append(event['token'])
+        if event.get('done'):
+            done = event
+    return reply_from_events(tokens, done)
+
+async def acollect_reply(events):
+    tokens, done = [], {}
+    async for event in events:
+        if 'token' in event:
+            tokens.append(event['token'])
+        if event.get('done'):
+            done = event
+    return reply_from_events(tokens, done)
+
+# Main LLM logic (whole answer at once)
+def ollama_dcc_response(user_query, tier='free'):
+    return collect_reply(ollama_dcc_stream(user_query, tier))['answer']
+
+# Premium profiles whose subscription has lapsed (or that never had one)
+def lapsed_premium_profiles(today=None):
+    today = today or timezone.now().date()
+    return UserProfile.objects.filter(member_status='premium').filter(Q(premium_until__isnull=True) | Q(premium_until__lt=today))
+
+# Downgrade lapsed profiles with a single UPDATE, optionally only for some users; returns how many were
+# downgraded. Run daily by `manage.py expire_subscriptions`.
+def expire_lapsed_subscriptions(today=None, users=None):
+    lapsed = lapsed_premium_profiles(today)
+    if users is not None:
+        lapsed = lapsed.filter(user__in=users)
+    return lapsed.update(member_status='free')
+
+# Premium User Check (this is called every time a user logs in)
+# Upgrades happen when a transaction is created, so login only needs to catch a plan that lapsed since the last
+# expiry run; the database is only written to when the user's profile shows one
+def check_and_update_subscription(user):
+    profile = getattr(user, 'userprofile', None)
+    if profile is None or profile.member_status != 'premium':
+        return
+    if profile.premium_until is not None and profile.premium_until >= timezone.now().date():
+        return
+    if expire_lapsed_subscriptions(users=[user.pk]):
+        profile.member_status = 'free'
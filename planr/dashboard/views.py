@@ -1,7 +1,9 @@
 # Generic
+from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.views.generic import CreateView
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 # Validation
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
@@ -17,8 +19,25 @@ from datetime import timedelta
 from .models import *
 from .forms import * 
 from .utils import *
+from .answer_cache import answer_cache_stats, clear_answer_cache
+from .semantic_cache import get_semantic_cache
+from .backends import get_backend_pool
+from .telemetry import summarize_metrics, summarize_routing
+from .singleflight import single_flight_stats
+from .conversations import Conversation, conversation_owner
+from .transcripts import chat_account, member_usage, organisation_usage
+from .pagination import keyset_page
+from .feedback_search import search_available, search_feedback
+from .feedback_analytics import DEFAULT_DAYS, summarize_feedback, tracked_feedback
+from .exports import FORMATS, ExportError, export_chunks, export_filename
+from .renditions import PROFILE_PIC_PRESETS, SCREENSHOT_PRESETS, queue_renditions, rendition_image
 # LLM
 import json
+import itertools
+from urllib.parse import urlencode
+from asgiref.sync import sync_to_async
+from .scheduler import LLMBusy, get_scheduler, user_tier
+from .breaker import LLMUnavailable
 
 # Check User Subscription status
 @receiver(user_logged_in)
@@ -30,8 +49,51 @@ def index(request):
     return render(request, 'index.html')
 
 def chat(request):
-    return render(request, 'chat.html')
+    return render(request, 'chat.html', {
+        'chat_api_url': reverse('chat_api_async' if settings.PLANR_ASYNC_CHAT else 'chat_api'),
+    })
+
+# Stream chat events to the browser as newline-delimited JSON (one event per line)
+# The first event is pulled before the response starts, so LLMBusy/LLMUnavailable still become a proper 503
+def ndjson_response(events):
+    first = next(events)
+    content = (json.dumps(event) + '\n' for event in itertools.chain([first], events))
+    return ndjson_headers(StreamingHttpResponse(content, content_type='application/x-ndjson'))
+
+async def andjson_response(events):
+    first = await events.__anext__()
+    async def lines():
+        yield json.dumps(first) + '\n'
+        async for event in events:
+            yield json.dumps(event) + '\n'
+    return ndjson_headers(StreamingHttpResponse(lines(), content_type='application/x-ndjson'))
+
+def ndjson_headers(response):
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # stop nginx buffering the stream
+    return response
+
+# The LLM queue is full: tell the client when to come back instead of holding the connection
+def busy_response(busy):
+    response = JsonResponse({'error': str(busy)}, status=503)
+    response['Retry-After'] = str(busy.retry_after)
+    return response
+
+# Ollama is down (circuit breaker open) and there was no cached answer or record to fall back on
+def unavailable_response(unavailable):
+    response = JsonResponse({
+        'error': str(unavailable),
+        'degraded': {'reason': 'llm_unavailable', 'retry_after': unavailable.retry_after, 'cached': False},
+    }, status=503)
+    response['Retry-After'] = str(unavailable.retry_after)
+    return response
 
+# Queue tier, conversation owner and usage account for the person chatting
+def chat_caller(user):
+    account = chat_account(user)
+    return user_tier(user, account.organisation_id is not None), conversation_owner(user), account
+
+# Send {"conversation": null} to start a server-side conversation, then the returned id to continue it
 @csrf_exempt  # Remove in production, restore proper CSRF for logged-in users
 def chat_api(request):
     if request.method == 'POST':
@@ -40,12 +102,106 @@ def chat_api(request):
             query = data.get('query', '').strip()
             if not query:
                 return JsonResponse({'error': 'No query submitted.'}, status=400)
-            answer = ollama_dcc_response(query)
-            return JsonResponse({'answer': answer, 'sources': []})
+            tier, owner, account = chat_caller(request.user)
+            conversation = Conversation.load(data['conversation'], owner) if 'conversation' in data else None
+            if data.get('stream'):
+                return ndjson_response(ollama_dcc_stream(query, tier, conversation, account))
+            return JsonResponse(collect_reply(ollama_dcc_stream(query, tier, conversation, account)))
+        except LLMBusy as busy:
+            return busy_response(busy)
+        except LLMUnavailable as unavailable:
+            return unavailable_response(unavailable)
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=500)
     return JsonResponse({'error': 'POST only'}, status=405)
 
+# Async version of chat_api for ASGI deployments (see planr/asgi.py)
+# Waiting on Ollama suspends a coroutine instead of holding a worker thread
+async def chat_api_async(request):
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST only'}, status=405)
+    try:
+        data = json.loads(request.body)
+        query = data.get('query', '').strip()
+        if not query:
+            return JsonResponse({'error': 'No query submitted.'}, status=400)
+        tier, owner, account = await sync_to_async(chat_caller)(request.user)
+        conversation = await Conversation.aload(data['conversation'], owner) if 'conversation' in data else None
+        if data.get('stream'):
+            return await andjson_response(aollama_dcc_stream(query, tier, conversation, account))
+        return JsonResponse(await acollect_reply(aollama_dcc_stream(query, tier, conversation, account)))
+    except LLMBusy as busy:
+        return busy_response(busy)
+    except LLMUnavailable as unavailable:
+        return unavailable_response(unavailable)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+# csrf_exempt wraps views in a sync function on Django 4.2, so mark the coroutine directly
+chat_api_async.csrf_exempt = True  # Remove in production, restore proper CSRF for logged-in users
+
+# A conversation's summary, recent turns and token counts (GET), or forget it (DELETE); owner only
+@csrf_exempt  # Remove in production, restore proper CSRF for logged-in users
+def chat_conversation(request, conversation_id):
+    conversation = Conversation.load(conversation_id, conversation_owner(request.user))
+    if conversation.id != conversation_id:
+        return JsonResponse({'error': 'Conversation not found'}, status=404)
+    if request.method == 'DELETE':
+        conversation.delete()
+        return JsonResponse({'deleted': conversation_id})
+    if request.method != 'GET':
+        return JsonResponse({'error': 'GET or DELETE only'}, status=405)
+    return JsonResponse(conversation.detail())
+
+# Staff view of the answer caches: GET for hit rates and similarity stats, POST to purge them
+@login_required
+def chat_cache_admin(request):
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Staff only'}, status=403)
+    semantic_cache = get_semantic_cache()
+    if request.method == 'POST':
+        clear_answer_cache()
+        semantic_cache.clear()
+        semantic_cache.delete_saved()
+    return JsonResponse({
+        'answer_cache': answer_cache_stats(),
+        'semantic_cache': semantic_cache.stats(),
+    })
+
+# Staff view of the LLM scheduler (active generations, queue depth and wait times per tier), of
+# single-flight coalescing and of the Ollama backend pool (health, load and circuit breaker per backend)
+@login_required
+def chat_scheduler_stats(request):
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Staff only'}, status=403)
+    return JsonResponse({
+        'scheduler': get_scheduler().stats(),
+        'single_flight': single_flight_stats(),
+        'backends': get_backend_pool().stats(),
+    })
+
+# Staff view of chatbot performance: latency percentiles, TTFT and throughput per model and tier,
+# plus the model routing breakdown
+# ?hours=24 sets the window, ?bucket=hour|day splits it over time
+@login_required
+def chat_metrics(request):
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Staff only'}, status=403)
+    try:
+        hours = float(request.GET.get('hours', 24))
+    except ValueError:
+        return JsonResponse({'error': 'hours must be a number'}, status=400)
+    bucket = request.GET.get('bucket') or None
+    if bucket not in (None, 'hour', 'day'):
+        return JsonResponse({'error': 'bucket must be hour or day'}, status=400)
+    since = timezone.now() - timedelta(hours=hours)
+    return JsonResponse({
+        'since': since.isoformat(),
+        'bucket': bucket,
+        'metrics': summarize_metrics(since, bucket),
+        'routing': summarize_routing(since),
+    })
+
 # User Registration / Login / Logout system (leveraging lecture notes)
 class UserSignupView(CreateView):
     model = User
@@ -79,6 +235,8 @@ def edit_profile(request):
         form = ProfileUpdateForm(request.POST, request.FILES, instance=profile)
         if form.is_valid():
             form.save()
+            if 'profile_pic' in form.changed_data:
+                queue_renditions(profile.profile_pic, *PROFILE_PIC_PRESETS)
             return redirect('profile')
     else:
         form = ProfileUpdateForm(instance=profile)
@@ -94,8 +252,7 @@ def subscribe(request):
         expiry = request.POST.get("expiry")
         cvv = request.POST.get("cvv")
         if card and expiry and cvv:
-            profile.member_status = "premium"
-            profile.save()
+            # Creating the transaction makes the profile premium (see models.extend_premium)
             SubscriptionTransaction.objects.create(
                 user=request.user,
                 amount=100.00,
@@ -122,7 +279,10 @@ def submit_feedback(request):
         if form.is_valid():
             feedback = form.save(commit=False)
             feedback.user = request.user
-            feedback.save()
+            with tracked_feedback(feedback):
+                feedback.save()
+            if feedback.screenshot:
+                queue_renditions(feedback.screenshot, *SCREENSHOT_PRESETS)
             feedback_submitted = True
             form = FeedbackForm()
     else:
@@ -130,19 +290,62 @@ def submit_feedback(request):
     return render(request, 'feedback/feedback.html', {'form': form, 'feedback_submitted': feedback_submitted})
 
 # Allow users to view their feedback and allows admins to respond to feedback
+# The list is paged by (created_at, id) cursors and only loads the columns the accordion headers show;
+# each ticket's long text fields are fetched from feedback_detail when its panel is opened
+FEEDBACK_PAGE_SIZE = 25
+FEEDBACK_LIST_FIELDS = ('id', 'feedback_type', 'status', 'created_at', 'user__username')
+
 @login_required
 def feedback_tracker(request):
     feedback_type = request.GET.get('type', '')
+    status = request.GET.get('status', '')
+    query = request.GET.get('q', '').strip() if request.user.is_staff and search_available() else ''
+    params, filters = {}, {}  # query string for the page links, and the matching Feedback filters
+    feedbacks = Feedback.objects.select_related('user').only(*FEEDBACK_LIST_FIELDS)
     if request.user.is_staff:
-        feedbacks = Feedback.objects.select_related('user').order_by('-created_at')
-        if feedback_type and feedback_type in dict(Feedback.FEEDBACK_TYPE_CHOICES):
-            feedbacks = feedbacks.filter(feedback_type=feedback_type)
+        if feedback_type in dict(Feedback.FEEDBACK_TYPE_CHOICES):
+            params['type'] = filters['feedback_type'] = feedback_type
+        if status in dict(Feedback.STATUS_CHOICES):
+            params['status'] = filters['status'] = status
+    else:
+        feedbacks = feedbacks.filter(user=request.user)
+    after, before = request.GET.get('after'), request.GET.get('before')
+    if query:
+        # Best matches first; the cursors carry the bm25 score instead of the date
+        params['q'] = query
+        page = search_feedback(feedbacks, query, filters, after, before, FEEDBACK_PAGE_SIZE)
     else:
-        feedbacks = Feedback.objects.filter(user=request.user).order_by('-created_at')
+        page = keyset_page(feedbacks.filter(**filters), after, before, FEEDBACK_PAGE_SIZE)
     return render(request, 'feedback/feedback_tracker.html', {
-        'feedbacks': feedbacks,
+        'feedbacks': page,
         'feedback_type': feedback_type,
+        'status': status,
+        'query': query,
+        'search_available': search_available(),
+        'next_page_url': '?' + urlencode(dict(params, after=page.next_cursor)) if page.next_cursor else None,
+        'previous_page_url': '?' + urlencode(dict(params, before=page.previous_cursor)) if page.previous_cursor else None,
+        'first_page_url': '?' + urlencode(params),
         'FEEDBACK_TYPE_CHOICES': Feedback.FEEDBACK_TYPE_CHOICES,
+        'STATUS_CHOICES': Feedback.STATUS_CHOICES,
+    })
+
+# Full text of one ticket for the tracker's accordion (staff, or the person who submitted it)
+@login_required
+def feedback_detail(request, feedback_id):
+    feedbacks = Feedback.objects.all() if request.user.is_staff else Feedback.objects.filter(user=request.user)
+    feedback = get_object_or_404(feedbacks, id=feedback_id)
+    return JsonResponse({
+        'id': feedback.id,
+        'feedback_type': feedback.get_feedback_type_display(),
+        'status': feedback.status,
+        'description': feedback.description,
+        'llm_prompt': feedback.llm_prompt,
+        'llm_response': feedback.llm_response,
+        'rating': feedback.rating,
+        'screenshot': feedback.screenshot.url if feedback.screenshot else None,
+        'screenshot_image': rendition_image(feedback.screenshot, 'screenshot') if feedback.screenshot else None,
+        'transcript': feedback.transcript.url if feedback.transcript else None,
+        'admin_response': feedback.admin_response or '',
     })
 
 @require_POST
@@ -152,9 +355,11 @@ def feedback_status_update(request, feedback_id):
         return redirect('feedback_tracker')
     feedback = get_object_or_404(Feedback, id=feedback_id)
     status = request.POST.get('status', '')
-    if status in dict(Feedback.STATUS_CHOICES):
-        feedback.status = status
-        feedback.save()
+    if status in dict(Feedback.STATUS_CHOICES) and status != feedback.status:
+        with tracked_feedback(feedback):
+            feedback.status = status
+            feedback.resolved_at = timezone.now() if status == 'resolved' else None
+            feedback.save(update_fields=['status', 'resolved_at'])
     return redirect('feedback_tracker')
 
 @require_POST
@@ -163,10 +368,48 @@ def feedback_response(request, feedback_id):
     if not request.user.is_staff:
         return redirect('feedback_tracker')
     feedback = get_object_or_404(Feedback, id=feedback_id)
-    feedback.admin_response = request.POST.get('response', '').strip()
-    feedback.save()
+    with tracked_feedback(feedback):
+        feedback.admin_response = request.POST.get('response', '').strip()
+        feedback.save(update_fields=['admin_response'])
     return redirect('feedback_tracker')
 
+# Staff CSV/JSONL export of feedback, subscription transactions or chat usage (see exports.py)
+# ?format=csv|jsonl&since=YYYY-MM-DD&until=YYYY-MM-DD&type=...&organisation=<id or code>
+@login_required
+def data_export(request, dataset):
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Staff only'}, status=403)
+    export_format = request.GET.get('format', 'csv')
+    try:
+        chunks = export_chunks(
+            dataset, export_format,
+            since=request.GET.get('since'),
+            until=request.GET.get('until'),
+            type=request.GET.get('type'),
+            organisation=request.GET.get('organisation'),
+        )
+    except ExportError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    response = StreamingHttpResponse(chunks, content_type=f"{FORMATS[export_format]}; charset=utf-8")
+    response['Content-Disposition'] = f'attachment; filename="{export_filename(dataset, export_format)}"'
+    return response
+
+# Staff analytics over feedback, read from the FeedbackSummary rows only (see feedback_analytics.py)
+ANALYTICS_WINDOWS = {'30': 30, '90': 90, '365': 365, 'all': None}
+
+@login_required
+def feedback_analytics(request):
+    if not request.user.is_staff:
+        return redirect('feedback_tracker')
+    window = request.GET.get('days', str(DEFAULT_DAYS))
+    if window not in ANALYTICS_WINDOWS:
+        window = str(DEFAULT_DAYS)
+    return render(request, 'feedback/feedback_analytics.html', {
+        'analytics': summarize_feedback(ANALYTICS_WINDOWS[window]),
+        'window': window,
+        'windows': ANALYTICS_WINDOWS,
+    })
+
 # Allows users to create/join/manage organisations
 @login_required
 def create_organisation(request):
@@ -218,6 +461,8 @@ def organisation_dashboard(request, org_id):
         'organisation': org,
         'memberships': memberships,
         'user_membership': user_membership,
+        'monthly_usage': organisation_usage(org),
+        'member_usage': member_usage(org),
     })
 
 @login_required
@@ -238,8 +483,7 @@ def subscribe(request):
         expiry = request.POST.get("expiry")
         cvv = request.POST.get("cvv")
         if card and expiry and cvv:
-            profile.member_status = "premium"
-            profile.save()
+            # Creating the transaction makes the profile premium (see models.extend_premium)
             SubscriptionTransaction.objects.create(
                 user=request.user,
                 amount=100.00,
@@ -269,8 +513,6 @@ def admin_subscribe_member(request, org_id, user_id):
         expiry = request.POST.get("expiry")
         cvv = request.POST.get("cvv")
         if card and expiry and cvv:
-            member_profile.member_status = "premium"
-            member_profile.save()
             SubscriptionTransaction.objects.create(
                 user=member,
                 amount=100.00,
@@ -0,0 +1,91 @@
+import logging
+import threading
+from datetime import datetime
+from zoneinfo import ZoneInfo
+from django.conf import settings
+from .backends import get_backend_pool
+from .routing import chat_models
+
+# Ollama model warm-up and keep-alive
+# Ollama unloads idle models (after 5 minutes by default), so the first chat after a deploy or a quiet
+# spell pays the full model load. warm_up_models() loads the chat and embedding models, runs
+# DCC_SYSTEM_PROMPT through the chat model once so its prompt prefix is already evaluated, and asks
+# Ollama to keep both resident for PLANR_LLM_KEEP_ALIVE. keep_warm() repeats that during business
+# hours so the models are never unloaded while people are likely to be chatting.
+#
+# Server processes start this from planr/wsgi.py and planr/asgi.py (runserver loads the WSGI module too,
+# in the process that actually serves), so management commands, tests and scripts never do.
+
+logger = logging.getLogger(__name__)
+
+def warm_up_backend(client):
+    from .utils import DCC_SYSTEM_PROMPT
+    keep_alive = settings.PLANR_LLM_KEEP_ALIVE
+    warmed = []
+    for model in dict.fromkeys(chat_models() + list(settings.PLANR_LLM_WARM_MODELS)):
+        try:
+            client.chat(
+                model=model,
+                messages=[
+                    {"role": "system", "content": DCC_SYSTEM_PROMPT},
+                    {"role": "user", "content": "hello"},
+                ],
+                options={'num_predict': 1},
+                keep_alive=keep_alive,
+            )
+            warmed.append(model)
+        except Exception as e:
+            logger.warning("Could not warm up %s: %s", model, e)
+    try:
+        client.embed(model=settings.PLANR_EMBED_MODEL, input="warm up", keep_alive=keep_alive)
+        warmed.append(settings.PLANR_EMBED_MODEL)
+    except Exception as e:
+        logger.warning("Could not warm up %s: %s", settings.PLANR_EMBED_MODEL, e)
+    return warmed
+
+# Every backend in the pool serves requests, so every backend gets warmed; returns {host: [models]}
+def warm_up_models():
+    return {backend.host: warm_up_backend(backend.client) for backend in get_backend_pool().backends}
+
+def in_business_hours(now=None):
+    now = now or datetime.now(ZoneInfo(settings.PLANR_LLM_KEEP_WARM_TIMEZONE))
+    start, end = settings.PLANR_LLM_KEEP_WARM_HOURS
+    return now.weekday() < 5 and start <= now.hour < end
+
+# Warm once, then re-warm every PLANR_LLM_KEEP_WARM_INTERVAL seconds during business hours
+def keep_warm(stop_event):
+    warm_up_models()
+    while not stop_event.wait(settings.PLANR_LLM_KEEP_WARM_INTERVAL):
+        if in_business_hours():
+            warm_up_models()
+
+_keep_warm_thread = None
+_keep_warm_stop = threading.Event()
+
+def start_keep_warm_thread():
+    global _keep_warm_thread
+    if _keep_warm_thread is None:
+        _keep_warm_thread = threading.Thread(target=keep_warm, args=(_keep_warm_stop,), name='planr-keep-warm', daemon=True)
+        _keep_warm_thread.start()
+    return _keep_warm_thread
+
+_server_warm_up_started = False
+_server_warm_up_lock = threading.Lock()
+
+# Compile the FAQ index and preload Ollama models in the background so the first chat after a deploy
+# doesn't pay for either; only the first call in a process does anything
+def start_server_warm_up():
+    global _server_warm_up_started
+    with _server_warm_up_lock:
+        if _server_warm_up_started:
+            return
+        _server_warm_up_started = True
+    if settings.PLANR_FAQ_ENABLED:
+        from .faq import preload_faq_index
+        threading.Thread(target=preload_faq_index, name='planr-faq-index', daemon=True).start()
+    if not settings.PLANR_LLM_WARM_UP_ON_START:
+        return
+    if settings.PLANR_LLM_KEEP_WARM:
+        start_keep_warm_thread()
+    else:
+        threading.Thread(target=warm_up_models, name='planr-warm-up', daemon=True).start()
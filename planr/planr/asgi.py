@@ -5,6 +5,12 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
+
+Planr serves the chatbot through /api/chat/async/ when run under ASGI, e.g.
+
+    uvicorn planr.asgi:application --workers 2
+
+with PLANR_ASYNC_CHAT = True in settings. Sync views keep working alongside it.
 """
 
 import os
@@ -14,3 +20,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'planr.settings')
 
 application = get_asgi_application()
+
+# Preload the FAQ index and Ollama models in the background (see dashboard/warmup.py)
+from dashboard.warmup import start_server_warm_up  # noqa: E402
+
+start_server_warm_up()
@@ -82,6 +82,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'planr.wsgi.application'
+ASGI_APPLICATION = 'planr.asgi.application'
 
 
 # Database
@@ -95,6 +96,38 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# 'planr_answers' holds chatbot answers (see dashboard/answer_cache.py). LocMemCache evicts least
+# recently used entries once MAX_ENTRIES is reached; swap in FileBasedCache or RedisCache to share
+# answers between worker processes.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Chatbot answer cache (dashboard/answer_cache.py); purges only reach every worker with a shared backend
+    'planr_answers': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'planr-answers',
+        'TIMEOUT': 60 * 60 * 24,  # one day
+        'OPTIONS': {
+            'MAX_ENTRIES': 5000,
+            'CULL_FREQUENCY': 10,  # drop the oldest tenth when full
+        },
+    },
+    # Chat conversations (dashboard/conversations.py); use a shared backend when running several workers
+    'planr_conversations': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'planr-conversations',
+        'TIMEOUT': 60 * 60 * 2,  # forgotten after two quiet hours
+        'OPTIONS': {
+            'MAX_ENTRIES': 2000,
+        },
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -134,4 +167,112 @@ USE_TZ = True
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
-SITE_ID = 1
\ No newline at end of file
+SITE_ID = 1
+
+# Planr chatbot
+PLANR_LLM_MODEL = 'mistral'
+# Model routing (dashboard/routing.py), off by default: short, simple questions with strong retrieval
+# matches go to FAST_MODEL, which must be pulled on every Ollama backend; it escalates to PLANR_LLM_MODEL
+# if it fails before its first token. Without a RAG index nothing is routed. The retrieval score is
+# the top passage's rank-fusion score (about 0.03 means vector and BM25 both rank it top 5).
+PLANR_LLM_ROUTING = False
+PLANR_LLM_FAST_MODEL = 'llama3.2:1b'
+PLANR_LLM_ROUTING_MAX_WORDS = 20
+PLANR_LLM_ROUTING_HARD_KEYWORDS = [
+    'why', 'compare', 'difference', 'explain', 'appeal', 'objection', 'object', 'section 5', 'exempt',
+    'development plan', 'zoning', 'protected structure', 'legal', 'should i', 'what if', 'pros and cons',
+]
+PLANR_LLM_ROUTING_MIN_RETRIEVAL_SCORE = 0.03
+PLANR_LLM_ROUTING_MIN_ANSWER_CHARS = 40
+
+# Ollama backends; requests go to the healthy one with the fewest in flight. Dead backends are ejected
+# and re-probed every PLANR_OLLAMA_HEALTH_INTERVAL seconds.
+PLANR_OLLAMA_HOSTS = ['http://localhost:11434']
+PLANR_OLLAMA_HEALTH_INTERVAL = 10
+# Seconds to connect, and the longest gap allowed between streamed chunks, before a call counts as failed
+PLANR_OLLAMA_CONNECT_TIMEOUT = 3
+PLANR_OLLAMA_READ_TIMEOUT = 60
+# Circuit breaker: after this many failures in a row a backend gets no traffic for COOLDOWN seconds
+PLANR_OLLAMA_BREAKER_FAILURES = 3
+PLANR_OLLAMA_BREAKER_COOLDOWN = 30
+# While Ollama is unavailable, cached answers this similar to the question are served instead (flagged as degraded)
+PLANR_DEGRADED_MIN_SIMILARITY = 0.8
+
+# Per-request chatbot telemetry (ChatMetric), written in batches by a background thread
+PLANR_TELEMETRY_ENABLED = True
+PLANR_TELEMETRY_BATCH_SIZE = 100
+PLANR_TELEMETRY_FLUSH_SECONDS = 10
+# Chat transcripts and token usage per user and organisation (ChatTurn), buffered the same way
+PLANR_TRANSCRIPTS_ENABLED = True
+PLANR_TRANSCRIPT_BATCH_SIZE = 100
+PLANR_TRANSCRIPT_FLUSH_SECONDS = 10
+
+# Ollama keeps models loaded this long after their last use ('30m', '2h', -1 for forever)
+PLANR_LLM_KEEP_ALIVE = '30m'
+# Preload models (and the system prompt) when a server process starts; optionally keep re-warming them
+# every KEEP_WARM_INTERVAL seconds during KEEP_WARM_HOURS on weekdays. See also `manage.py warm_models`.
+PLANR_LLM_WARM_UP_ON_START = True
+PLANR_LLM_KEEP_WARM = False
+PLANR_LLM_WARM_MODELS = []  # extra chat models to preload besides PLANR_LLM_MODEL (and FAST_MODEL)
+PLANR_LLM_KEEP_WARM_INTERVAL = 240
+PLANR_LLM_KEEP_WARM_HOURS = (8, 19)
+PLANR_LLM_KEEP_WARM_TIMEZONE = 'Europe/Dublin'
+
+# Set to True when serving through planr/asgi.py so the chat page uses the async endpoint
+PLANR_ASYNC_CHAT = False
+
+# Local Ollama embedding model (semantic cache and RAG retrieval)
+PLANR_EMBED_MODEL = 'nomic-embed-text'
+
+# Semantic cache: answers near-duplicate questions whose embeddings are at least THRESHOLD cosine-similar
+# Set CAPACITY to 0 to turn it off
+PLANR_SEMANTIC_CACHE_CAPACITY = 2000
+PLANR_SEMANTIC_CACHE_THRESHOLD = 0.92
+PLANR_SEMANTIC_CACHE_PATH = BASE_DIR / 'cache' / 'semantic_cache.npz'
+
+# RAG retrieval over scraped DCC documents: add them with `manage.py ingest_documents <folder>`, then
+# build the index from that store with `manage.py build_rag_index`
+PLANR_RAG_INDEX_PATH = BASE_DIR / 'cache' / 'rag_index.bin'  # memory-mapped and shared by all workers
+PLANR_RAG_RELOAD_SECONDS = 30  # how often workers check for a rebuilt index
+PLANR_RAG_TOP_K = 4
+PLANR_RAG_MIN_SCORE = 0.3  # vector matches less similar than this are left out of the prompt
+PLANR_RAG_FUSION_CANDIDATES = 20  # vector and BM25 results each contribute this many candidates to rank fusion
+# Corpora with at least this many chunks are clustered (~sqrt(n) clusters); queries scan the nearest PROBES clusters
+PLANR_RAG_CLUSTER_MIN_CHUNKS = 20000
+PLANR_RAG_PROBES = 8
+
+# LLM scheduler: generations allowed at once, queue depth per member tier before answering 503, and
+# the longest a request may wait in the queue (seconds)
+PLANR_LLM_CONCURRENCY = 2
+PLANR_LLM_QUEUE_LIMITS = {'premium': 32, 'free': 8}
+PLANR_LLM_QUEUE_TIMEOUT = 30
+# Identical questions asked at the same time share one generation. SHARED extends this across worker
+# processes through CACHES['planr_answers'] (only useful with a shared backend such as Redis/Memcached);
+# LOCK_TIMEOUT is how long a silent producer keeps the lock before another process takes over.
+PLANR_SINGLE_FLIGHT = True
+PLANR_SINGLE_FLIGHT_SHARED = False
+PLANR_SINGLE_FLIGHT_LOCK_TIMEOUT = 90
+
+# FAQ fast path: curated answers (admin > FAQ entries) served without the LLM, see dashboard/faq.py
+PLANR_FAQ_ENABLED = True
+PLANR_FAQ_MIN_SIMILARITY = 0.75  # token-set (Jaccard) overlap needed when the wording isn't an exact match
+PLANR_FAQ_RELOAD_SECONDS = 30  # how often workers check for FAQ edits made in other processes
+PLANR_FAQ_HIT_FLUSH_SECONDS = 30
+
+# Conversation memory: estimated tokens of earlier turns sent with each question. Recent turns are kept
+# verbatim; older ones are compressed into a summary capped at SUMMARY_TOKENS (see dashboard/conversations.py)
+PLANR_CONVERSATION_HISTORY_TOKENS = 1200
+PLANR_CONVERSATION_SUMMARY_TOKENS = 300
+
+# Staff data exports (api/exports/<dataset>/ and `manage.py export_data`): rows fetched per query while streaming
+PLANR_EXPORT_CHUNK_SIZE = 2000
+
+# Resized WebP/JPEG renditions of uploaded and large static images (see dashboard/renditions.py).
+# sizes is the <img sizes> value: how wide the image is drawn, so the browser can pick a width.
+PLANR_IMAGE_RENDITIONS_ENABLED = True
+PLANR_IMAGE_RENDITIONS = {
+    'avatar': {'widths': [40, 80, 120], 'crop': True, 'sizes': '40px'},
+    'profile': {'widths': [100, 200, 300], 'crop': True, 'sizes': '100px'},
+    'screenshot': {'widths': [140, 280, 420, 960], 'crop': False, 'sizes': '140px'},
+    'hero': {'widths': [480, 768, 1080, 1440], 'crop': False, 'sizes': '(min-width: 768px) 50vw, 100vw'},
+}
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'planr.settings')
 
 application = get_wsgi_application()
+
+# Preload the FAQ index and Ollama models in the background (see dashboard/warmup.py)
+from dashboard.warmup import start_server_warm_up  # noqa: E402
+
+start_server_warm_up()